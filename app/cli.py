@@ -0,0 +1,51 @@
+"""
+Command line tools of the Orders System.
+
+Usage:
+  python -m app.cli export-orders --output orders.csv.gz --from 2024-01-01 --to 2024-01-02
+  python -m app.cli export-orders --format parquet --status completed --output orders.parquet
+"""
+import sys
+
+import click
+
+from app.data.models import OrderSearch, OrderSort, OrderStatus
+from app.data.repository import OrdersSystemRepository
+from app.services import export
+from app.services.impl import OrderService
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command('export-orders')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, allow_dash=True), default='-',
+              help='File to write, "-" for the standard output')
+@click.option('--format', 'export_format', type=click.Choice(export.FORMATS), default='csv')
+@click.option('--compress/--no-compress', default=None,
+              help='Gzip the CSV output, by default when the output file ends with .gz')
+@click.option('--from', 'created_from', type=click.DateTime(), help='First creation date (UTC), inclusive')
+@click.option('--to', 'created_to', type=click.DateTime(), help='Last creation date (UTC), exclusive')
+@click.option('--status', type=click.Choice([status.value for status in OrderStatus]))
+@click.option('--batch-size', type=click.IntRange(1), default=5000, help='Orders read and written per batch')
+def export_orders(output, export_format, compress, created_from, created_to, status, batch_size):
+    """
+    Export orders with one row per line item, streaming them from MongoDB
+    """
+    if compress is None:
+        compress = output.endswith('.gz')
+    export.check_format(export_format)
+    search = OrderSearch(status=status, created_from=created_from, created_to=created_to,
+                         sort=OrderSort.CREATED_AT, descending=False)
+    batches = OrderService(OrdersSystemRepository()).export_batches(search, batch_size)
+    stats = export.ExportStats()
+    with click.open_file(output, 'wb') as file:
+        for chunk in export.iter_export(batches, export_format, compress, stats):
+            file.write(chunk)
+    click.echo(f"exported {stats}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    cli()
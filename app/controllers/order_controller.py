@@ -2,21 +2,36 @@ from typing import Annotated
 
 from fastapi import Depends
 
-from app.data.models import OrderIn, OrderOut
-from app.services.impl import OrderService
-from app.services.interfaces import IOrderService
+from app.data.models import ExpandedItem, ExpandedOrderOut, OrderEvent, OrderIn, OrderOut, OrderSearch, \
+    OrderStatus
+from app.monitoring.tracing import traced
+from app.services.events import order_events
+from app.services.interfaces import IOrderService, IProductService
+from app.services.providers import get_order_service, get_product_service
 
 
+@traced('controller')
 class OrderController:
-    def __init__(self, order_service: Annotated[IOrderService, Depends(OrderService)]):
+    def __init__(self, order_service: Annotated[IOrderService, Depends(get_order_service)],
+                 product_service: Annotated[IProductService, Depends(get_product_service)]):
         self.order_service = order_service
+        self.product_service = product_service
 
     def get_all(self):
         return self.order_service.get_all()
 
+    def iter_all(self, batch_size: int):
+        return self.order_service.iter_all(batch_size)
+
     def get_all_by_user(self, username: str):
         return self.order_service.get_all_by_user(username)
 
+    def search(self, search: OrderSearch):
+        return self.order_service.search(search)
+
+    def export_batches(self, search: OrderSearch, batch_size: int):
+        return self.order_service.export_batches(search, batch_size)
+
     def get_by_id(self, order_id):
         return self.order_service.get_by_id(order_id)
 
@@ -24,4 +39,31 @@ class OrderController:
         order_to_save = OrderOut(**order.model_dump())
         order_to_save.user = username
         order_to_save.update_total()
-        return self.order_service.create(order_to_save)
+        order = self.order_service.create(order_to_save)
+        order_events.publish(OrderEvent.from_order(order))
+        return order
+
+    def update_status(self, order_id: str, status: OrderStatus):
+        order = self.order_service.update_status(order_id, status)
+        order_events.publish(OrderEvent.from_order(order))
+        return order
+
+    def expand_products(self, orders: list[OrderOut]) -> list[ExpandedOrderOut]:
+        """
+        Inline the name and image of the products in the line items of orders.
+        The products of all the orders are fetched in a single batch, instead of one request per line item.
+        :param orders: Orders to expand
+        :return: Expanded orders, in the same order
+        """
+        skus = list(dict.fromkeys(item.sku for order in orders for item in order.products))
+        products = {product.sku: product for product in self.product_service.get_many(skus)} if skus else {}
+        expanded = []
+        for order in orders:
+            items = []
+            for item in order.products:
+                product = products.get(item.sku)
+                items.append(ExpandedItem(sku=item.sku, price=item.price, quantity=item.quantity,
+                                          name=product.name if product else None,
+                                          image_url=product.image_url if product else None))
+            expanded.append(ExpandedOrderOut(**{**dict(order), 'products': items}))
+        return expanded
@@ -1,15 +1,18 @@
 from typing import Annotated
 
 from fastapi import Depends, UploadFile
+from fastapi.concurrency import run_in_threadpool
 
-from app.data.models import Product
+from app.data.models import Product, ProductBatch
+from app.monitoring.tracing import traced
 from app.services.aws_service import upload_file_to_s3, delete_file_from_s3
-from app.services.impl import ProductService
+from app.services.providers import get_product_service
 from app.services.interfaces import IProductService
 
 
+@traced('controller')
 class ProductController:
-    def __init__(self, product_service: Annotated[IProductService, Depends(ProductService)]):
+    def __init__(self, product_service: Annotated[IProductService, Depends(get_product_service)]):
         self.product_service = product_service
 
     def get_all(self):
@@ -18,6 +21,15 @@ class ProductController:
     def get_by_sku(self, product_sku):
         return self.product_service.get_by_sku(product_sku)
 
+    def get_many(self, product_skus: list[str]) -> ProductBatch:
+        products = self.product_service.get_many(product_skus)
+        found = {product.sku for product in products}
+        return ProductBatch(products=products, missing=[sku for sku in dict.fromkeys(product_skus)
+                                                        if sku not in found])
+
+    def search(self, query: str, limit: int):
+        return self.product_service.search(query, limit)
+
     async def create(self, sku: str, name: str, description: str, price: float, image: UploadFile):
         extension = image.filename.split('.')[-1]
         image_name = f"{sku}.{extension}"
@@ -27,7 +39,8 @@ class ProductController:
 
     async def update(self, sku: str, name: str, description: str, price: float, image: UploadFile | None):
 
-        stored_product = self.product_service.get_by_sku(sku)
+        # Off the event loop: the lookup may wait for a concurrent one of the same sku
+        stored_product = await run_in_threadpool(self.product_service.get_by_sku, sku)
 
         update_data = {
             'name': name,
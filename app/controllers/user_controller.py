@@ -3,15 +3,17 @@ from typing import Annotated
 from fastapi import Depends
 
 from app.data.models import UserIn, UserInDB
-from app.services.impl import UserService
+from app.monitoring.tracing import traced
+from app.services.providers import get_user_service
 from app.services.interfaces import IUserService
 from app.services.security import get_password_hash
 
 USER_SCOPES = "product_read product_write user_order_read order_write me"
 
 
+@traced('controller')
 class UserController:
-    def __init__(self, user_service: Annotated[IUserService, Depends(UserService)]):
+    def __init__(self, user_service: Annotated[IUserService, Depends(get_user_service)]):
         self.user_service = user_service
 
     def get_by_username(self, username: str):
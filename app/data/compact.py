@@ -0,0 +1,179 @@
+import math
+import sys
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+from app.data.models import Item, OrderOut, OrderStatus, ORDER_LIST_ADAPTER
+
+# Status values are stored as one byte per order
+STATUSES = [status.value for status in OrderStatus]
+STATUS_CODES = {value: code for code, value in enumerate(STATUSES)}
+
+
+def _to_timestamp(value: datetime | str) -> float:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        # Mongo returns naive datetimes in UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None)
+
+
+class CompactItem:
+    """
+    Read-only view over one line item of a CompactOrders container
+    """
+    __slots__ = ('_orders', '_index')
+
+    def __init__(self, orders: 'CompactOrders', index: int):
+        self._orders = orders
+        self._index = index
+
+    @property
+    def sku(self) -> str:
+        return self._orders.item_skus[self._index]
+
+    @property
+    def price(self) -> float:
+        return self._orders.item_prices[self._index]
+
+    @property
+    def quantity(self) -> int:
+        return self._orders.item_quantities[self._index]
+
+    @property
+    def total(self) -> float:
+        return self.price * self.quantity
+
+    def to_dict(self) -> dict:
+        return {'sku': self.sku, 'price': self.price, 'quantity': self.quantity}
+
+    def to_model(self) -> Item:
+        return Item(**self.to_dict())
+
+
+class CompactOrder:
+    """
+    Read-only view over one order of a CompactOrders container
+    """
+    __slots__ = ('_orders', '_index')
+
+    def __init__(self, orders: 'CompactOrders', index: int):
+        self._orders = orders
+        self._index = index
+
+    @property
+    def id(self) -> str:
+        return self._orders.ids[self._index]
+
+    @property
+    def user(self) -> str | None:
+        return self._orders.users[self._index]
+
+    @property
+    def status(self) -> str:
+        return STATUSES[self._orders.statuses[self._index]]
+
+    @property
+    def total(self) -> float | None:
+        total = self._orders.totals[self._index]
+        return None if math.isnan(total) else total
+
+    @property
+    def created_at(self) -> datetime:
+        return _to_datetime(self._orders.created_at[self._index])
+
+    @property
+    def products(self) -> list[CompactItem]:
+        start, end = self._orders.item_offsets[self._index], self._orders.item_offsets[self._index + 1]
+        return [CompactItem(self._orders, index) for index in range(start, end)]
+
+    def to_dict(self) -> dict:
+        return {'id': self.id, 'products': [item.to_dict() for item in self.products], 'status': self.status,
+                'total': self.total, 'user': self.user, 'created_at': self.created_at}
+
+    def to_model(self) -> OrderOut:
+        return OrderOut(**self.to_dict())
+
+
+class CompactOrders:
+    """
+    Columnar, array backed container for large read-only order lists.
+
+    Scalars live in typed arrays and repeated strings (skus, users) are interned,
+    so the per order cost is a few machine words instead of a graph of pydantic
+    models. Use it for bulk paths (exports, analytics) and convert to OrderOut
+    with to_models only at the API boundary.
+    """
+
+    def __init__(self):
+        self.ids: list[str] = []
+        self.users: list[str | None] = []
+        self.statuses = bytearray()
+        self.totals = array('d')
+        self.created_at = array('d')
+        self.item_offsets = array('q', [0])
+        self.item_skus: list[str] = []
+        self.item_prices = array('d')
+        self.item_quantities = array('q')
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[dict]) -> 'CompactOrders':
+        orders = cls()
+        orders.extend(documents)
+        return orders
+
+    def append(self, document: dict):
+        """
+        Append an order stored as a Mongo document (or an OrderOut dump)
+        :param document: Order document
+        """
+        user = document.get('user')
+        total = document.get('total')
+        self.ids.append(document['id'])
+        self.users.append(sys.intern(user) if user is not None else None)
+        self.statuses.append(STATUS_CODES[document.get('status', OrderStatus.PENDING.value)])
+        self.totals.append(math.nan if total is None else total)
+        self.created_at.append(_to_timestamp(document['created_at']))
+        for item in document['products']:
+            self.item_skus.append(sys.intern(item['sku']))
+            self.item_prices.append(item['price'])
+            self.item_quantities.append(item['quantity'])
+        self.item_offsets.append(len(self.item_skus))
+
+    def extend(self, documents: Iterable[dict]):
+        for document in documents:
+            self.append(document)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> CompactOrder:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('order index out of range')
+        return CompactOrder(self, index)
+
+    def __iter__(self) -> Iterator[CompactOrder]:
+        return (CompactOrder(self, index) for index in range(len(self)))
+
+    def iter_line_items(self) -> Iterator[tuple]:
+        """
+        Iterate over the orders flattened to one row per line item
+        :return: Iterator of (id, user, status, created_at, total, sku, price, quantity) tuples
+        """
+        for index in range(len(self)):
+            order = CompactOrder(self, index)
+            order_columns = (order.id, order.user, order.status, order.created_at, order.total)
+            for item_index in range(self.item_offsets[index], self.item_offsets[index + 1]):
+                yield order_columns + (self.item_skus[item_index], self.item_prices[item_index],
+                                       self.item_quantities[item_index])
+
+    def to_models(self) -> list[OrderOut]:
+        return ORDER_LIST_ADAPTER.validate_python(order.to_dict() for order in self)
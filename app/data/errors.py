@@ -32,3 +32,39 @@ class UserNotFoundError(OrdersSystemError):
 
 class IncorrectPasswordError(OrdersSystemError):
     pass
+
+
+class InvalidRefreshTokenError(OrdersSystemError):
+    pass
+
+
+class InvalidCursorError(OrdersSystemError):
+    pass
+
+
+class ExportFormatUnavailableError(OrdersSystemError):
+    pass
+
+
+class ProfilerNotRunningError(OrdersSystemError):
+    pass
+
+
+class SnapshotNotFoundError(OrdersSystemError):
+    pass
+
+
+class ProfilerBusyError(OrdersSystemError):
+    pass
+
+
+class JobNotFoundError(OrdersSystemError):
+    pass
+
+
+class InvalidJobError(OrdersSystemError):
+    pass
+
+
+class JobResultNotFoundError(OrdersSystemError):
+    pass
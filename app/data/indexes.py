@@ -0,0 +1,84 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Indexes follow the equality, sort, range rule: an equality filter (status or sku)
+# first, then the sort field with the id tie breaker, so every combination of filter
+# and sort has an index prefix. Only a range on the sort field bounds the index scan.
+# A range on the other field is checked on every document the scan reads, so it doesn't
+# reduce the number of index entries and documents read.
+# Indexes are read backwards for ascending sorts, so one direction is enough.
+ORDER_INDEXES = [
+    IndexModel([('id', ASCENDING)], name='id', unique=True),
+    IndexModel([('user', ASCENDING)], name='user'),
+    IndexModel([('created_at', DESCENDING), ('id', DESCENDING)], name='created_at_id'),
+    IndexModel([('total', DESCENDING), ('id', DESCENDING)], name='total_id'),
+    IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)], name='status_created_at_id'),
+    IndexModel([('status', ASCENDING), ('total', DESCENDING), ('id', DESCENDING)], name='status_total_id'),
+    IndexModel([('products.sku', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)],
+               name='sku_created_at_id'),
+    IndexModel([('products.sku', ASCENDING), ('total', DESCENDING), ('id', DESCENDING)], name='sku_total_id'),
+]
+
+# Archived orders are only read by id and by user
+ARCHIVE_INDEXES = [
+    IndexModel([('id', ASCENDING)], name='id', unique=True),
+    IndexModel([('user', ASCENDING)], name='user'),
+]
+
+# Jobs are read by id, and by status when lost jobs are recovered
+JOB_INDEXES = [
+    IndexModel([('id', ASCENDING)], name='id', unique=True),
+    IndexModel([('status', ASCENDING), ('updated_at', ASCENDING)], name='status_updated_at'),
+]
+
+# Users are looked up by username at every request and token refresh
+USER_INDEXES = [
+    IndexModel([('username', ASCENDING)], name='username', unique=True),
+]
+
+# Refresh tokens are looked up by their hash and revoked by family. Expired tokens are
+# removed by the TTL monitor.
+REFRESH_TOKEN_INDEXES = [
+    IndexModel([('token_hash', ASCENDING)], name='token_hash', unique=True),
+    IndexModel([('family', ASCENDING)], name='family'),
+    IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+]
+
+INDEXES = {
+    'orders': ORDER_INDEXES,
+    'orders_archive': ARCHIVE_INDEXES,
+    'jobs': JOB_INDEXES,
+    'users': USER_INDEXES,
+    'refresh_tokens': REFRESH_TOKEN_INDEXES,
+}
+
+# Options of the collections created by ensure_indexes. The archive is rarely read,
+# so it trades some CPU for a smaller footprint with zstd instead of snappy.
+COLLECTION_OPTIONS = {
+    'orders_archive': {'storageEngine': {'wiredTiger': {'configString': 'block_compressor=zstd'}}},
+}
+
+
+def ensure_indexes(db: Database):
+    """
+    Create the collections with options and the indexes the queries rely on.
+    Existing collections and indexes are left as they are, so it's cheap to run at every startup.
+    :param db: Database of the app
+    """
+    for collection_name, indexes in INDEXES.items():
+        options = COLLECTION_OPTIONS.get(collection_name)
+        try:
+            if options and collection_name not in db.list_collection_names(filter={'name': collection_name}):
+                db.create_collection(collection_name, **options)
+        except PyMongoError as e:
+            # Some hosted deployments restrict storage options, the defaults still work
+            logger.warning('could not create %s with its options: %s', collection_name, e)
+        try:
+            db[collection_name].create_indexes(indexes)
+        except PyMongoError as e:
+            logger.warning('could not create the indexes of %s: %s', collection_name, e)
@@ -1,9 +1,9 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 from typing import List
 from uuid import uuid4
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, field_validator
 
 
 class Product(BaseModel):
@@ -14,6 +14,15 @@ class Product(BaseModel):
     image_url: str
 
 
+class ProductBatchIn(BaseModel):
+    skus: list[str] = Field(min_length=1, max_length=100)
+
+
+class ProductBatch(BaseModel):
+    products: list[Product]
+    missing: list[str]
+
+
 class Item(BaseModel):
     sku: str
     price: float
@@ -71,6 +80,128 @@ class OrderOut(OrderBase):
         self.total = sum(map(lambda item: item.total, self.products))
 
 
+class OrderSort(Enum):
+    CREATED_AT = 'created_at'
+    TOTAL = 'total'
+
+
+class OrderSearch(BaseModel):
+    """
+    Filters, sorting and page of an order search.
+    When sorting by total, orders without a total are not returned.
+    """
+    status: OrderStatus | None = None
+    sku: str | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    total_min: float | None = None
+    total_max: float | None = None
+    sort: OrderSort = OrderSort.CREATED_AT
+    descending: bool = True
+    limit: int = Field(default=50, ge=1, le=500)
+    cursor: str | None = None
+
+    model_config = ConfigDict(use_enum_values=True, validate_default=True)
+
+    @field_validator('created_from', 'created_to')
+    @classmethod
+    def to_naive_utc(cls, value: datetime | None) -> datetime | None:
+        # Orders are stored with naive UTC datetimes
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+class OrderPage(BaseModel):
+    orders: list[OrderOut]
+    next_cursor: str | None = None
+
+
+class OrderStatusIn(BaseModel):
+    status: OrderStatus
+
+
+class OrderEvent(BaseModel):
+    """
+    Status of an order, pushed to its user when it's created or changes
+    """
+    order_id: str
+    user: str | None = None
+    status: OrderStatus
+    total: float | None = None
+    at: datetime = Field(default_factory=datetime.utcnow)
+
+    model_config = ConfigDict(use_enum_values=True)
+
+    @classmethod
+    def from_order(cls, order: 'OrderOut') -> 'OrderEvent':
+        return cls(order_id=order.id, user=order.user, status=order.status, total=order.total)
+
+
+class ExpandedItem(Item):
+    # None when the product was deleted after the order was placed
+    name: str | None = None
+    image_url: str | None = None
+
+
+class ExpandedOrderOut(OrderOut):
+    products: List[ExpandedItem]
+
+
+class RefreshToken(BaseModel):
+    """
+    Server side record of a refresh token. Only an HMAC of the token is stored.
+    Tokens rotated from the same login share a family, revoked together when a used token is replayed.
+    """
+    token_hash: str
+    username: str
+    scopes: list[str] = []
+    family: str = Field(default_factory=lambda: uuid4().hex)
+    expires_at: datetime
+    used_at: datetime | None = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class JobStatus(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+
+class JobIn(BaseModel):
+    kind: str
+    params: dict = {}
+
+    model_config = ConfigDict(json_schema_extra={
+        'example': {
+            'kind': 'export-orders',
+            'params': {'format': 'csv', 'status': 'completed', 'created_from': '2024-01-01T00:00:00'},
+        }
+    })
+
+
+class Job(JobIn):
+    """
+    Background job and its progress, as stored in the jobs collection
+    """
+    id: str = Field(default_factory=lambda: uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    submitted_by: str | None = None
+    attempts: int = 0
+    # Units of work done (orders, products...) and the total when it's known
+    done: int = 0
+    total: int | None = None
+    result: dict | None = None
+    error: str | None = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    model_config = ConfigDict(use_enum_values=True, validate_default=True)
+
+
 class User(BaseModel):
     username: str
     email: str | None = None
@@ -85,3 +216,11 @@ class UserIn(User):
 class UserInDB(User):
     hashed_password: str
     scopes: str
+
+
+# Cached adapters to validate and serialize whole lists in a single call
+PRODUCT_LIST_ADAPTER = TypeAdapter(list[Product])
+ORDER_LIST_ADAPTER = TypeAdapter(list[OrderOut])
+EXPANDED_ORDER_ADAPTER = TypeAdapter(ExpandedOrderOut)
+EXPANDED_ORDER_LIST_ADAPTER = TypeAdapter(list[ExpandedOrderOut])
+USER_LIST_ADAPTER = TypeAdapter(list[UserInDB])
@@ -0,0 +1,158 @@
+import base64
+import binascii
+from datetime import datetime, timezone
+from typing import Iterable
+
+import orjson
+
+from app.data.errors import InvalidCursorError
+from app.data.models import OrderOut, OrderPage, OrderSearch, OrderSort
+
+
+def _naive_utc(value):
+    # Stored orders have naive UTC datetimes, orders built from JSON may be aware
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def encode_cursor(order: OrderOut, sort: str) -> str:
+    """
+    Encode the keyset position after an order
+    :param order: Last order of a page
+    :param sort: Field the orders are sorted by
+    :return: Opaque cursor
+    """
+    value = _naive_utc(getattr(order, sort))
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(orjson.dumps([value, order.id])).decode()
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    """
+    Decode a cursor made by encode_cursor
+    :param cursor: Opaque cursor
+    :param sort: Field the orders are sorted by
+    :return: Sort value and id of the last order of the previous page
+    :raises InvalidCursorError: If the cursor is malformed
+    """
+    try:
+        value, order_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == OrderSort.CREATED_AT.value:
+            value = _naive_utc(datetime.fromisoformat(value))
+        elif not isinstance(value, (int, float)):
+            raise ValueError(value)
+        if not isinstance(order_id, str):
+            raise ValueError(order_id)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise InvalidCursorError(f"Invalid cursor {cursor}")
+    return value, order_id
+
+
+def _range(low_operator: str, low, high_operator: str, high) -> dict:
+    bounds = {}
+    if low is not None:
+        bounds[low_operator] = low
+    if high is not None:
+        bounds[high_operator] = high
+    return bounds
+
+
+def _conditions(search: OrderSearch) -> dict:
+    conditions = {}
+    if search.status is not None:
+        conditions['status'] = search.status
+    if search.sku is not None:
+        conditions['products.sku'] = search.sku
+    created_at = _range('$gte', search.created_from, '$lt', search.created_to)
+    if created_at:
+        conditions['created_at'] = created_at
+    total = _range('$gte', search.total_min, '$lte', search.total_max)
+    if search.sort == OrderSort.TOTAL.value:
+        total['$ne'] = None
+    if total:
+        conditions['total'] = total
+    return conditions
+
+
+def _after_cursor(search: OrderSearch) -> dict:
+    value, order_id = decode_cursor(search.cursor, search.sort)
+    operator = '$lt' if search.descending else '$gt'
+    return {'$or': [{search.sort: {operator: value}}, {search.sort: value, 'id': {operator: order_id}}]}
+
+
+def build_query(search: OrderSearch) -> tuple[dict, list[tuple[str, int]]]:
+    """
+    Build the Mongo filter and sort of a search.
+
+    Equality filters come first, then the sort field, then ranges, matching the
+    order of the fields in the indexes of app/data/indexes.py. The id is the tie
+    breaker of the sort, which makes the keyset cursor unambiguous.
+
+    :param search: Order search
+    :return: Filter and sort specification
+    :raises InvalidCursorError: If the cursor of the search is malformed
+    """
+    conditions = _conditions(search)
+    direction = -1 if search.descending else 1
+    sort = [(search.sort, direction), ('id', direction)]
+    if search.cursor is None:
+        return conditions, sort
+    after_cursor = _after_cursor(search)
+    return {'$and': [conditions, after_cursor]} if conditions else after_cursor, sort
+
+
+def to_page(orders: list[OrderOut], search: OrderSearch) -> OrderPage:
+    """
+    Build a page from up to limit + 1 orders, the extra one telling there's a next page
+    :param orders: Orders fetched for the page
+    :param search: Order search
+    :return: Page of orders
+    """
+    if len(orders) <= search.limit:
+        return OrderPage(orders=orders)
+    orders = orders[:search.limit]
+    return OrderPage(orders=orders, next_cursor=encode_cursor(orders[-1], search.sort))
+
+
+def filter_orders(orders: Iterable[OrderOut], search: OrderSearch) -> list[OrderOut]:
+    """
+    Filter and sort orders held in memory, with the same semantics as the Mongo query.
+    The limit of the search isn't applied.
+    :param orders: Orders to search
+    :param search: Order search
+    :return: Matching orders after the cursor, in the order of the search
+    """
+    def matches(order: OrderOut) -> bool:
+        total = order.total
+        created_at = _naive_utc(order.created_at)
+        return ((search.status is None or order.status == search.status)
+                and (search.sku is None or any(item.sku == search.sku for item in order.products))
+                and (search.created_from is None or created_at >= search.created_from)
+                and (search.created_to is None or created_at < search.created_to)
+                and (search.sort != OrderSort.TOTAL.value or total is not None)
+                and (search.total_min is None or (total is not None and total >= search.total_min))
+                and (search.total_max is None or (total is not None and total <= search.total_max)))
+
+    def key(order: OrderOut) -> tuple:
+        return _naive_utc(getattr(order, search.sort)), order.id
+
+    selected = sorted(filter(matches, orders), key=key, reverse=search.descending)
+    if search.cursor is not None:
+        position = decode_cursor(search.cursor, search.sort)
+        if search.descending:
+            selected = [order for order in selected if key(order) < position]
+        else:
+            selected = [order for order in selected if key(order) > position]
+    return selected
+
+
+def search_orders(orders: Iterable[OrderOut], search: OrderSearch) -> OrderPage:
+    """
+    Run a search over orders held in memory, with the same semantics as the Mongo query
+    :param orders: Orders to search
+    :param search: Order search
+    :return: Page of orders
+    """
+    return to_page(filter_orders(orders, search)[:search.limit + 1], search)
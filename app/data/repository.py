@@ -1,24 +1,65 @@
-import os
+from functools import lru_cache
 
 from pymongo import MongoClient
-from dotenv import load_dotenv
+from pymongo.read_preferences import Nearest, Primary, Secondary, SecondaryPreferred
 
-load_dotenv()
+from app.monitoring.metrics import mongo_command_metrics, mongo_pool_metrics
+from app.monitoring.slow_queries import slow_query_logger
+from app.monitoring.tracing import mongo_trace_listener, traced
+from app.settings import get_settings
 
-user = os.getenv('DB_USER')
-password = os.getenv('DB_PASSWORD')
-host = os.getenv('DB_HOST')
-db_name = os.getenv('DB_NAME')
+user = get_settings().db_user
+password = get_settings().db_password
+host = get_settings().db_host
+db_name = get_settings().db_name
+db_uri = get_settings().db_uri
 
+RELAXED_READ_MODES = {
+    'primary': lambda max_staleness: Primary(),
+    'secondaryPreferred': lambda max_staleness: SecondaryPreferred(max_staleness=max_staleness),
+    'secondary': lambda max_staleness: Secondary(max_staleness=max_staleness),
+    'nearest': lambda max_staleness: Nearest(max_staleness=max_staleness),
+}
 
+
+def relaxed_reads():
+    """
+    Get the read preference of reads that tolerate bounded staleness: catalog and list reads.
+    Reads that must see the latest writes (authentication, reads after writes) stay on the primary.
+    :return: Read preference
+    """
+    mode = RELAXED_READ_MODES[get_settings().db_relaxed_read_preference]
+    return mode(get_settings().db_max_staleness_seconds)
+
+
+@lru_cache(maxsize=None)
+def get_client() -> MongoClient:
+    """
+    Get the MongoClient shared by every repository in the process.
+    The client holds the connection pool, so it's created once instead of once per request.
+    :return: MongoClient instance
+    """
+    uri = db_uri or f"mongodb+srv://{user}:{password}@{host}/?retryWrites=true&w=majority"
+    listeners = [mongo_command_metrics, mongo_pool_metrics, slow_query_logger, mongo_trace_listener]
+    client = MongoClient(uri, event_listeners=listeners)
+    slow_query_logger.client = client
+    return client
+
+
+@traced('repository')
 class OrdersSystemRepository:
     def __init__(self):
-        uri = f"mongodb+srv://{user}:{password}@{host}/?retryWrites=true&w=majority"
-        self.__client = MongoClient(uri)
+        self.__client = get_client()
         self.__db = self.client.get_database(db_name)
 
-    def get_collection(self, collection_name):
-        return self.db[collection_name]
+    def get_collection(self, collection_name, read_preference=None):
+        """
+        Get a collection of the database
+        :param collection_name: Name of the collection
+        :param read_preference: Read preference of the collection, the primary by default
+        :return: Collection
+        """
+        return self.db.get_collection(collection_name, read_preference=read_preference)
 
     @property
     def db(self):
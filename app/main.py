@@ -1,7 +1,18 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
-from app.routers import products, orders, auth
+from app.data.indexes import ensure_indexes
+from app.data.repository import OrdersSystemRepository
+from app.middleware.admission import AdmissionControlMiddleware
+from app.middleware.allocations import AllocationMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.context import RequestContextMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.tracing import TracingMiddleware
+from app.routers import products, orders, auth, monitoring, admin, jobs as jobs_router
+from app.services import archive, jobs, memory, providers
+from app.services.impl import ProductService
 from app.services.security import get_current_user
 
 description = """
@@ -31,6 +42,11 @@ You will be able to:
 - Login for getting a JWT token
 - Get your user information
 - Create a new user
+
+## Admin
+Diagnostic endpoints, restricted to users with the admin scope.
+You will be able to:
+- Get the slowest recently traced requests
 """
 
 tags_metadata = [
@@ -46,6 +62,14 @@ tags_metadata = [
         "name": "auth",
         "description": "Operations related to authentication",
     },
+    {
+        "name": "admin",
+        "description": "Operational and diagnostic endpoints",
+    },
+    {
+        "name": "jobs",
+        "description": "Long-running bulk operations, run in the background",
+    },
 ]
 
 app = FastAPI(
@@ -64,16 +88,51 @@ app = FastAPI(
     openapi_url="/api/v1/openapi.json",
     docs_url="/api/v1/docs",
     redoc_url="/api/v1/redoc",
+    default_response_class=ORJSONResponse,
 )
 
+
+def prepare_database():
+    """
+    Create the indexes, build the product search index, start the order archiver and resume
+    the jobs left queued or lost by a previous run when the app starts
+    """
+    repository = OrdersSystemRepository()
+    ensure_indexes(repository.db)
+    ProductService(repository).rebuild_index()
+    if archive.ARCHIVE_AFTER_DAYS > 0:
+        archive.start_archiver(archive.OrderArchiver(repository.get_collection('orders'),
+                                                     repository.get_collection(archive.ARCHIVE_COLLECTION)))
+    jobs.job_runner.recover(jobs.JobStore(repository.get_collection(jobs.JOBS_COLLECTION)))
+
+
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(AllocationMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestContextMiddleware)
+# Added last, so it's the outermost middleware: preflight requests are answered before admission
+# control and the 429 and 503 responses it sends carry the CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
 
+if providers.SERVICE_BACKEND == 'memory':
+    memory.setup(app)
+else:
+    app.add_event_handler('startup', prepare_database)
+    app.add_event_handler('shutdown', jobs.job_runner.shutdown)
+
+app.include_router(monitoring.router)
 app.include_router(auth.router)
 app.include_router(products.router, dependencies=[Depends(get_current_user)])
 app.include_router(orders.router, dependencies=[Depends(get_current_user)])
+app.include_router(admin.router, dependencies=[Depends(get_current_user)])
+# Jobs keep their state in MongoDB, where their worker processes read it, so they need the mongo backend
+if providers.SERVICE_BACKEND != 'memory':
+    app.include_router(jobs_router.router, dependencies=[Depends(get_current_user)])
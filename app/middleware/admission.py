@@ -0,0 +1,162 @@
+import math
+import time
+from collections import OrderedDict
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.monitoring.metrics import mongo_pool_metrics, MongoPoolMetrics
+from app.services.security import get_token_payload
+from app.settings import get_settings
+
+ADMISSION_LIMITS = {
+    'auth': get_settings().admission_auth_limit,
+    'reads': get_settings().admission_read_limit,
+    'writes': get_settings().admission_write_limit,
+}
+ADMISSION_POOL_WAIT_THRESHOLD_MS = get_settings().admission_pool_wait_threshold_ms
+ADMISSION_RETRY_AFTER = get_settings().admission_retry_after
+RATE_LIMIT_PER_SECOND = get_settings().rate_limit_per_second
+RATE_LIMIT_BURST = get_settings().rate_limit_burst
+
+# Requests that are never shed: scraping must keep working when the API is overloaded
+EXEMPT_PATHS = ('/metrics',)
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Reads sent as POST because their parameters don't fit in a query string
+READ_PATHS = ('/products/batch',)
+# Long-lived event streams: rate limited, but not counted as in-flight requests for their whole life
+STREAM_PATHS = ('/orders/events',)
+
+
+def route_class(scope: Scope) -> str:
+    """
+    Get the admission class of a request
+    :param scope: ASGI scope of the request
+    :return: "auth", "reads" or "writes"
+    """
+    if scope['path'].startswith('/auth'):
+        return 'auth'
+    return 'reads' if scope['method'] in READ_METHODS or scope['path'] in READ_PATHS else 'writes'
+
+
+def client_key(scope: Scope) -> str:
+    """
+    Get the key requests are rate limited by: the user of a valid bearer token, or the client
+    address otherwise. Keying on the verified user keeps one bucket per user across logins and
+    refreshes, and made-up tokens can't be rotated to get fresh buckets. The verified token is
+    kept in the request state, for get_current_user to reuse.
+    :param scope: ASGI scope of the request
+    :return: Rate limit key
+    """
+    authorization = Headers(scope=scope).get('authorization', '')
+    if authorization.lower().startswith('bearer '):
+        payload = get_token_payload(authorization[7:], scope.setdefault('state', {}))
+        if payload and payload.get('sub'):
+            return f"user:{payload['sub']}"
+    client = scope.get('client')
+    return f'ip:{client[0]}' if client else ''
+
+
+class TokenBuckets:
+    """
+    Token bucket per key, for per client rate limits.
+    Only the most recently used keys are kept, so memory stays bounded.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        """
+        Take a token from the bucket of a key
+        :param key: Bucket key
+        :return: 0 if a token was taken, otherwise the seconds until the next token
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionControlMiddleware:
+    """
+    Cap the in-flight requests per route class and shed the excess with 503 and Retry-After.
+
+    The caps shrink in proportion to the Mongo pool wait once it's over the threshold,
+    so requests are rejected early instead of queueing behind a slow database. A per
+    client token bucket answers 429 to clients over their rate, so one client can't take
+    all the capacity. The middleware runs on the event loop, so counters need no locks.
+    """
+
+    def __init__(self, app: ASGIApp, limits: dict[str, int] | None = None,
+                 pool_wait_threshold_ms: float = ADMISSION_POOL_WAIT_THRESHOLD_MS,
+                 retry_after: int = ADMISSION_RETRY_AFTER, rate: float = RATE_LIMIT_PER_SECOND,
+                 burst: int = RATE_LIMIT_BURST, pool_metrics: MongoPoolMetrics = mongo_pool_metrics):
+        self.app = app
+        self.limits = ADMISSION_LIMITS if limits is None else limits
+        self.pool_wait_threshold = pool_wait_threshold_ms / 1000
+        self.retry_after = retry_after
+        self.buckets = TokenBuckets(rate, burst) if rate > 0 else None
+        self.pool_metrics = pool_metrics
+        self.in_flight = {name: 0 for name in self.limits}
+
+    def limit(self, name: str) -> int:
+        """
+        Get the current in-flight limit of a route class, 0 if unlimited
+        :param name: Route class
+        :return: Limit scaled down by the Mongo pool wait
+        """
+        limit = self.limits.get(name, 0)
+        wait = self.pool_metrics.average_wait()
+        if limit and self.pool_wait_threshold > 0 and wait > self.pool_wait_threshold:
+            limit = max(1, int(limit * self.pool_wait_threshold / wait))
+        return limit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or scope['path'] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self.buckets is not None:
+            wait = self.buckets.acquire(client_key(scope))
+            if wait:
+                await self.reject(send, 429, 'Too many requests', math.ceil(wait))
+                return
+
+        if scope['path'] in STREAM_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        name = route_class(scope)
+        limit = self.limit(name)
+        if limit and self.in_flight.get(name, 0) >= limit:
+            await self.reject(send, 503, 'Server is overloaded, retry later', self.retry_after)
+            return
+
+        self.in_flight[name] = self.in_flight.get(name, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight[name] -= 1
+
+    @staticmethod
+    async def reject(send: Send, status: int, detail: str, retry_after: int):
+        body = f'{{"detail":"{detail}"}}'.encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                        (b'retry-after', str(retry_after).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,25 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.monitoring.allocations import AllocationProfiler, allocation_profiler
+from app.monitoring.context import route_name
+
+
+class AllocationMiddleware:
+    """
+    Record the peak allocation of a sample of the requests while allocation profiling runs
+    """
+
+    def __init__(self, app: ASGIApp, profiler: AllocationProfiler = allocation_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        start = self.profiler.begin_request() if scope['type'] == 'http' else None
+        if start is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.end_request(start, f"{scope['method']} {route_name(scope)}")
@@ -0,0 +1,156 @@
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.settings import get_settings
+
+# Optional codecs, used only when they are installed
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSION_MINIMUM_SIZE = get_settings().compression_minimum_size
+COMPRESSION_LEVEL = get_settings().compression_level
+COMPRESSION_ROUTE_LEVELS = get_settings().compression_route_levels
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+
+def _gzip(body: bytes, level: int) -> bytes:
+    return gzip.compress(body, compresslevel=min(max(level, 1), 9), mtime=0)
+
+
+def _brotli(body: bytes, level: int) -> bytes:
+    return brotli.compress(body, quality=min(max(level, 0), 11))
+
+
+def _zstd(body: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=min(max(level, 1), 22)).compress(body)
+
+
+# Supported encodings in order of preference
+CODECS = {
+    name: compress for name, compress, available in (
+        ('br', _brotli, brotli is not None),
+        ('zstd', _zstd, zstandard is not None),
+        ('gzip', _gzip, True),
+    ) if available
+}
+
+
+def parse_route_levels(value: str) -> dict[str, int]:
+    """
+    Parse per route compression levels
+    :param value: Comma separated "prefix=level" pairs
+    :return: Dictionary with the level for each path prefix
+    """
+    levels = {}
+    for pair in filter(None, map(str.strip, value.split(','))):
+        prefix, level = pair.split('=')
+        levels[prefix.strip()] = int(level)
+    return levels
+
+
+def select_encoding(accept_encoding: str) -> str | None:
+    """
+    Select the preferred supported encoding accepted by the client
+    :param accept_encoding: Value of the Accept-Encoding header
+    :return: Encoding name or None if the client accepts none of the supported ones
+    """
+    accepted, refused = set(), set()
+    for token in accept_encoding.lower().split(','):
+        name, _, params = token.strip().partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    # An explicit refusal, which "*" doesn't override
+                    refused.add(name.strip())
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip())
+    return next((encoding for encoding in CODECS
+                 if encoding in accepted or ('*' in accepted and encoding not in refused)), None)
+
+
+class CompressionMiddleware:
+    """
+    Compress complete responses with the best encoding the client accepts.
+
+    Responses are left untouched when they are smaller than minimum_size, are streamed
+    (sent in more than one body message), already have a Content-Encoding or have a
+    content type that doesn't compress well.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MINIMUM_SIZE, level: int = COMPRESSION_LEVEL,
+                 route_levels: dict[str, int] | None = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.route_levels = parse_route_levels(COMPRESSION_ROUTE_LEVELS) if route_levels is None else route_levels
+
+    def level_for(self, path: str) -> int:
+        prefixes = [prefix for prefix in self.route_levels if path.startswith(prefix)]
+        return self.route_levels[max(prefixes, key=len)] if prefixes else self.level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = select_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        level = self.level_for(scope['path'])
+        if encoding is None or level <= 0:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, encoding, level, self.minimum_size)
+        await self.app(scope, receive, responder)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, encoding: str, level: int, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.start_message: Message | None = None
+        self.passthrough = False
+
+    async def __call__(self, message: Message):
+        if self.passthrough:
+            await self.send(message)
+            return
+        if message['type'] == 'http.response.start':
+            self.start_message = message
+            return
+        if message['type'] != 'http.response.body':
+            await self.send(message)
+            return
+
+        body = message.get('body', b'')
+        if message.get('more_body', False) or not self._compressible(len(body)):
+            # Streaming or not worth compressing: forward everything as it comes
+            self.passthrough = True
+            await self.send(self.start_message)
+            await self.send(message)
+            return
+
+        compressed = CODECS[self.encoding](body, self.level)
+        headers = MutableHeaders(raw=self.start_message['headers'])
+        headers['Content-Encoding'] = self.encoding
+        headers['Content-Length'] = str(len(compressed))
+        headers.add_vary_header('Accept-Encoding')
+        await self.send(self.start_message)
+        await self.send({'type': 'http.response.body', 'body': compressed})
+
+    def _compressible(self, size: int) -> bool:
+        headers = Headers(raw=self.start_message['headers'])
+        content_type = headers.get('content-type', '')
+        return (size >= self.minimum_size and 'content-encoding' not in headers
+                and content_type.startswith(COMPRESSIBLE_TYPES))
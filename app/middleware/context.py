@@ -0,0 +1,22 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.monitoring.context import request_scope
+
+
+class RequestContextMiddleware:
+    """
+    Make the scope of the current request available to the code handling it
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(token)
@@ -0,0 +1,37 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.monitoring.context import route_name
+from app.monitoring.tracing import start_trace
+
+TRACE_HEADER = 'X-Trace-Id'
+
+
+class TracingMiddleware:
+    """
+    Trace a sample of the requests. Sampled responses carry the trace id in the X-Trace-Id header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        with start_trace(f"{scope['method']} {scope['path']}", trace_id=Headers(scope=scope).get(TRACE_HEADER)) as trace:
+            if trace is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_wrapper(message: Message):
+                if message['type'] == 'http.response.start':
+                    trace.root.attributes['status'] = message['status']
+                    MutableHeaders(scope=message)[TRACE_HEADER] = trace.trace_id
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                trace.name = f"{scope['method']} {route_name(scope)}"
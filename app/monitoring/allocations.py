@@ -0,0 +1,180 @@
+import linecache
+import random
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from uuid import uuid4
+
+from app.data.errors import ProfilerNotRunningError, SnapshotNotFoundError
+
+# Frames of the profiler itself and of the import system are noise in the reports
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+def _statistic_to_dict(statistic) -> dict:
+    frame = statistic.traceback[0]
+    return {
+        'site': f"{frame.filename}:{frame.lineno}",
+        'line': linecache.getline(frame.filename, frame.lineno).strip(),
+        'traceback': [f"{frame.filename}:{frame.lineno}" for frame in statistic.traceback],
+        'size_kb': round(statistic.size / 1024, 1),
+        'count': statistic.count,
+        **({'size_diff_kb': round(statistic.size_diff / 1024, 1), 'count_diff': statistic.count_diff}
+           if hasattr(statistic, 'size_diff') else {}),
+    }
+
+
+class AllocationProfiler:
+    """
+    Start and stop tracemalloc on a live worker and report where memory is allocated.
+
+    tracemalloc slows allocations down and holds memory per traced block, so it only runs
+    between start and stop. Snapshots are kept by id, at most max_snapshots of them, to be
+    compared later. A sample of the requests also records the peak memory allocated while
+    they run, by route. The peak is process wide, so only one request is measured at a time,
+    and the allocations of requests running concurrently are included: it's an upper bound.
+    """
+
+    def __init__(self, max_snapshots: int = 5):
+        self.max_snapshots = max_snapshots
+        self.sample_rate = 0.0
+        self.started_at: float | None = None
+        self._snapshots: OrderedDict[str, tracemalloc.Snapshot] = OrderedDict()
+        self._routes: dict[str, list[float]] = {}
+        self._measuring = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 10, sample_rate: float = 0.1):
+        """
+        Start tracing allocations, and forget the snapshots and route peaks of a previous run
+        :param frames: Frames stored per allocation, more frames cost more memory
+        :param sample_rate: Probability of measuring the peak allocation of a request
+        """
+        with self._lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._snapshots.clear()
+            self._routes.clear()
+            self.sample_rate = sample_rate
+            self.started_at = time.time()
+            tracemalloc.start(frames)
+
+    def stop(self):
+        with self._lock:
+            tracemalloc.stop()
+            self._snapshots.clear()
+            self.sample_rate = 0.0
+            self.started_at = None
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'running': self.running,
+            'started_at': self.started_at,
+            'frames': tracemalloc.get_traceback_limit(),
+            'sample_rate': self.sample_rate,
+            'traced_kb': round(current / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+            'overhead_kb': round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+            'snapshots': list(self._snapshots),
+            'routes': self.route_peaks(),
+        }
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        if not self.running:
+            raise ProfilerNotRunningError('Allocation profiling is not running')
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    def _get_snapshot(self, snapshot_id: str) -> tracemalloc.Snapshot:
+        snapshot = self._snapshots.get(snapshot_id)
+        if snapshot is None:
+            raise SnapshotNotFoundError(f"Snapshot {snapshot_id} not found")
+        return snapshot
+
+    def snapshot(self) -> str:
+        """
+        Take a snapshot of the traced allocations, to be compared with a later one
+        :return: Id of the snapshot
+        :raises ProfilerNotRunningError: If tracemalloc isn't running
+        """
+        snapshot = self._take_snapshot()
+        snapshot_id = uuid4().hex[:8]
+        with self._lock:
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def top(self, limit: int = 20, group_by: str = 'lineno', snapshot_id: str | None = None) -> list[dict]:
+        """
+        Get the allocation sites holding the most memory
+        :param limit: Number of sites
+        :param group_by: "lineno", "filename" or "traceback"
+        :param snapshot_id: Snapshot to read, a new one by default
+        :return: Sites by size, largest first
+        :raises ProfilerNotRunningError: If tracemalloc isn't running and no snapshot is given
+        :raises SnapshotNotFoundError: If the snapshot doesn't exist
+        """
+        snapshot = self._get_snapshot(snapshot_id) if snapshot_id else self._take_snapshot()
+        return [_statistic_to_dict(statistic) for statistic in snapshot.statistics(group_by)[:limit]]
+
+    def diff(self, first_id: str, second_id: str | None = None, limit: int = 20,
+             group_by: str = 'lineno') -> list[dict]:
+        """
+        Get the allocation sites that grew the most between two snapshots
+        :param first_id: Older snapshot
+        :param second_id: Newer snapshot, a new one by default
+        :param limit: Number of sites
+        :param group_by: "lineno", "filename" or "traceback"
+        :return: Sites by growth, largest first
+        :raises ProfilerNotRunningError: If tracemalloc isn't running and no second snapshot is given
+        :raises SnapshotNotFoundError: If a snapshot doesn't exist
+        """
+        first = self._get_snapshot(first_id)
+        second = self._get_snapshot(second_id) if second_id else self._take_snapshot()
+        return [_statistic_to_dict(statistic) for statistic in second.compare_to(first, group_by)[:limit]]
+
+    def begin_request(self) -> int | None:
+        """
+        Start measuring the peak allocation of a request, if it's sampled
+        :return: Traced memory when the request starts, None if it isn't measured
+        """
+        if not self.sample_rate or random.random() >= self.sample_rate or not self.running:
+            return None
+        with self._lock:
+            if self._measuring:
+                return None
+            self._measuring = True
+            tracemalloc.reset_peak()
+            return tracemalloc.get_traced_memory()[0]
+
+    def end_request(self, start: int, route: str):
+        with self._lock:
+            self._measuring = False
+            if not self.running:
+                return
+            allocated = max(0, tracemalloc.get_traced_memory()[1] - start)
+            stats = self._routes.setdefault(route, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += allocated
+            stats[2] = max(stats[2], allocated)
+
+    def route_peaks(self) -> list[dict]:
+        with self._lock:
+            routes = list(self._routes.items())
+        return sorted(({'route': route, 'requests': count, 'mean_peak_kb': round(total / count / 1024, 1),
+                        'max_peak_kb': round(largest / 1024, 1)} for route, (count, total, largest) in routes),
+                      key=lambda route: route['max_peak_kb'], reverse=True)
+
+
+allocation_profiler = AllocationProfiler()
@@ -0,0 +1,27 @@
+from contextvars import ContextVar
+
+from starlette.types import Scope
+
+# ASGI scope of the request being handled. Routing fills in the matched route on the
+# same scope, so code running inside an endpoint can tell which route it serves.
+request_scope: ContextVar[Scope | None] = ContextVar('request_scope', default=None)
+
+
+def route_name(scope: Scope) -> str:
+    """
+    Get the path template of the route that handled the request.
+    Raw paths are never used as labels to keep the number of series bounded.
+    :param scope: ASGI scope of the request
+    :return: Route path template or "unmatched"
+    """
+    route = scope.get('route')
+    return getattr(route, 'path', 'unmatched')
+
+
+def current_route() -> str | None:
+    """
+    Get the route template of the request being handled in the current context
+    :return: Route path template, or None outside a request
+    """
+    scope = request_scope.get()
+    return route_name(scope) if scope is not None else None
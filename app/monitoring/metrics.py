@@ -0,0 +1,202 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs: list[tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    """
+    Prometheus histogram with a fixed set of label names
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        """
+        Record an observation
+        :param value: Observed value, in seconds for latencies
+        :param label_values: Values for the label names, in the same order
+        """
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Bucket counts (not cumulative), sum and count
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values: str):
+        """
+        Observe the time spent in the with block
+        :param label_values: Values for the label names, in the same order
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            pairs = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(pairs + [("le", repr(bound))])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(pairs + [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(pairs)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(pairs)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list[Histogram] = []
+
+    def register(self, metric: Histogram) -> Histogram:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Render every registered metric in the Prometheus text exposition format
+        :return: Metrics as text
+        """
+        return '\n'.join(line for metric in self._metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route and status.', ('method', 'route', 'status')))
+MONGO_COMMAND_DURATION = REGISTRY.register(Histogram(
+    'mongo_command_duration_seconds', 'MongoDB command latency by command and outcome.', ('command', 'outcome')))
+S3_CALL_DURATION = REGISTRY.register(Histogram(
+    's3_call_duration_seconds', 'AWS S3 call latency by operation.', ('operation',)))
+SECURITY_DURATION = REGISTRY.register(Histogram(
+    'security_operation_duration_seconds', 'Password hashing and JWT latency by operation.', ('operation',)))
+MONGO_POOL_WAIT = REGISTRY.register(Histogram(
+    'mongo_pool_wait_seconds', 'Time spent waiting for a MongoDB connection from the pool by outcome.',
+    ('outcome',)))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    pymongo command listener that records command latencies
+    """
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 1_000_000, event.command_name, 'success')
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 1_000_000, event.command_name, 'failure')
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    pymongo pool listener that records how long requests wait for a connection.
+
+    A checkout runs in the thread that needs the connection, so the wait is timed per
+    thread. Besides the histogram, a moving average of the wait is kept for admission control.
+    """
+
+    def __init__(self, smoothing: float = 0.2, window: float = 10.0):
+        self._checkouts = threading.local()
+        self._smoothing = smoothing
+        self._window = window
+        self._average = 0.0
+        self._updated = 0.0
+
+    def connection_check_out_started(self, event: monitoring.ConnectionCheckOutStartedEvent):
+        self._checkouts.start = time.perf_counter()
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent):
+        self._finished('success')
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent):
+        self._finished('failure')
+
+    def _finished(self, outcome: str):
+        start = getattr(self._checkouts, 'start', None)
+        if start is None:
+            return
+        self._checkouts.start = None
+        wait = time.perf_counter() - start
+        MONGO_POOL_WAIT.observe(wait, outcome)
+        self._average += self._smoothing * (wait - self._average)
+        self._updated = time.monotonic()
+
+    def average_wait(self) -> float:
+        """
+        Moving average of the pool wait, in seconds.
+        It's 0 when there were no checkouts in the last window, so an idle pool isn't considered slow.
+        """
+        if time.monotonic() - self._updated > self._window:
+            return 0.0
+        return self._average
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+mongo_pool_metrics = MongoPoolMetrics()
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+from app.data.errors import ProfilerBusyError
+
+# Leaf frames of threads waiting for work: the event loop in select, threadpool workers
+# on their queue, threads waiting on a lock or an event. They are skipped unless asked for.
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+    ('threading.py', 'wait'),
+    ('thread.py', '_worker'),
+}
+
+
+def _frame_label(frame: FrameType) -> str:
+    # Module and qualified function, without line numbers, so flame graphs merge the calls of a function.
+    # co_qualname is new in Python 3.11, older versions only have the bare function name.
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _is_idle(frame: FrameType) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+
+class ProfileSession:
+    """
+    Statistical profile of every thread of the process: a sampler thread records the stack
+    of each thread at a fixed interval. The profiled code runs unmodified, the cost is the
+    sampler walking the stacks while it holds the GIL, proportional to the sampling rate.
+    """
+
+    def __init__(self, interval: float, include_idle: bool = False, on_stop=None):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._on_stop = on_stop
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='cpu-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        sampler_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id or (not self.include_idle and _is_idle(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, 'thread'))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        if self._on_stop:
+            self._on_stop()
+
+    def collapsed(self) -> str:
+        """
+        Get the stacks in the collapsed format of flamegraph.pl, speedscope and similar tools
+        :return: One "root;...;leaf count" line per stack, most frequent first
+        """
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def to_dict(self, limit: int = 50) -> dict:
+        """
+        Summarize the profile by function
+        :param limit: Number of functions
+        :return: Samples, and the functions with the most samples on top of the stack (self)
+                 and anywhere in the stack (total)
+        """
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return {
+            'samples': self.samples,
+            'duration_s': round(self.duration, 3),
+            'interval_ms': self.interval * 1000,
+            'self': [{'function': function, 'samples': count} for function, count in own.most_common(limit)],
+            'total': [{'function': function, 'samples': count} for function, count in total.most_common(limit)],
+        }
+
+
+class SamplingProfiler:
+    """
+    Entry point of the profile sessions of the process, one at a time
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def start(self, interval: float = 0.01, include_idle: bool = False) -> ProfileSession:
+        """
+        Start sampling every thread
+        :param interval: Seconds between samples
+        :param include_idle: Also record threads waiting for work
+        :return: The running session, to be stopped
+        :raises ProfilerBusyError: If another session is running
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError('A profile is already running, retry when it finishes')
+        try:
+            return ProfileSession(interval, include_idle, on_stop=self._lock.release)
+        except BaseException:
+            self._lock.release()
+            raise
+
+
+cpu_profiler = SamplingProfiler()
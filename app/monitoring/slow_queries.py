@@ -0,0 +1,125 @@
+import json
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+from app.monitoring.context import current_route
+from app.settings import get_settings
+
+SLOW_QUERY_THRESHOLD_MS = get_settings().slow_query_threshold_ms
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = get_settings().slow_query_explain_sample_rate
+
+logger = logging.getLogger(__name__)
+
+# Where each command keeps its query filter
+FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'aggregate': 'pipeline',
+}
+EXPLAINABLE_COMMANDS = {'find', 'count', 'distinct', 'findAndModify', 'aggregate', 'update', 'delete'}
+# Session and cluster fields pymongo adds to a command that explain must not receive
+DRIVER_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'signature'}
+
+
+def redact(value: Any) -> Any:
+    """
+    Replace every value in a filter by "?", keeping field names and operators
+    :param value: Filter, pipeline or value to redact
+    :return: Shape of the given value
+    """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [redact(item) for item in value]
+    return '?'
+
+
+def filter_shape(command_name: str, command: dict) -> Any:
+    """
+    Get the redacted filter of a command
+    :param command_name: Name of the command
+    :param command: Command document
+    :return: Redacted filter, or None if the command has no filter
+    """
+    if command_name in ('update', 'delete'):
+        statements = command.get('updates' if command_name == 'update' else 'deletes') or [{}]
+        return redact(statements[0].get('q', {}))
+    field = FILTER_FIELDS.get(command_name)
+    return redact(command.get(field, {})) if field else None
+
+
+class SlowQueryLogger(monitoring.CommandListener):
+    """
+    pymongo command listener that logs commands slower than a threshold.
+
+    Each log entry carries the route that issued the command and the redacted filter.
+    A sample of the slow commands is explained in a background thread and its winning
+    plan is logged as a second entry with the same request_id. A negative threshold
+    disables the log.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+                 explain_sample_rate: float = SLOW_QUERY_EXPLAIN_SAMPLE_RATE):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.client = None
+        self._started: dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='explain')
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if self.threshold_ms < 0 or event.command_name == 'explain':
+            return
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = (event.command, current_route())
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event, 'success')
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event, 'failure')
+
+    def _finished(self, event, outcome: str):
+        with self._lock:
+            started = self._started.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if started is None or duration_ms < self.threshold_ms:
+            return
+        command, route = started
+        entry = {
+            'request_id': event.request_id,
+            'command': event.command_name,
+            'database': event.database_name,
+            'collection': command.get(event.command_name),
+            'duration_ms': round(duration_ms, 3),
+            'outcome': outcome,
+            'route': route,
+            'filter': filter_shape(event.command_name, command),
+        }
+        logger.warning('slow mongo command %s', json.dumps(entry, default=str))
+        if (self.client is not None and event.command_name in EXPLAINABLE_COMMANDS
+                and random.random() < self.explain_sample_rate):
+            self._executor.submit(self._explain, entry, event.database_name, command)
+
+    def _explain(self, entry: dict, database_name: str, command: dict):
+        command = {key: value for key, value in command.items()
+                   if not key.startswith('$') and key not in DRIVER_FIELDS}
+        try:
+            result = self.client[database_name].command({'explain': command, 'verbosity': 'queryPlanner'})
+        except PyMongoError as err:
+            logger.info('could not explain slow mongo command %s: %s', entry['request_id'], err)
+            return
+        plan = result.get('queryPlanner', {}).get('winningPlan', result)
+        logger.warning('slow mongo command plan %s',
+                       json.dumps({**entry, 'plan': plan}, default=str))
+
+
+slow_query_logger = SlowQueryLogger()
@@ -0,0 +1,243 @@
+import functools
+import inspect
+import atexit
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueListener
+from uuid import uuid4
+
+from pymongo import monitoring
+
+from app.settings import get_settings
+
+TRACE_SAMPLE_RATE = get_settings().trace_sample_rate
+TRACE_BUFFER_SIZE = get_settings().trace_buffer_size
+TRACE_EXPORT_FILE = get_settings().trace_export_file
+
+
+class Span:
+    __slots__ = ('span_id', 'parent_id', 'name', 'kind', 'start', 'duration', 'attributes')
+
+    def __init__(self, name: str, kind: str, parent_id: str | None, attributes: dict | None = None):
+        self.span_id = uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.duration: float | None = None
+        self.attributes = attributes or {}
+
+    def finish(self, duration: float | None = None):
+        self.duration = time.perf_counter() - self.start if duration is None else duration
+
+
+class Trace:
+    def __init__(self, name: str, trace_id: str | None = None):
+        self.trace_id = trace_id or uuid4().hex
+        self.name = name
+        self.timestamp = time.time()
+        self.root = Span(name, 'request', None)
+        self.spans: list[Span] = [self.root]
+
+    @property
+    def duration(self) -> float | None:
+        return self.root.duration
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'timestamp': self.timestamp,
+            'duration_ms': _milliseconds(self.duration),
+            'spans': [{
+                'span_id': span.span_id,
+                'parent_id': span.parent_id,
+                'name': span.name,
+                'kind': span.kind,
+                'offset_ms': _milliseconds(span.start - self.root.start),
+                'duration_ms': _milliseconds(span.duration),
+                'attributes': span.attributes,
+            } for span in self.spans],
+        }
+
+
+def _milliseconds(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar('current_trace', default=None)
+_current_span: ContextVar[Span | None] = ContextVar('current_span', default=None)
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, kind: str = 'internal', **attributes):
+    """
+    Record a span for the with block if the current request is being traced
+    :param name: Span name
+    :param kind: Layer or dependency the span belongs to (controller, service, mongo, s3, bcrypt...)
+    :param attributes: Extra attributes stored with the span
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get() or trace.root
+    new_span = Span(name, kind, parent.span_id, attributes)
+    trace.spans.append(new_span)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    finally:
+        new_span.finish()
+        _current_span.reset(token)
+
+
+def traced(kind: str):
+    """
+    Class decorator that wraps every public method in a span named "Class.method"
+    :param kind: Layer of the decorated class
+    """
+    def decorate(cls):
+        for attribute, function in list(vars(cls).items()):
+            if attribute.startswith('_') or not inspect.isfunction(function):
+                continue
+            setattr(cls, attribute, _traced_function(function, f"{cls.__name__}.{attribute}", kind))
+        return cls
+    return decorate
+
+
+def _traced_function(function, name: str, kind: str):
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            with span(name, kind):
+                return await function(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(name, kind):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class _TraceFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg.to_dict())
+
+
+class TraceRecorder:
+    """
+    Keeps the most recent finished traces in a ring buffer and optionally exports them to a file.
+    The export is serialized and written by a background thread, so recording never waits on the disk.
+    """
+
+    def __init__(self, size: int = TRACE_BUFFER_SIZE, export_file: str | None = TRACE_EXPORT_FILE):
+        self._traces: deque[Trace] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._export: queue.SimpleQueue | None = None
+        self._listener: QueueListener | None = None
+        if export_file:
+            handler = logging.FileHandler(export_file, delay=True)
+            handler.setFormatter(_TraceFormatter())
+            self._export = queue.SimpleQueue()
+            self._listener = QueueListener(self._export, handler)
+            self._listener.start()
+            atexit.register(self.close)
+
+    def record(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+        if self._export is not None:
+            self._export.put(logging.makeLogRecord({'msg': trace}))
+
+    def close(self):
+        """
+        Write the pending exported traces and stop the export thread
+        """
+        listener, self._listener, self._export = self._listener, None, None
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+    def slowest(self, limit: int) -> list[Trace]:
+        with self._lock:
+            traces = list(self._traces)
+        return sorted(traces, key=lambda trace: trace.duration or 0, reverse=True)[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+recorder = TraceRecorder()
+
+
+@contextmanager
+def start_trace(name: str, sample_rate: float | None = None, trace_id: str | None = None):
+    """
+    Start a sampled trace for the with block and record it when it finishes
+    :param name: Trace name, usually the request method and path
+    :param sample_rate: Probability of tracing this block, TRACE_SAMPLE_RATE by default
+    :param trace_id: Trace id to reuse, e.g. one propagated by the caller
+    :return: The trace, or None if the block wasn't sampled
+    """
+    if random.random() >= (TRACE_SAMPLE_RATE if sample_rate is None else sample_rate):
+        yield None
+        return
+    trace = Trace(name, trace_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.root.finish()
+        _current_trace.reset(token)
+        recorder.record(trace)
+
+
+class MongoTraceListener(monitoring.CommandListener):
+    """
+    pymongo command listener that records a span for every command of a traced request
+    """
+
+    def __init__(self):
+        self._spans: dict[tuple, Span] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        parent = _current_span.get() or trace.root
+        new_span = Span(f"mongo.{event.command_name}", 'mongo', parent.span_id,
+                        {'collection': event.command.get(event.command_name), 'database': event.database_name})
+        trace.spans.append(new_span)
+        with self._lock:
+            self._spans[(event.connection_id, event.request_id)] = new_span
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event)
+
+    def _finished(self, event):
+        with self._lock:
+            finished_span = self._spans.pop((event.connection_id, event.request_id), None)
+        if finished_span is not None:
+            finished_span.finish(event.duration_micros / 1_000_000)
+
+
+mongo_trace_listener = MongoTraceListener()
@@ -0,0 +1,108 @@
+import asyncio
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, HTTPException, Query, Security
+from fastapi.responses import PlainTextResponse
+from starlette import status
+
+from app.data.errors import ProfilerNotRunningError, SnapshotNotFoundError, ProfilerBusyError
+from app.monitoring.allocations import allocation_profiler
+from app.monitoring.sampler import cpu_profiler
+from app.monitoring.tracing import recorder
+from app.services.security import get_current_active_user
+
+router = APIRouter(
+    prefix='/admin',
+    tags=['admin'],
+    responses={
+        401: {
+            'description': 'Unauthorized',
+            'content': {
+                'application/json': {
+                    'example': {
+                        'detail': 'Not enough permissions',
+                    }
+                }
+            }
+        }
+    },
+)
+
+
+AdminScope = Security(get_current_active_user, scopes=["admin"])
+GroupBy = Literal['lineno', 'filename', 'traceback']
+
+
+@router.get('/traces', dependencies=[AdminScope])
+async def get_slowest_traces(limit: Annotated[int, Query(ge=1, le=500)] = 10) -> list[dict]:
+    return [trace.to_dict() for trace in recorder.slowest(limit)]
+
+
+# Allocation profiling. Snapshots are CPU heavy, so these routes run in the threadpool.
+@router.post('/allocations/start', dependencies=[AdminScope])
+def start_allocation_profiling(frames: Annotated[int, Query(ge=1, le=100)] = 10,
+                               sample_rate: Annotated[float, Query(ge=0, le=1)] = 0.1) -> dict:
+    allocation_profiler.start(frames, sample_rate)
+    return allocation_profiler.status()
+
+
+@router.post('/allocations/stop', dependencies=[AdminScope])
+def stop_allocation_profiling() -> dict:
+    # Route peaks are kept after stopping, until the next start
+    allocation_profiler.stop()
+    return allocation_profiler.status()
+
+
+@router.get('/allocations', dependencies=[AdminScope])
+def get_allocation_profiling_status() -> dict:
+    return allocation_profiler.status()
+
+
+@router.post('/allocations/snapshots', dependencies=[AdminScope])
+def take_allocation_snapshot() -> dict:
+    try:
+        return {'id': allocation_profiler.snapshot()}
+    except ProfilerNotRunningError as err:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(err))
+
+
+@router.get('/allocations/top', dependencies=[AdminScope])
+def get_top_allocations(limit: Annotated[int, Query(ge=1, le=500)] = 20, group_by: GroupBy = 'lineno',
+                        snapshot: str | None = None) -> list[dict]:
+    try:
+        return allocation_profiler.top(limit, group_by, snapshot)
+    except ProfilerNotRunningError as err:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(err))
+    except SnapshotNotFoundError as err:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(err))
+
+
+@router.get('/allocations/diff', dependencies=[AdminScope])
+def diff_allocations(first: str, second: str | None = None, limit: Annotated[int, Query(ge=1, le=500)] = 20,
+                     group_by: GroupBy = 'lineno') -> list[dict]:
+    try:
+        return allocation_profiler.diff(first, second, limit, group_by)
+    except ProfilerNotRunningError as err:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(err))
+    except SnapshotNotFoundError as err:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(err))
+
+
+# The sampler runs in its own thread, the request only waits on the event loop for the duration
+@router.get('/profile', response_model=None, dependencies=[AdminScope])
+async def profile_cpu(seconds: Annotated[float, Query(gt=0, le=60)] = 10,
+                      interval_ms: Annotated[float, Query(ge=1, le=1000)] = 10,
+                      output_format: Annotated[Literal['collapsed', 'json'], Query(alias='format')] = 'collapsed',
+                      include_idle: bool = False,
+                      limit: Annotated[int, Query(ge=1, le=500)] = 50) -> PlainTextResponse | dict:
+    try:
+        session = cpu_profiler.start(interval_ms / 1000, include_idle)
+    except ProfilerBusyError as err:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(err))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        session.stop()
+    if output_format == 'json':
+        return session.to_dict(limit)
+    return PlainTextResponse(session.collapsed())
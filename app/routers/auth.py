@@ -1,16 +1,16 @@
-from datetime import timedelta
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Security
+from fastapi import APIRouter, Depends, Form, HTTPException, Security
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette import status
 
 from app.controllers.user_controller import UserController
-from app.data.errors import UserNotFoundError, IncorrectPasswordError
+from app.data.errors import UserNotFoundError, IncorrectPasswordError, InvalidRefreshTokenError
 from app.data.models import User, UserIn
-from app.services.impl import UserService
-from app.services.interfaces import IUserService
-from app.services.security import Token, authenticate_user, ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, \
+from app.services.providers import get_user_service, get_refresh_token_service
+from app.services.interfaces import IUserService, IRefreshTokenService
+from app.services.security import Token, authenticate_user, create_tokens, refresh_tokens, revoke_refresh_token, \
     get_current_active_user
 
 router = APIRouter(
@@ -22,10 +22,11 @@ router = APIRouter(
 
 @router.post("/users", response_model=User, dependencies=[Security(get_current_active_user, scopes=["user_write"])])
 async def register_user(user: UserIn, controller: Annotated[UserController, Depends()]):
+    # Off the event loop: the lookup may wait for a concurrent one of the same user, and hashing is slow
     try:
-        controller.get_by_username(user.username)
+        await run_in_threadpool(controller.get_by_username, user.username)
     except UserNotFoundError:
-        user = controller.register_user(user)
+        user = await run_in_threadpool(controller.register_user, user)
         data = dict(user)
         data.pop('hashed_password')
         data.pop('scopes')
@@ -37,11 +38,15 @@ async def register_user(user: UserIn, controller: Annotated[UserController, Depe
         )
 
 
+RefreshTokenServiceDependency = Annotated[IRefreshTokenService, Depends(get_refresh_token_service)]
+
+
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-                                 user_service: Annotated[IUserService, Depends(UserService)]):
+                                 user_service: Annotated[IUserService, Depends(get_user_service)],
+                                 refresh_token_service: RefreshTokenServiceDependency):
     try:
-        user = authenticate_user(form_data.username, form_data.password, user_service)
+        user = await run_in_threadpool(authenticate_user, form_data.username, form_data.password, user_service)
     except (UserNotFoundError, IncorrectPasswordError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -49,11 +54,31 @@ async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm,
             headers={'WWW-Authenticate': 'Bearer'},
         )
     else:
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={'sub': user.username, "scopes": user.scopes.split()}, expires_delta=access_token_expires
+        return create_tokens(user.username, user.scopes.split(), refresh_token_service)
+
+
+# Renews the access token without the password, so clients don't pay a bcrypt login every half hour
+@router.post("/token/refresh", response_model=Token)
+async def refresh_access_token(refresh_token: Annotated[str, Form()],
+                               user_service: Annotated[IUserService, Depends(get_user_service)],
+                               refresh_token_service: RefreshTokenServiceDependency):
+    try:
+        return await run_in_threadpool(refresh_tokens, refresh_token, refresh_token_service, user_service)
+    except InvalidRefreshTokenError as err:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(err),
+            headers={'WWW-Authenticate': 'Bearer'},
         )
-        return {"access_token": access_token, "token_type": "bearer"}
+
+
+@router.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_token(refresh_token: Annotated[str, Form()], refresh_token_service: RefreshTokenServiceDependency):
+    try:
+        revoke_refresh_token(refresh_token, refresh_token_service)
+    except InvalidRefreshTokenError:
+        # Revoking is idempotent: an unknown token is already unusable
+        pass
 
 
 @router.get("/users/me", response_model=User)
@@ -0,0 +1,61 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Security
+from fastapi.responses import StreamingResponse
+from starlette import status
+
+from app.data.errors import InvalidJobError, JobNotFoundError, JobResultNotFoundError
+from app.data.models import Job, JobIn, User
+from app.services.interfaces import IJobService
+from app.services.jobs import JobService
+from app.services.security import get_current_active_user
+
+router = APIRouter(
+    prefix='/jobs',
+    tags=['jobs'],
+    responses={
+        404: {
+            'description': 'Not found'
+        },
+        401: {
+            'description': 'Unauthorized',
+            'content': {
+                'application/json': {
+                    'example': {
+                        'detail': 'Not enough permissions',
+                    }
+                }
+            }
+        }
+    },
+)
+
+ServiceDependency = Annotated[IJobService, Depends(JobService)]
+
+
+@router.post('/', status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(job: JobIn, job_service: ServiceDependency,
+                     user: Annotated[User, Security(get_current_active_user, scopes=["admin"])]) -> Job:
+    try:
+        return job_service.submit(job.kind, job.params, user.username)
+    except InvalidJobError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+
+
+@router.get('/{job_id}', dependencies=[Security(get_current_active_user, scopes=["admin"])])
+async def get_job(job_id: str, job_service: ServiceDependency) -> Job:
+    try:
+        return job_service.get_by_id(job_id)
+    except JobNotFoundError as err:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(err))
+
+
+@router.get('/{job_id}/result', response_class=StreamingResponse,
+            dependencies=[Security(get_current_active_user, scopes=["admin"])])
+async def download_job_result(job_id: str, job_service: ServiceDependency) -> StreamingResponse:
+    try:
+        file_name, media_type, chunks = job_service.open_result(job_id)
+    except (JobNotFoundError, JobResultNotFoundError) as err:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(err))
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="{file_name}"'})
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.monitoring.metrics import REGISTRY, CONTENT_TYPE
+
+router = APIRouter(
+    tags=['monitoring'],
+)
+
+
+@router.get('/metrics', include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
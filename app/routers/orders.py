@@ -1,11 +1,19 @@
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Security
+from fastapi import APIRouter, Depends, HTTPException, Query, Security
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from starlette import status
 
 from app.controllers.order_controller import OrderController
-from app.data.errors import OrderNotFoundError
-from app.data.models import OrderIn, OrderOut, User
+from app.data.errors import OrderNotFoundError, InvalidCursorError, ExportFormatUnavailableError
+from app.data.models import OrderIn, OrderOut, User, OrderSearch, OrderPage, OrderSort, OrderStatus, \
+    ExpandedOrderOut, OrderEvent, OrderStatusIn, ORDER_LIST_ADAPTER, EXPANDED_ORDER_ADAPTER, \
+    EXPANDED_ORDER_LIST_ADAPTER
+from app.routers.responses import ModelJSONResponse, iter_json_array
+from app.services import export
+from app.services.events import order_events, iter_server_sent_events
 from app.services.security import get_current_active_user
 
 router = APIRouter(
@@ -30,27 +38,123 @@ router = APIRouter(
 
 ControllerDependency = Annotated[OrderController, Depends(OrderController)]
 
+STREAM_BATCH_SIZE = 500
 
-@router.get('/', dependencies=[Security(get_current_active_user, scopes=["order_read"])])
-async def get_orders(controller: ControllerDependency) -> list[OrderOut]:
-    return controller.get_all()
+# expand=products inlines the name and image of the products in the line items
+Expand = Annotated[Literal['products'] | None, Query()]
 
 
-@router.get('/{order_id}', dependencies=[Security(get_current_active_user, scopes=["order_read"])])
-async def get_order(order_id: str, controller: ControllerDependency) -> OrderOut:
+@router.get('/', response_model=list[ExpandedOrderOut] | list[OrderOut], response_class=ModelJSONResponse,
+            dependencies=[Security(get_current_active_user, scopes=["order_read"])])
+async def get_orders(controller: ControllerDependency, stream: bool = False,
+                     expand: Expand = None) -> ModelJSONResponse | StreamingResponse:
+    if stream:
+        if expand:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='Streamed orders can not be expanded')
+        documents = controller.iter_all(STREAM_BATCH_SIZE)
+        return StreamingResponse(iter_json_array(documents, STREAM_BATCH_SIZE), media_type='application/json')
+    orders = controller.get_all()
+    if expand:
+        return ModelJSONResponse(controller.expand_products(orders), EXPANDED_ORDER_LIST_ADAPTER)
+    return ModelJSONResponse(orders, ORDER_LIST_ADAPTER)
+
+
+# Declared before /{order_id}, which would match "search" as an id
+@router.get('/search', dependencies=[Security(get_current_active_user, scopes=["order_read"])])
+async def search_orders(controller: ControllerDependency,
+                        status_: Annotated[OrderStatus | None, Query(alias='status')] = None,
+                        sku: str | None = None, created_from: datetime | None = None,
+                        created_to: datetime | None = None, total_min: float | None = None,
+                        total_max: float | None = None, sort: OrderSort = OrderSort.CREATED_AT,
+                        descending: bool = True, limit: Annotated[int, Query(ge=1, le=500)] = 50,
+                        cursor: str | None = None) -> OrderPage:
+    search = OrderSearch(status=status_, sku=sku, created_from=created_from, created_to=created_to,
+                         total_min=total_min, total_max=total_max, sort=sort, descending=descending, limit=limit,
+                         cursor=cursor)
+    try:
+        return controller.search(search)
+    except InvalidCursorError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+
+
+@router.get('/export', response_class=StreamingResponse,
+            dependencies=[Security(get_current_active_user, scopes=["order_read"])])
+async def export_orders(controller: ControllerDependency,
+                        export_format: Annotated[Literal['csv', 'parquet'], Query(alias='format')] = 'csv',
+                        compress: bool = True, status_: Annotated[OrderStatus | None, Query(alias='status')] = None,
+                        created_from: datetime | None = None, created_to: datetime | None = None,
+                        batch_size: Annotated[int, Query(ge=100, le=50000)] = 5000) -> StreamingResponse:
     try:
-        return controller.get_by_id(order_id)
+        export.check_format(export_format)
+    except ExportFormatUnavailableError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    search = OrderSearch(status=status_, created_from=created_from, created_to=created_to,
+                         sort=OrderSort.CREATED_AT, descending=False)
+    # The iterator is consumed in the threadpool, one batch of the Mongo cursor at a time
+    chunks = export.iter_export(controller.export_batches(search, batch_size), export_format, compress)
+    file_name = export.export_file_name(export_format, compress)
+    media_type = export.export_media_type(export_format, compress)
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="{file_name}"'})
+
+
+# Declared before /{order_id}, which would match "events" as an id
+@router.get('/events', response_class=StreamingResponse)
+async def stream_order_events(user: Annotated[User, Security(get_current_active_user, scopes=["order_read"])],
+                              controller: ControllerDependency, order_id: str | None = None) -> StreamingResponse:
+    # Status changes of the orders of the user are pushed as they happen, instead of polling
+    # GET /orders/{order_id}. With order_id only that order is followed, starting with its current status.
+    # Subscribed before reading the current status, so no change is lost in between
+    subscription = order_events.subscribe(user.username, order_id)
+    initial = []
+    if order_id:
+        try:
+            order = await run_in_threadpool(controller.get_by_id, order_id)
+        except OrderNotFoundError as err:
+            subscription.close()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(err))
+        if order.user != user.username:
+            subscription.close()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Order with id {order_id} not found")
+        initial.append(OrderEvent.from_order(order))
+    return StreamingResponse(iter_server_sent_events(subscription, initial), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@router.get('/{order_id}', response_model=ExpandedOrderOut | OrderOut,
+            dependencies=[Security(get_current_active_user, scopes=["order_read"])])
+async def get_order(order_id: str, controller: ControllerDependency,
+                    expand: Expand = None) -> OrderOut | ModelJSONResponse:
+    try:
+        order = controller.get_by_id(order_id)
     except OrderNotFoundError as err:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(err))
+    if expand:
+        return ModelJSONResponse(controller.expand_products([order])[0], EXPANDED_ORDER_ADAPTER)
+    return order
 
 
-@router.get('/user/{user_id}')
+@router.get('/user/{user_id}', response_model=list[ExpandedOrderOut] | list[OrderOut],
+            response_class=ModelJSONResponse)
 async def get_orders_by_user(user: Annotated[OrderOut, Security(get_current_active_user, scopes=["order_read"])],
-                             controller: ControllerDependency) -> list[OrderOut]:
-    return controller.get_all_by_user(user.username)
+                             controller: ControllerDependency, expand: Expand = None) -> ModelJSONResponse:
+    orders = controller.get_all_by_user(user.username)
+    if expand:
+        return ModelJSONResponse(controller.expand_products(orders), EXPANDED_ORDER_LIST_ADAPTER)
+    return ModelJSONResponse(orders, ORDER_LIST_ADAPTER)
 
 
 @router.post('/')
 async def create_order(order: OrderIn, controller: ControllerDependency,
                        user: Annotated[User, Security(get_current_active_user, scopes=["order_write"])]) -> OrderOut:
     return await controller.create(order, user.username)
+
+
+# Staff only: every user has order_write, which must not let customers complete their own orders
+@router.patch('/{order_id}/status', dependencies=[Security(get_current_active_user, scopes=["admin"])])
+async def update_order_status(order_id: str, order_status: OrderStatusIn, controller: ControllerDependency) -> OrderOut:
+    try:
+        return controller.update_status(order_id, order_status.status)
+    except OrderNotFoundError as err:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(err))
@@ -1,10 +1,11 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Form, Security
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Form, Query, Security
 
 from app.controllers.product_controller import ProductController
 from app.data.errors import ProductNotFoundError, ProductAlreadyExistsError, CouldNotUploadFileError
-from app.data.models import Product
+from app.data.models import Product, ProductBatch, ProductBatchIn, PRODUCT_LIST_ADAPTER
+from app.routers.responses import ModelJSONResponse
 from app.services.security import get_current_active_user
 
 router = APIRouter(
@@ -30,13 +31,28 @@ router = APIRouter(
 ControllerDependency = Annotated[ProductController, Depends(ProductController)]
 
 
-@router.get('/', dependencies=[Security(get_current_active_user, scopes=["product_read"])])
-async def get_products(controller: ControllerDependency) -> list[Product]:
-    return controller.get_all()
+@router.get('/', response_model=list[Product], response_class=ModelJSONResponse,
+            dependencies=[Security(get_current_active_user, scopes=["product_read"])])
+async def get_products(controller: ControllerDependency) -> ModelJSONResponse:
+    return ModelJSONResponse(controller.get_all(), PRODUCT_LIST_ADAPTER)
 
 
+# Declared before /{product_sku}, which would match "search" as a sku
+@router.get('/search', response_model=list[Product], response_class=ModelJSONResponse,
+            dependencies=[Security(get_current_active_user, scopes=["product_read"])])
+def search_products(q: Annotated[str, Query(min_length=1)], controller: ControllerDependency,
+                    limit: Annotated[int, Query(ge=1, le=50)] = 10) -> ModelJSONResponse:
+    return ModelJSONResponse(controller.search(q, limit), PRODUCT_LIST_ADAPTER)
+
+
+@router.post('/batch', dependencies=[Security(get_current_active_user, scopes=["product_read"])])
+def get_products_batch(batch: ProductBatchIn, controller: ControllerDependency) -> ProductBatch:
+    return controller.get_many(batch.skus)
+
+
+# A sync endpoint runs in the threadpool, so concurrent reads of one sku overlap and share one query
 @router.get('/{product_sku}', dependencies=[Security(get_current_active_user, scopes=["product_read"])])
-async def get_product(product_sku: str, controller: ControllerDependency) -> Product:
+def get_product(product_sku: str, controller: ControllerDependency) -> Product:
     try:
         return controller.get_by_sku(product_sku)
     except ProductNotFoundError as err:
@@ -0,0 +1,68 @@
+from typing import Any, Iterable, Iterator
+
+import bson
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+
+def _default(obj: Any) -> Any:
+    """
+    Fallback encoder for the types orjson doesn't know how to serialize
+    :param obj: Object to encode
+    :return: JSON serializable representation of the object
+    """
+    if isinstance(obj, bson.ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize content to JSON bytes with orjson
+    :param content: Content to serialize
+    :return: JSON bytes
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+
+class ModelJSONResponse(JSONResponse):
+    """
+    JSON response for models that are already validated.
+
+    The content is serialized straight to bytes by the given TypeAdapter, so routes
+    returning this response skip FastAPI's second validation and jsonable_encoder pass.
+    The declared response_model is still used for the OpenAPI schema.
+    """
+
+    # status_code is explicit because FastAPI reads its default from the signature for the OpenAPI schema
+    def __init__(self, content: Any, adapter: TypeAdapter, status_code: int = 200, **kwargs):
+        self.adapter = adapter
+        super().__init__(content, status_code=status_code, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return self.adapter.dump_json(content)
+
+
+def iter_json_array(documents: Iterable[dict], batch_size: int = 500) -> Iterator[bytes]:
+    """
+    Stream documents as a JSON array, one chunk per batch.
+    Each document is encoded by orjson as it comes off the cursor, so only one batch is held
+    in memory at a time and no pydantic models are built. The documents are still decoded
+    from BSON by the driver: this bounds memory, it doesn't save the decode.
+    :param documents: Documents, usually a cursor
+    :param batch_size: Number of documents per yielded chunk
+    :return: Iterator over the JSON array chunks
+    """
+    yield b'['
+    separator = b''
+    batch = []
+    for document in documents:
+        batch.append(dumps(document))
+        if len(batch) >= batch_size:
+            yield separator + b','.join(batch)
+            separator = b','
+            batch = []
+    if batch:
+        yield separator + b','.join(batch)
+    yield b']'
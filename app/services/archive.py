@@ -0,0 +1,103 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from pymongo import ReplaceOne
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from app.data.models import OrderStatus
+from app.settings import get_settings
+
+ARCHIVE_COLLECTION = 'orders_archive'
+# Orders are archived when they are finished and older than this, 0 disables the archiver
+ARCHIVE_AFTER_DAYS = get_settings().archive_after_days
+ARCHIVE_INTERVAL_SECONDS = get_settings().archive_interval_seconds
+ARCHIVE_BATCH_SIZE = get_settings().archive_batch_size
+
+ARCHIVED_STATUSES = [OrderStatus.COMPLETED.value, OrderStatus.CANCELLED.value]
+
+logger = logging.getLogger(__name__)
+
+
+class OrderArchiver:
+    """
+    Move finished orders older than a cutoff from the hot orders collection to the archive.
+
+    Each batch is copied to the archive before it's deleted from the hot collection, so an
+    interrupted run loses no order. The delete repeats the archiving conditions with the
+    status each order was copied with, and the copies of orders it skipped because their
+    status changed in the meantime are removed, so the archive only keeps orders that were
+    actually deleted, as they were when deleted. Copies are upserts, so a batch interrupted
+    halfway is completed by the next run and several processes can archive at the same time.
+    """
+
+    def __init__(self, orders: Collection, archive: Collection, after_days: float = ARCHIVE_AFTER_DAYS,
+                 batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.orders = orders
+        self.archive = archive
+        self.after = timedelta(days=after_days)
+        self.batch_size = batch_size
+
+    def archive_batch(self, now: datetime | None = None) -> int:
+        """
+        Archive one batch of orders
+        :param now: Current time, naive UTC
+        :return: Number of orders archived
+        """
+        cutoff = (now or datetime.utcnow()) - self.after
+        query = {'status': {'$in': ARCHIVED_STATUSES}, 'created_at': {'$lt': cutoff}}
+        documents = list(self.orders.find(query, {'_id': False}).limit(self.batch_size))
+        if not documents:
+            return 0
+        self.archive.bulk_write([ReplaceOne({'id': document['id']}, document, upsert=True)
+                                 for document in documents], ordered=False)
+
+        ids_by_status = {}
+        for document in documents:
+            ids_by_status.setdefault(document['status'], []).append(document['id'])
+        # Only the orders still as they were copied are deleted
+        deleted = self.orders.delete_many({
+            'created_at': {'$lt': cutoff},
+            '$or': [{'status': status, 'id': {'$in': ids}} for status, ids in ids_by_status.items()],
+        }).deleted_count
+        if deleted < len(documents):
+            ids = [document['id'] for document in documents]
+            kept = [document['id'] for document in self.orders.find({'id': {'$in': ids}}, {'_id': False, 'id': True})]
+            self.archive.delete_many({'id': {'$in': kept}})
+        return deleted
+
+    def archive_all(self, now: datetime | None = None) -> int:
+        """
+        Archive every order past the cutoff
+        :param now: Current time, naive UTC
+        :return: Number of orders archived
+        """
+        now = now or datetime.utcnow()
+        total = 0
+        while archived := self.archive_batch(now):
+            total += archived
+        return total
+
+
+def start_archiver(archiver: OrderArchiver, interval: float = ARCHIVE_INTERVAL_SECONDS) -> threading.Event:
+    """
+    Run the archiver periodically in a daemon thread
+    :param archiver: Archiver to run
+    :param interval: Seconds between runs
+    :return: Event that stops the thread when set
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            try:
+                archived = archiver.archive_all()
+                if archived:
+                    logger.info('archived %d orders', archived)
+            except PyMongoError as e:
+                logger.warning('order archiving failed: %s', e)
+            stop.wait(interval)
+
+    threading.Thread(target=run, name='order-archiver', daemon=True).start()
+    return stop
@@ -1,22 +1,32 @@
-import os
-
-import boto3
-from botocore.exceptions import ClientError
-from dotenv import load_dotenv
+from functools import lru_cache
 
 from app.data.errors import CouldNotUploadFileError, CouldNotDeleteFileError
+from app.monitoring.metrics import S3_CALL_DURATION
+from app.monitoring.tracing import span
+from app.settings import get_settings
+
+aws_bucket = get_settings().aws_bucket
+aws_region = get_settings().aws_region
 
-load_dotenv()
 
-aws_bucket = os.getenv('AWS_BUCKET')
-aws_region = os.getenv('AWS_REGION')
+@lru_cache(maxsize=None)
+def get_s3_client():
+    """
+    Get the S3 client shared by the process.
+    boto3 is imported on first use because it's the slowest import of the app.
+    :return: boto3 S3 client
+    """
+    import boto3
+    return boto3.client('s3', aws_access_key_id=get_settings().aws_key,
+                        aws_secret_access_key=get_settings().aws_secret)
 
 
 async def upload_file_to_s3(file_name: str, file, bucket: str = aws_bucket) -> str:
-    s3_client = boto3.client('s3', aws_access_key_id=os.getenv('AWS_KEY'),
-                             aws_secret_access_key=os.getenv('AWS_SECRET'))
+    from botocore.exceptions import ClientError
+    s3_client = get_s3_client()
     try:
-        s3_client.upload_fileobj(file, bucket, f"images/{file_name}")
+        with S3_CALL_DURATION.time('upload_fileobj'), span('s3.upload_fileobj', 's3', key=f"images/{file_name}"):
+            s3_client.upload_fileobj(file, bucket, f"images/{file_name}")
         url = f"https://{aws_bucket}.s3.{aws_region}.amazonaws.com/images/{file_name}"
         return url
     except ClientError as e:
@@ -24,10 +34,11 @@ async def upload_file_to_s3(file_name: str, file, bucket: str = aws_bucket) -> s
 
 
 async def delete_file_from_s3(file_name: str, bucket: str = aws_bucket):
-    s3_client = boto3.client('s3', aws_access_key_id=os.getenv('AWS_KEY'),
-                             aws_secret_access_key=os.getenv('AWS_SECRET'))
+    from botocore.exceptions import ClientError
+    s3_client = get_s3_client()
     try:
-        response = s3_client.delete_object(Bucket=bucket, Key=f"images/{file_name}")
+        with S3_CALL_DURATION.time('delete_object'), span('s3.delete_object', 's3', key=f"images/{file_name}"):
+            response = s3_client.delete_object(Bucket=bucket, Key=f"images/{file_name}")
     except ClientError as e:
         raise CouldNotDeleteFileError(e)
     else:
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from typing import AsyncIterator
+
+from app.data.models import OrderEvent
+from app.settings import get_settings
+
+EVENTS_QUEUE_SIZE = get_settings().events_queue_size
+EVENTS_HEARTBEAT_SECONDS = get_settings().events_heartbeat_seconds
+
+
+class Subscription:
+    """
+    Events of one user delivered to one client, read on the event loop that subscribed
+    """
+
+    def __init__(self, broker: 'OrderEventBroker', username: str, order_id: str | None = None,
+                 max_size: int = EVENTS_QUEUE_SIZE):
+        self.broker = broker
+        self.username = username
+        self.order_id = order_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[OrderEvent] = asyncio.Queue(max_size)
+
+    def matches(self, event: OrderEvent) -> bool:
+        return self.order_id is None or event.order_id == self.order_id
+
+    def put(self, event: OrderEvent):
+        # Runs on the loop of the subscriber. A client that doesn't keep up loses its oldest
+        # events: the newer ones carry the current status, which is what clients wait for.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float | None = None) -> OrderEvent | None:
+        """
+        Wait for the next event
+        :param timeout: Seconds to wait
+        :return: The event, or None on timeout
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self) -> 'Subscription':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class OrderEventBroker:
+    """
+    In-process publish/subscribe of order events, keyed by user.
+
+    Publishing is thread safe, so services running in the threadpool can publish, and
+    events are handed to the event loop of each subscriber. Only subscribers in the same
+    process are reached: with several workers, a client only gets the events of the
+    writes its own worker handled.
+    """
+
+    def __init__(self):
+        self._subscriptions: dict[str, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, username: str, order_id: str | None = None) -> Subscription:
+        """
+        Subscribe to the events of the orders of a user. Must be called on an event loop.
+        :param username: Owner of the orders
+        :param order_id: Only get the events of this order
+        :return: Subscription, to be closed when the client leaves
+        """
+        subscription = Subscription(self, username, order_id)
+        with self._lock:
+            self._subscriptions.setdefault(username, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.username)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.username]
+
+    def publish(self, event: OrderEvent) -> int:
+        """
+        Send an event to the subscribers of its user
+        :param event: Order event
+        :return: Number of subscribers it was sent to
+        """
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions.get(event.user, ())
+                             if subscription.matches(event)]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The loop of the subscriber is closed, it's leaving
+                pass
+        return len(subscriptions)
+
+    def subscribers(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+order_events = OrderEventBroker()
+
+
+async def iter_server_sent_events(subscription: Subscription, initial: list[OrderEvent] = (),
+                                  heartbeat: float = EVENTS_HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+    """
+    Encode the events of a subscription as a text/event-stream, until the client disconnects
+    :param subscription: Subscription to read
+    :param initial: Events sent first, e.g. the current status of the order
+    :param heartbeat: Seconds without events before a comment is sent to keep the connection open
+    :return: Iterator of event stream chunks
+    """
+    with subscription:
+        for event in initial:
+            yield encode_event(event)
+        while True:
+            event = await subscription.get(heartbeat)
+            yield encode_event(event) if event else b': heartbeat\n\n'
+
+
+def encode_event(event: OrderEvent) -> bytes:
+    return b'event: order-status\ndata: ' + event.model_dump_json().encode() + b'\n\n'
@@ -0,0 +1,187 @@
+import csv
+import io
+import logging
+import time
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from app.data.compact import CompactOrders
+from app.data.errors import ExportFormatUnavailableError
+
+# Optional dependency, only needed for Parquet exports
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+# One row per line item, with the columns of its order repeated
+EXPORT_COLUMNS = ('order_id', 'user', 'status', 'created_at', 'order_total', 'sku', 'price', 'quantity')
+FORMATS = ('csv', 'parquet')
+MEDIA_TYPES = {'csv': 'text/csv', 'csv.gz': 'application/gzip', 'parquet': 'application/vnd.apache.parquet'}
+
+logger = logging.getLogger(__name__)
+
+
+class ExportStats:
+    """
+    Counters of a running export
+    """
+
+    def __init__(self):
+        self.orders = 0
+        self.rows = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+
+    def add(self, batch: CompactOrders):
+        self.orders += len(batch)
+        self.rows += len(batch.item_skus)
+        self.seconds = time.perf_counter() - self.start
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.rows} rows ({self.orders} orders, {self.bytes} bytes) in {self.seconds:.2f} s, "
+                f"{self.rows_per_second:.0f} rows/s")
+
+
+def _counted(batches: Iterable[CompactOrders], stats: ExportStats) -> Iterator[CompactOrders]:
+    for batch in batches:
+        stats.add(batch)
+        yield batch
+
+
+def iter_csv(batches: Iterable[CompactOrders]) -> Iterator[bytes]:
+    """
+    Encode orders as CSV, one chunk per batch
+    :param batches: Batches of orders
+    :return: Iterator of CSV chunks, the first one with the header
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        for row in batch.iter_line_items():
+            writer.writerow(row[:3] + (row[3].isoformat(),) + row[4:])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file that collects what is written until it's taken
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _to_table(batch: CompactOrders):
+    rows = list(batch.iter_line_items())
+    columns = list(zip(*rows)) if rows else [()] * len(EXPORT_COLUMNS)
+    return pyarrow.table({name: list(values) for name, values in zip(EXPORT_COLUMNS, columns)},
+                         schema=_parquet_schema())
+
+
+def _parquet_schema():
+    return pyarrow.schema([
+        ('order_id', pyarrow.string()), ('user', pyarrow.string()), ('status', pyarrow.string()),
+        ('created_at', pyarrow.timestamp('us')), ('order_total', pyarrow.float64()), ('sku', pyarrow.string()),
+        ('price', pyarrow.float64()), ('quantity', pyarrow.int64()),
+    ])
+
+
+def check_format(export_format: str):
+    """
+    Check that an export format can be produced, before streaming starts
+    :param export_format: "csv" or "parquet"
+    :raises ExportFormatUnavailableError: If the format is unknown or its dependency isn't installed
+    """
+    if export_format not in FORMATS:
+        raise ExportFormatUnavailableError(f"Unknown export format {export_format}")
+    if export_format == 'parquet' and pyarrow is None:
+        raise ExportFormatUnavailableError('Parquet exports need pyarrow, which is not installed')
+
+
+def iter_parquet(batches: Iterable[CompactOrders]) -> Iterator[bytes]:
+    """
+    Encode orders as Parquet, one row group per batch, compressed with zstd
+    :param batches: Batches of orders
+    :return: Iterator of chunks of the Parquet file
+    :raises ExportFormatUnavailableError: If pyarrow isn't installed
+    """
+    check_format('parquet')
+    sink = _ChunkSink()
+    with pyarrow.parquet.ParquetWriter(sink, _parquet_schema(), compression='zstd') as writer:
+        for batch in batches:
+            writer.write_table(_to_table(batch))
+            yield sink.take()
+    yield sink.take()
+
+
+def iter_gzip(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Compress a stream of chunks as one gzip file
+    :param chunks: Chunks to compress
+    :param level: Compression level
+    :return: Iterator of gzip chunks
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_export(batches: Iterable[CompactOrders], export_format: str, compress: bool = False,
+                stats: ExportStats | None = None) -> Iterator[bytes]:
+    """
+    Encode orders in an export format. Only one batch is held in memory at a time.
+    :param batches: Batches of orders, e.g. from IOrderService.export_batches
+    :param export_format: "csv" or "parquet"
+    :param compress: Gzip the CSV output. Parquet is compressed internally and ignores it.
+    :param stats: Counters updated while the export runs
+    :return: Iterator of chunks of the export file
+    """
+    stats = stats or ExportStats()
+    batches = _counted(batches, stats)
+    if export_format == 'parquet':
+        chunks = iter_parquet(batches)
+    else:
+        chunks = iter_csv(batches)
+        if compress:
+            chunks = iter_gzip(chunks)
+    for chunk in chunks:
+        stats.bytes += len(chunk)
+        yield chunk
+    logger.info('order export finished: %s', stats)
+
+
+def export_file_name(export_format: str, compress: bool) -> str:
+    name = f"orders-{datetime.utcnow():%Y%m%d}.{export_format}"
+    return f"{name}.gz" if compress and export_format == 'csv' else name
+
+
+def export_media_type(export_format: str, compress: bool) -> str:
+    return MEDIA_TYPES['csv.gz' if compress and export_format == 'csv' else export_format]
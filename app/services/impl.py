@@ -1,4 +1,5 @@
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, Iterable, Iterator
 
 from bson import ObjectId
 from fastapi import Depends
@@ -6,26 +7,56 @@ from pymongo import ReturnDocument
 from pymongo.errors import PyMongoError
 
 from app.data.errors import ProductNotFoundError, ProductAlreadyExistsError, CouldNotUpdateProductError, \
-    OrderNotFoundError, UserNotFoundError
-from app.data.models import Product, OrderOut, UserInDB
-from app.data.repository import OrdersSystemRepository
-from app.services.interfaces import IProductService, IOrderService, IUserService
-
-
+    OrderNotFoundError, UserNotFoundError, InvalidRefreshTokenError
+from app.data.compact import CompactOrders
+from app.data.models import Product, OrderOut, UserInDB, OrderSearch, OrderPage, OrderStatus, RefreshToken, \
+    PRODUCT_LIST_ADAPTER, ORDER_LIST_ADAPTER
+from app.data.order_search import build_query, to_page
+from app.data.repository import OrdersSystemRepository, relaxed_reads
+from app.monitoring.tracing import traced
+from app.services.archive import ARCHIVE_COLLECTION
+from app.services.interfaces import IProductService, IOrderService, IUserService, IRefreshTokenService
+from app.services.search import product_index
+from app.services.singleflight import SingleFlight
+
+
+@traced('service')
 class ProductService(IProductService):
+    # Shared by every instance, so concurrent requests for one sku make a single query
+    lookups = SingleFlight()
+
     def __init__(self, repository: Annotated[OrdersSystemRepository, Depends(OrdersSystemRepository)]):
         self.product_collection = repository.get_collection('products')
+        # Catalog listings tolerate bounded staleness and can be served by secondaries
+        self.product_reads = repository.get_collection('products', relaxed_reads())
 
     def get_all(self) -> list[Product]:
-        products = list(self.product_collection.find())
-        return list(map(lambda product: Product(**product), products))
+        return PRODUCT_LIST_ADAPTER.validate_python(self.product_reads.find({}, {'_id': False}))
 
     def get_by_sku(self, product_sku: str) -> Product:
-        product = self.product_collection.find_one({'sku': product_sku})
+        # From the primary: lookups by sku are followed by writes, like product updates and orders
+        product = self.lookups.do(product_sku, self.product_collection.find_one, {'sku': product_sku})
         if not product:
             raise ProductNotFoundError(f"Product with sku {product_sku} not found")
         return Product(**product)
 
+    def get_many(self, product_skus: list[str]) -> list[Product]:
+        cursor = self.product_reads.find({'sku': {'$in': product_skus}}, {'_id': False})
+        found = {product.sku: product for product in PRODUCT_LIST_ADAPTER.validate_python(cursor)}
+        # In the order of the request, without duplicates
+        return [found[sku] for sku in dict.fromkeys(product_skus) if sku in found]
+
+    def search(self, query: str, limit: int = 10) -> list[Product]:
+        if product_index.is_stale():
+            # Concurrent searches on a stale index wait for a single rebuild
+            self.lookups.do(('search-index',), self.rebuild_index)
+        return product_index.search(query, limit)
+
+    def rebuild_index(self):
+        # From the primary: writes update the index in place, so a lagging secondary would drop them
+        product_index.rebuild(lambda: PRODUCT_LIST_ADAPTER.validate_python(
+            self.product_collection.find({}, {'_id': False})))
+
     def create(self, product: Product) -> Product:
         found_product = self.product_collection.find_one({'sku': product.sku})
         if found_product:
@@ -33,8 +64,9 @@ class ProductService(IProductService):
 
         product_dict = dict(product)
         _id = self.product_collection.insert_one(product_dict).inserted_id
-        new_product = self.product_collection.find_one({"_id": _id})
-        return Product(**new_product)
+        new_product = Product(**self.product_collection.find_one({"_id": _id}))
+        product_index.add(new_product)
+        return new_product
 
     def update(self, product: Product) -> Product:
         product_dict = dict(product)
@@ -45,29 +77,65 @@ class ProductService(IProductService):
         except PyMongoError as err:
             raise CouldNotUpdateProductError(f"Could not update product with sku {sku}") from err
         else:
-            return Product(**updated_product)
+            updated_product = Product(**updated_product)
+            product_index.add(updated_product)
+            return updated_product
 
     def delete(self, product_sku):
         found = self.product_collection.find_one_and_delete({'sku': product_sku})
         if not found:
             raise ProductNotFoundError(f"Product with sku {product_sku} not found")
+        product_index.remove(product_sku)
         return Product(**found)
 
 
+@traced('service')
 class OrderService(IOrderService):
     def __init__(self, repository: Annotated[OrdersSystemRepository, Depends(OrdersSystemRepository)]):
         self.order_collection = repository.get_collection('orders')
+        # Listings, searches and exports tolerate bounded staleness. Reads by id and by user stay on
+        # the primary, so clients see their orders right after creating them.
+        self.order_reads = repository.get_collection('orders', relaxed_reads())
+        # Cold tier of finished orders, filled by app.services.archive
+        self.archive_collection = repository.get_collection(ARCHIVE_COLLECTION)
 
     def get_all(self) -> list[OrderOut]:
-        orders = list(self.order_collection.find())
-        return list(map(lambda order: OrderOut(**order), orders))
+        return ORDER_LIST_ADAPTER.validate_python(self.order_reads.find({}, {'_id': False}))
 
     def get_all_by_user(self, username: str) -> list[OrderOut]:
-        orders = list(self.order_collection.find({'user': username}))
-        return list(map(lambda order: OrderOut(**order), orders))
+        query = {'user': username}
+        hot = ORDER_LIST_ADAPTER.validate_python(self.order_collection.find(query, {'_id': False}))
+        archived = ORDER_LIST_ADAPTER.validate_python(self.archive_collection.find(query, {'_id': False}))
+        # An order being archived is in both collections until its batch is deleted: the hot copy wins
+        hot_ids = {order.id for order in hot}
+        return hot + [order for order in archived if order.id not in hot_ids]
+
+    def iter_all(self, batch_size: int = 500) -> Iterable[dict]:
+        return self.order_reads.find({}, {'_id': False}, batch_size=batch_size)
+
+    def get_all_compact(self) -> CompactOrders:
+        return CompactOrders.from_documents(self.order_reads.find({}, {'_id': False}))
+
+    def search(self, search: OrderSearch) -> OrderPage:
+        query, sort = build_query(search)
+        # One extra order tells whether there's a next page
+        cursor = self.order_reads.find(query, {'_id': False}).sort(sort).limit(search.limit + 1)
+        return to_page(ORDER_LIST_ADAPTER.validate_python(cursor), search)
+
+    def export_batches(self, search: OrderSearch, batch_size: int = 5000) -> Iterator[CompactOrders]:
+        # The limit of the search doesn't apply, the cursor is read in batches instead
+        query, sort = build_query(search)
+        batch = CompactOrders()
+        for document in self.order_reads.find(query, {'_id': False}, batch_size=batch_size).sort(sort):
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield batch
+                batch = CompactOrders()
+        if len(batch):
+            yield batch
 
     def get_by_id(self, order_id: str) -> OrderOut:
-        order = self.order_collection.find_one({'id': order_id})
+        order = self.order_collection.find_one({'id': order_id}) or self.archive_collection.find_one({'id': order_id})
         if not order:
             raise OrderNotFoundError(f"Order with id {order_id} not found")
         return OrderOut(**order)
@@ -78,13 +146,26 @@ class OrderService(IOrderService):
         new_order = self.order_collection.find_one({"_id": ObjectId(_id)})
         return OrderOut(**new_order)
 
+    def update_status(self, order_id: str, status: OrderStatus) -> OrderOut:
+        # Archived orders are finished, only orders in the hot collection change status
+        order = self.order_collection.find_one_and_update({'id': order_id}, {'$set': {'status': status.value}},
+                                                          projection={'_id': False},
+                                                          return_document=ReturnDocument.AFTER)
+        if not order:
+            raise OrderNotFoundError(f"Order with id {order_id} not found")
+        return OrderOut(**order)
+
 
+@traced('service')
 class UserService(IUserService):
+    # Shared by every instance, so concurrent requests of one user make a single query
+    lookups = SingleFlight()
+
     def __init__(self, repository: Annotated[OrdersSystemRepository, Depends(OrdersSystemRepository)]):
         self.users_collection = repository.get_collection('users')
 
     def get_by_username(self, username: str) -> UserInDB:
-        user = self.users_collection.find_one({'username': username})
+        user = self.lookups.do(username, self.users_collection.find_one, {'username': username})
         if not user:
             raise UserNotFoundError(f"User with username {username} not found")
         return UserInDB(**user)
@@ -94,3 +175,32 @@ class UserService(IUserService):
         _id = self.users_collection.insert_one(user_dict).inserted_id
         new_user = self.users_collection.find_one({"_id": ObjectId(_id)})
         return UserInDB(**new_user)
+
+
+@traced('service')
+class RefreshTokenService(IRefreshTokenService):
+    def __init__(self, repository: Annotated[OrdersSystemRepository, Depends(OrdersSystemRepository)]):
+        self.refresh_tokens_collection = repository.get_collection('refresh_tokens')
+
+    def create(self, refresh_token: RefreshToken) -> RefreshToken:
+        self.refresh_tokens_collection.insert_one(refresh_token.model_dump())
+        return refresh_token
+
+    def use(self, token_hash: str) -> RefreshToken:
+        # Marked as used atomically, so a token can be exchanged only once
+        now = datetime.utcnow()
+        token = self.refresh_tokens_collection.find_one_and_update(
+            {'token_hash': token_hash, 'used_at': None}, {'$set': {'used_at': now}}, projection={'_id': False})
+        if token is None:
+            replayed = self.refresh_tokens_collection.find_one({'token_hash': token_hash})
+            if replayed:
+                # A used token sent again was probably stolen: end the whole login
+                self.revoke_family(replayed['family'])
+            raise InvalidRefreshTokenError('Invalid refresh token')
+        token = RefreshToken(**token)
+        if token.expires_at <= now:
+            raise InvalidRefreshTokenError('Refresh token expired')
+        return token
+
+    def revoke_family(self, family: str):
+        self.refresh_tokens_collection.delete_many({'family': family})
@@ -1,6 +1,9 @@
-from typing import Protocol
+from typing import Protocol, Iterable, Iterator
 
-from app.data.models import Product, OrderOut, UserInDB
+
+from app.data.compact import CompactOrders
+from app.data.models import Product, OrderOut, UserInDB, OrderSearch, OrderPage, OrderStatus, Job, \
+    RefreshToken
 
 
 class IProductService(Protocol):
@@ -10,6 +13,12 @@ class IProductService(Protocol):
     def get_by_sku(self, product_sku: str) -> Product:
         ...
 
+    def get_many(self, product_skus: list[str]) -> list[Product]:
+        ...
+
+    def search(self, query: str, limit: int) -> list[Product]:
+        ...
+
     def create(self, product: Product) -> Product:
         ...
 
@@ -27,12 +36,27 @@ class IOrderService(Protocol):
     def get_all_by_user(self, username: str) -> list[OrderOut]:
         ...
 
+    def iter_all(self, batch_size: int) -> Iterable[dict]:
+        ...
+
+    def get_all_compact(self) -> CompactOrders:
+        ...
+
+    def search(self, search: OrderSearch) -> OrderPage:
+        ...
+
+    def export_batches(self, search: OrderSearch, batch_size: int) -> Iterator[CompactOrders]:
+        ...
+
     def get_by_id(self, order_id: str) -> OrderOut:
         ...
 
     def create(self, order: OrderOut) -> OrderOut:
         ...
 
+    def update_status(self, order_id: str, status: OrderStatus) -> OrderOut:
+        ...
+
 
 class IUserService(Protocol):
     def get_by_username(self, username: str) -> UserInDB:
@@ -40,3 +64,25 @@ class IUserService(Protocol):
 
     def create(self, user: UserInDB) -> UserInDB:
         ...
+
+
+class IRefreshTokenService(Protocol):
+    def create(self, refresh_token: RefreshToken) -> RefreshToken:
+        ...
+
+    def use(self, token_hash: str) -> RefreshToken:
+        ...
+
+    def revoke_family(self, family: str):
+        ...
+
+
+class IJobService(Protocol):
+    def submit(self, kind: str, params: dict, username: str) -> Job:
+        ...
+
+    def get_by_id(self, job_id: str) -> Job:
+        ...
+
+    def open_result(self, job_id: str) -> tuple[str, str, Iterator[bytes]]:
+        ...
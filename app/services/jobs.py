@@ -0,0 +1,355 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Annotated, Callable, Iterable, Iterator, Literal
+
+from fastapi import Depends
+from gridfs import GridFSBucket, NoFile
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from pymongo import ReturnDocument
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from app.data.errors import InvalidJobError, JobNotFoundError, JobResultNotFoundError
+from app.data.models import Job, JobStatus, OrderSearch, OrderSort, OrderStatus
+from app.data.repository import OrdersSystemRepository
+from app.monitoring.tracing import traced
+from app.services import archive, export
+from app.services.impl import OrderService
+from app.services.interfaces import IJobService
+from app.settings import get_settings
+
+JOBS_COLLECTION = 'jobs'
+# GridFS bucket of the files produced by jobs
+JOBS_RESULTS_BUCKET = 'job_results'
+JOBS_WORKERS = get_settings().jobs_workers
+JOBS_STALE_SECONDS = get_settings().jobs_stale_seconds
+JOBS_MAX_ATTEMPTS = get_settings().jobs_max_attempts
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """
+    State of the jobs in a collection, shared by the API and the worker processes
+    """
+
+    def __init__(self, collection: Collection):
+        self.collection = collection
+
+    def create(self, job: Job) -> Job:
+        self.collection.insert_one(job.model_dump())
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        job = self.collection.find_one({'id': job_id}, {'_id': False})
+        return Job(**job) if job else None
+
+    def claim(self, job_id: str) -> Job | None:
+        """
+        Mark a queued job as running, so only one worker runs it
+        :param job_id: Id of the job
+        :return: The claimed job, None if it isn't queued anymore
+        """
+        now = datetime.utcnow()
+        job = self.collection.find_one_and_update(
+            {'id': job_id, 'status': JobStatus.QUEUED.value},
+            {'$set': {'status': JobStatus.RUNNING.value, 'started_at': now, 'updated_at': now},
+             '$inc': {'attempts': 1}},
+            projection={'_id': False}, return_document=ReturnDocument.AFTER)
+        return Job(**job) if job else None
+
+    def progress(self, job_id: str, done: int, total: int | None = None):
+        self._update(job_id, {'done': done, 'total': total})
+
+    def finish(self, job_id: str, result: dict):
+        self._update(job_id, {'status': JobStatus.SUCCEEDED.value, 'result': result, 'finished_at': datetime.utcnow()})
+
+    def fail(self, job_id: str, error: str):
+        self._update(job_id, {'status': JobStatus.FAILED.value, 'error': error, 'finished_at': datetime.utcnow()})
+
+    def _update(self, job_id: str, fields: dict):
+        # Only running jobs change, a job requeued meanwhile belongs to another worker
+        self.collection.update_one({'id': job_id, 'status': JobStatus.RUNNING.value},
+                                   {'$set': {**fields, 'updated_at': datetime.utcnow()}})
+
+    def recover(self, stale_seconds: float = JOBS_STALE_SECONDS,
+                max_attempts: int = JOBS_MAX_ATTEMPTS) -> list[str]:
+        """
+        Queue again the running jobs without progress for too long, whose worker was lost,
+        and fail the ones that already used all their attempts
+        :param stale_seconds: Seconds without progress after which a running job is lost
+        :param max_attempts: Attempts of a job before it fails
+        :return: Ids of the queued jobs, to be submitted to the workers
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+        stale = {'status': JobStatus.RUNNING.value, 'updated_at': {'$lt': cutoff}}
+        self.collection.update_many({**stale, 'attempts': {'$gte': max_attempts}},
+                                    {'$set': {'status': JobStatus.FAILED.value, 'finished_at': datetime.utcnow(),
+                                              'error': 'The job was interrupted too many times'}})
+        self.collection.update_many(stale, {'$set': {'status': JobStatus.QUEUED.value}})
+        return [job['id'] for job in self.collection.find({'status': JobStatus.QUEUED.value}, {'id': True})]
+
+
+class JobResultStore:
+    """
+    Files produced by jobs, kept in GridFS under the id of their job. Any API process can
+    serve them, whichever worker process or host wrote them.
+    """
+
+    def __init__(self, database: Database):
+        self.bucket = GridFSBucket(database, JOBS_RESULTS_BUCKET)
+
+    def save(self, job_id: str, file_name: str, media_type: str, chunks: Iterable[bytes]):
+        """
+        Save the file of a job, replacing the one of a previous attempt
+        :param job_id: Id of the job
+        :param file_name: Name the file is downloaded with
+        :param media_type: Media type of the file
+        :param chunks: Content of the file
+        """
+        try:
+            # Also removes the chunks left by an attempt interrupted before the file was complete
+            self.bucket.delete(job_id)
+        except NoFile:
+            pass
+        with self.bucket.open_upload_stream_with_id(job_id, file_name, metadata={'media_type': media_type}) as stream:
+            for chunk in chunks:
+                stream.write(chunk)
+
+    def open(self, job_id: str) -> tuple[str, str, Iterator[bytes]]:
+        """
+        Open the file of a job
+        :param job_id: Id of the job
+        :return: Name, media type and content of the file, read one GridFS chunk at a time
+        :raises JobResultNotFoundError: If the job has no file
+        """
+        try:
+            file = self.bucket.open_download_stream(job_id)
+        except NoFile:
+            raise JobResultNotFoundError(f"Job with id {job_id} has no result file")
+        return file.filename, file.metadata['media_type'], iter(file)
+
+
+class JobProgress:
+    """
+    Progress callback of a running job, saved at most once per interval
+    """
+
+    def __init__(self, store: JobStore, job_id: str, interval: float = 1.0):
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+        self.saved_at = 0.0
+
+    def __call__(self, done: int, total: int | None = None):
+        now = time.monotonic()
+        if now - self.saved_at >= self.interval:
+            self.saved_at = now
+            self.store.progress(self.job_id, done, total)
+
+
+class JobKind:
+    def __init__(self, params: type[BaseModel], function: Callable[[Job, BaseModel, JobProgress], dict]):
+        self.params = params
+        self.function = function
+
+
+# Handlers of the jobs by kind, filled by @job_kind
+JOB_KINDS: dict[str, JobKind] = {}
+
+
+def job_kind(name: str, params: type[BaseModel]):
+    """
+    Register a function as the handler of a kind of job.
+    It's called in a worker process with the job, its validated parameters and a progress
+    callback, and returns the result of the job, which must be BSON serializable.
+    :param name: Kind of the job
+    :param params: Model of the parameters of the job
+    """
+    def register(function):
+        JOB_KINDS[name] = JobKind(params, function)
+        return function
+    return register
+
+
+def validate_params(kind: str, params: dict) -> dict:
+    """
+    Validate the parameters of a job before it's queued
+    :param kind: Kind of the job
+    :param params: Parameters of the job
+    :return: Validated parameters
+    :raises InvalidJobError: If the kind is unknown or the parameters are invalid
+    """
+    if kind not in JOB_KINDS:
+        raise InvalidJobError(f"Unknown job kind {kind}, expected one of {', '.join(sorted(JOB_KINDS))}")
+    try:
+        return JOB_KINDS[kind].params(**params).model_dump()
+    except ValidationError as e:
+        raise InvalidJobError(f"Invalid parameters for {kind}: {e}")
+
+
+def run_job(job_id: str, store: JobStore | None = None):
+    """
+    Run a job, in a worker process. Its state is only reported through the store.
+    :param job_id: Id of the job
+    :param store: Job store, the jobs collection by default
+    """
+    if store is None:
+        store = JobStore(OrdersSystemRepository().get_collection(JOBS_COLLECTION))
+    job = store.claim(job_id)
+    if job is None:
+        # Already run, or claimed by another worker after a recovery
+        return
+    kind = JOB_KINDS.get(job.kind)
+    try:
+        if kind is None:
+            raise InvalidJobError(f"Unknown job kind {job.kind}")
+        result = kind.function(job, kind.params(**job.params), JobProgress(store, job_id))
+    except Exception as e:
+        logger.exception('job %s (%s) failed', job_id, job.kind)
+        store.fail(job_id, f"{type(e).__name__}: {e}")
+    else:
+        store.finish(job_id, result)
+
+
+class JobRunner:
+    """
+    Run jobs in a pool of worker processes, out of the event loop and the threadpool.
+    Processes are spawned, not forked, so they don't inherit the Mongo client of the API.
+    """
+
+    def __init__(self, workers: int = JOBS_WORKERS, stale_seconds: float = JOBS_STALE_SECONDS):
+        self.workers = workers
+        self.stale_seconds = stale_seconds
+        self._executor: ProcessPoolExecutor | None = None
+        self._store: JobStore | None = None
+        self._lock = threading.Lock()
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def submit(self, job_id: str):
+        executor = self.executor()
+        executor.submit(run_job, job_id).add_done_callback(lambda future: self._done(job_id, future, executor))
+
+    def _done(self, job_id: str, future: Future, executor: ProcessPoolExecutor):
+        error = future.exception()
+        if error is not None:
+            logger.warning('job %s was interrupted: %s', job_id, error)
+        if not isinstance(error, BrokenProcessPool):
+            return
+        with self._lock:
+            # Every job of a broken pool fails with it, the first one replaces the pool
+            if self._executor is not executor:
+                return
+            self._executor = None
+        if self._store is not None:
+            threading.Thread(target=self._recover_after_break, name='jobs-recovery', daemon=True).start()
+
+    def _recover_after_break(self):
+        # The jobs queued in the broken pool are submitted to the new one right away. The jobs
+        # its workers were running are queued once they are stale, like the ones of a restart.
+        self.recover(self._store)
+        time.sleep(self.stale_seconds)
+        self.recover(self._store)
+
+    def recover(self, store: JobStore) -> int:
+        """
+        Submit the queued jobs and the jobs lost with their worker, e.g. after a restart.
+        The store is kept to recover again when a worker dies and the pool is rebuilt.
+        :param store: Job store
+        :return: Number of jobs submitted
+        """
+        self._store = store
+        job_ids = store.recover(self.stale_seconds)
+        for job_id in job_ids:
+            self.submit(job_id)
+        return len(job_ids)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+job_runner = JobRunner()
+
+
+@traced('service')
+class JobService(IJobService):
+    def __init__(self, repository: Annotated[OrdersSystemRepository, Depends(OrdersSystemRepository)]):
+        self.store = JobStore(repository.get_collection(JOBS_COLLECTION))
+        self.results = JobResultStore(repository.db)
+
+    def submit(self, kind: str, params: dict, username: str) -> Job:
+        job = self.store.create(Job(kind=kind, params=validate_params(kind, params), submitted_by=username))
+        job_runner.submit(job.id)
+        return job
+
+    def get_by_id(self, job_id: str) -> Job:
+        job = self.store.get(job_id)
+        if job is None:
+            raise JobNotFoundError(f"Job with id {job_id} not found")
+        return job
+
+    def open_result(self, job_id: str) -> tuple[str, str, Iterator[bytes]]:
+        self.get_by_id(job_id)
+        return self.results.open(job_id)
+
+
+class ExportOrdersParams(BaseModel):
+    format: Literal['csv', 'parquet'] = 'csv'
+    compress: bool = True
+    status: OrderStatus | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+
+    model_config = ConfigDict(use_enum_values=True)
+
+
+@job_kind('export-orders', ExportOrdersParams)
+def export_orders(job: Job, params: ExportOrdersParams, progress: JobProgress) -> dict:
+    export.check_format(params.format)
+    search = OrderSearch(status=params.status, created_from=params.created_from, created_to=params.created_to,
+                         sort=OrderSort.CREATED_AT, descending=False)
+    repository = OrdersSystemRepository()
+    batches = OrderService(repository).export_batches(search)
+    stats = export.ExportStats()
+
+    def chunks():
+        for chunk in export.iter_export(batches, params.format, params.compress, stats):
+            yield chunk
+            progress(stats.orders)
+
+    # Saved in GridFS rather than on the disk of the worker, and downloaded from GET /jobs/{job_id}/result
+    file_name = export.export_file_name(params.format, params.compress)
+    media_type = export.export_media_type(params.format, params.compress)
+    JobResultStore(repository.db).save(job.id, file_name, media_type, chunks())
+    return {'file_name': file_name, 'orders': stats.orders, 'rows': stats.rows, 'bytes': stats.bytes}
+
+
+class ArchiveOrdersParams(BaseModel):
+    # Required: the archiver of the API may be disabled, and a default of 0 would archive every finished order
+    after_days: float = Field(gt=0)
+
+
+@job_kind('archive-orders', ArchiveOrdersParams)
+def archive_orders(job: Job, params: ArchiveOrdersParams, progress: JobProgress) -> dict:
+    repository = OrdersSystemRepository()
+    archiver = archive.OrderArchiver(repository.get_collection('orders'),
+                                     repository.get_collection(archive.ARCHIVE_COLLECTION), params.after_days)
+    now = datetime.utcnow()
+    archived = 0
+    while batch := archiver.archive_batch(now):
+        archived += batch
+        progress(archived)
+    return {'archived': archived}
@@ -0,0 +1,276 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+import orjson
+from fastapi import FastAPI
+
+from app.data.compact import CompactOrders
+from app.data.errors import ProductNotFoundError, ProductAlreadyExistsError, CouldNotUpdateProductError, \
+    OrderNotFoundError, UserNotFoundError, InvalidRefreshTokenError
+from app.data.models import Product, OrderOut, UserInDB, OrderSearch, OrderPage, OrderStatus, RefreshToken, \
+    PRODUCT_LIST_ADAPTER, ORDER_LIST_ADAPTER, USER_LIST_ADAPTER
+from app.data.order_search import search_orders, filter_orders
+from app.monitoring.tracing import traced
+from app.services.interfaces import IProductService, IOrderService, IUserService, IRefreshTokenService
+from app.services.search import ProductSearchIndex
+from app.settings import get_settings
+
+MEMORY_SNAPSHOT_PATH = get_settings().memory_snapshot_path
+MEMORY_SNAPSHOT_INTERVAL = get_settings().memory_snapshot_interval
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryStore:
+    """
+    Process wide storage for the in-memory backend.
+
+    Entities are kept in hash indexes by sku, order id and username, plus a per user
+    index of order ids, so every lookup is constant time. Models handed out by the
+    store are shared and must be treated as read-only: services store copies on write.
+    """
+
+    def __init__(self):
+        self.products: dict[str, Product] = {}
+        self.orders: dict[str, OrderOut] = {}
+        self.orders_by_user: dict[str | None, list[str]] = {}
+        self.users: dict[str, UserInDB] = {}
+        # Not saved in snapshots: clients log in again after a restart
+        self.refresh_tokens: dict[str, RefreshToken] = {}
+        self.product_index = ProductSearchIndex()
+        self.lock = threading.RLock()
+
+    def add_order(self, order: OrderOut):
+        with self.lock:
+            if order.id not in self.orders:
+                self.orders_by_user.setdefault(order.user, []).append(order.id)
+            self.orders[order.id] = order
+
+    def load_documents(self, products: Iterable[dict] = (), orders: Iterable[dict] = (), users: Iterable[dict] = ()):
+        """
+        Add documents to the store, replacing the entities with the same key
+        :param products: Product documents
+        :param orders: Order documents
+        :param users: User documents
+        """
+        with self.lock:
+            for product in PRODUCT_LIST_ADAPTER.validate_python(products):
+                self.products[product.sku] = product
+                self.product_index.add(product)
+            for order in ORDER_LIST_ADAPTER.validate_python(orders):
+                self.add_order(order)
+            for user in USER_LIST_ADAPTER.validate_python(users):
+                self.users[user.username] = user
+
+    def dump(self) -> bytes:
+        with self.lock:
+            products, orders, users = list(self.products.values()), list(self.orders.values()), \
+                list(self.users.values())
+        return orjson.dumps({
+            'products': orjson.Fragment(PRODUCT_LIST_ADAPTER.dump_json(products)),
+            'orders': orjson.Fragment(ORDER_LIST_ADAPTER.dump_json(orders)),
+            'users': orjson.Fragment(USER_LIST_ADAPTER.dump_json(users)),
+        })
+
+    def save(self, path: str):
+        """
+        Write a snapshot of the store. The file is replaced atomically.
+        :param path: Snapshot file
+        """
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'wb') as file:
+            file.write(self.dump())
+        os.replace(temporary_path, path)
+
+    def load(self, path: str):
+        """
+        Load a snapshot written by save
+        :param path: Snapshot file
+        """
+        with open(path, 'rb') as file:
+            data = orjson.loads(file.read())
+        self.load_documents(data.get('products', []), data.get('orders', []), data.get('users', []))
+
+
+@traced('service')
+class InMemoryProductService(IProductService):
+    def __init__(self, store: InMemoryStore):
+        self.store = store
+
+    def get_all(self) -> list[Product]:
+        return list(self.store.products.values())
+
+    def get_by_sku(self, product_sku: str) -> Product:
+        product = self.store.products.get(product_sku)
+        if not product:
+            raise ProductNotFoundError(f"Product with sku {product_sku} not found")
+        return product
+
+    def get_many(self, product_skus: list[str]) -> list[Product]:
+        products = self.store.products
+        return [products[sku] for sku in dict.fromkeys(product_skus) if sku in products]
+
+    def search(self, query: str, limit: int = 10) -> list[Product]:
+        return self.store.product_index.search(query, limit)
+
+    def create(self, product: Product) -> Product:
+        with self.store.lock:
+            if product.sku in self.store.products:
+                raise ProductAlreadyExistsError(f"Product with sku {product.sku} already exists")
+            self.store.products[product.sku] = product.model_copy()
+            self.store.product_index.add(self.store.products[product.sku])
+        return product
+
+    def update(self, product: Product) -> Product:
+        with self.store.lock:
+            if product.sku not in self.store.products:
+                raise CouldNotUpdateProductError(f"Could not update product with sku {product.sku}")
+            self.store.products[product.sku] = product.model_copy()
+            self.store.product_index.add(self.store.products[product.sku])
+        return product
+
+    def delete(self, product_sku):
+        with self.store.lock:
+            product = self.store.products.pop(product_sku, None)
+            self.store.product_index.remove(product_sku)
+        if not product:
+            raise ProductNotFoundError(f"Product with sku {product_sku} not found")
+        return product
+
+
+@traced('service')
+class InMemoryOrderService(IOrderService):
+    def __init__(self, store: InMemoryStore):
+        self.store = store
+
+    def get_all(self) -> list[OrderOut]:
+        return list(self.store.orders.values())
+
+    def get_all_by_user(self, username: str) -> list[OrderOut]:
+        with self.store.lock:
+            return [self.store.orders[order_id] for order_id in self.store.orders_by_user.get(username, [])]
+
+    def iter_all(self, batch_size: int = 500) -> Iterable[dict]:
+        return (order.model_dump() for order in self.get_all())
+
+    def get_all_compact(self) -> CompactOrders:
+        return CompactOrders.from_documents(order.model_dump() for order in self.get_all())
+
+    def search(self, search: OrderSearch) -> OrderPage:
+        return search_orders(self.get_all(), search)
+
+    def export_batches(self, search: OrderSearch, batch_size: int = 5000) -> Iterator[CompactOrders]:
+        orders = filter_orders(self.get_all(), search)
+        for start in range(0, len(orders), batch_size):
+            yield CompactOrders.from_documents(order.model_dump() for order in orders[start:start + batch_size])
+
+    def get_by_id(self, order_id: str) -> OrderOut:
+        order = self.store.orders.get(order_id)
+        if not order:
+            raise OrderNotFoundError(f"Order with id {order_id} not found")
+        return order
+
+    def create(self, order: OrderOut) -> OrderOut:
+        self.store.add_order(order.model_copy(deep=True))
+        return order
+
+    def update_status(self, order_id: str, status: OrderStatus) -> OrderOut:
+        with self.store.lock:
+            order = self.get_by_id(order_id).model_copy(update={'status': status.value})
+            self.store.add_order(order)
+        return order
+
+
+@traced('service')
+class InMemoryUserService(IUserService):
+    def __init__(self, store: InMemoryStore):
+        self.store = store
+
+    def get_by_username(self, username: str) -> UserInDB:
+        user = self.store.users.get(username)
+        if not user:
+            raise UserNotFoundError(f"User with username {username} not found")
+        return user
+
+    def create(self, user: UserInDB) -> UserInDB:
+        with self.store.lock:
+            self.store.users[user.username] = user.model_copy()
+        return user
+
+
+@traced('service')
+class InMemoryRefreshTokenService(IRefreshTokenService):
+    def __init__(self, store: InMemoryStore):
+        self.store = store
+
+    def create(self, refresh_token: RefreshToken) -> RefreshToken:
+        with self.store.lock:
+            self.store.refresh_tokens[refresh_token.token_hash] = refresh_token.model_copy()
+        return refresh_token
+
+    def use(self, token_hash: str) -> RefreshToken:
+        now = datetime.utcnow()
+        with self.store.lock:
+            token = self.store.refresh_tokens.get(token_hash)
+            if token is None:
+                raise InvalidRefreshTokenError('Invalid refresh token')
+            if token.used_at is not None:
+                self.revoke_family(token.family)
+                raise InvalidRefreshTokenError('Invalid refresh token')
+            token = token.model_copy(update={'used_at': now})
+            self.store.refresh_tokens[token_hash] = token
+        if token.expires_at <= now:
+            raise InvalidRefreshTokenError('Refresh token expired')
+        return token
+
+    def revoke_family(self, family: str):
+        with self.store.lock:
+            for token_hash in [token.token_hash for token in self.store.refresh_tokens.values()
+                               if token.family == family]:
+                del self.store.refresh_tokens[token_hash]
+
+
+@lru_cache(maxsize=None)
+def get_store() -> InMemoryStore:
+    """
+    Get the store shared by every in-memory service of the process, created on first use
+    :return: InMemoryStore instance
+    """
+    return InMemoryStore()
+
+
+def setup(app: FastAPI, snapshot_path: str | None = MEMORY_SNAPSHOT_PATH,
+          snapshot_interval: float = MEMORY_SNAPSHOT_INTERVAL) -> InMemoryStore:
+    """
+    Load the shared store from its snapshot and save it back while the app runs.
+    The services themselves are selected by the dependency providers of app.services.providers.
+    :param app: FastAPI application
+    :param snapshot_path: File to load the store from and save it to, if any
+    :param snapshot_interval: Seconds between periodic snapshots, 0 to save only at shutdown
+    :return: The store used by the services
+    """
+    store = get_store()
+    if snapshot_path and os.path.exists(snapshot_path):
+        store.load(snapshot_path)
+        logger.info('in-memory store loaded from %s', snapshot_path)
+
+    if snapshot_path:
+        stop = threading.Event()
+
+        def save_periodically():
+            while not stop.wait(snapshot_interval):
+                store.save(snapshot_path)
+
+        def save_at_shutdown():
+            stop.set()
+            store.save(snapshot_path)
+            logger.info('in-memory store saved to %s', snapshot_path)
+
+        if snapshot_interval > 0:
+            threading.Thread(target=save_periodically, name='memory-snapshot', daemon=True).start()
+        app.add_event_handler('shutdown', save_at_shutdown)
+    return store
@@ -0,0 +1,48 @@
+from app.data.repository import OrdersSystemRepository
+from app.services import memory
+from app.services.impl import ProductService, OrderService, UserService, RefreshTokenService
+from app.services.interfaces import IProductService, IOrderService, IUserService, IRefreshTokenService
+from app.settings import get_settings
+
+# "mongo" (default) or "memory"
+SERVICE_BACKEND = get_settings().service_backend
+
+
+def get_product_service() -> IProductService:
+    """
+    Get the product service of the configured backend
+    :return: In-memory service if SERVICE_BACKEND is "memory", MongoDB service otherwise
+    """
+    if SERVICE_BACKEND == 'memory':
+        return memory.InMemoryProductService(memory.get_store())
+    return ProductService(OrdersSystemRepository())
+
+
+def get_order_service() -> IOrderService:
+    """
+    Get the order service of the configured backend
+    :return: In-memory service if SERVICE_BACKEND is "memory", MongoDB service otherwise
+    """
+    if SERVICE_BACKEND == 'memory':
+        return memory.InMemoryOrderService(memory.get_store())
+    return OrderService(OrdersSystemRepository())
+
+
+def get_user_service() -> IUserService:
+    """
+    Get the user service of the configured backend
+    :return: In-memory service if SERVICE_BACKEND is "memory", MongoDB service otherwise
+    """
+    if SERVICE_BACKEND == 'memory':
+        return memory.InMemoryUserService(memory.get_store())
+    return UserService(OrdersSystemRepository())
+
+
+def get_refresh_token_service() -> IRefreshTokenService:
+    """
+    Get the refresh token service of the configured backend
+    :return: In-memory service if SERVICE_BACKEND is "memory", MongoDB service otherwise
+    """
+    if SERVICE_BACKEND == 'memory':
+        return memory.InMemoryRefreshTokenService(memory.get_store())
+    return RefreshTokenService(OrdersSystemRepository())
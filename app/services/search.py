@@ -0,0 +1,195 @@
+import heapq
+import re
+import threading
+import time
+from typing import Callable, Iterable
+
+from app.data.models import Product
+from app.settings import get_settings
+
+# Rebuilding the index periodically picks up the changes made by other processes
+PRODUCT_INDEX_REFRESH_SECONDS = get_settings().product_index_refresh_seconds
+
+TOKEN_PATTERN = re.compile(r'\w+')
+# A match in the name counts more than one in the description
+NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class _TrieNode:
+    __slots__ = ('children', 'terminal')
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        self.terminal = False
+
+
+class ProductSearchIndex:
+    """
+    Inverted index and prefix trie over product names and descriptions.
+
+    Every query token must match a product; the last one is matched as a prefix, so
+    results follow the user while they type. Products are ranked by where the tokens
+    matched (name over description), then by name.
+    """
+
+    def __init__(self):
+        self.products: dict[str, Product] = {}
+        self._postings: dict[str, dict[str, int]] = {}
+        self._tokens: dict[str, set[str]] = {}
+        self._trie = _TrieNode()
+        self._lock = threading.RLock()
+        # Changes made while a rebuild reads the catalog, by sku, None for a removed product
+        self._pending: dict[str, Product | None] | None = None
+        self.built_at: float | None = None
+
+    def build(self, products: Iterable[Product]):
+        """
+        Replace the content of the index
+        :param products: Every product of the catalog
+        """
+        with self._lock:
+            self.products.clear()
+            self._postings.clear()
+            self._tokens.clear()
+            self._trie = _TrieNode()
+            for product in products:
+                self.add(product)
+            self.built_at = time.monotonic()
+
+    def rebuild(self, load: Callable[[], Iterable[Product]]):
+        """
+        Replace the content of the index with the catalog read by load.
+        The catalog is read without the lock, so searches aren't blocked meanwhile, and the
+        products added or removed during the read are replayed on the new content.
+        :param load: Function reading every product of the catalog
+        """
+        with self._lock:
+            self._pending = {}
+        try:
+            products = list(load())
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self.build(products)
+            for sku, product in pending.items():
+                if product is None:
+                    self.remove(sku)
+                else:
+                    self.add(product)
+
+    def is_stale(self, refresh_seconds: float = PRODUCT_INDEX_REFRESH_SECONDS) -> bool:
+        if self.built_at is None:
+            return True
+        return refresh_seconds > 0 and time.monotonic() - self.built_at > refresh_seconds
+
+    def add(self, product: Product):
+        """
+        Index a product, replacing the previous version with the same sku
+        :param product: Product to index
+        """
+        weights: dict[str, int] = {}
+        for token in tokenize(product.name):
+            weights[token] = weights.get(token, 0) + NAME_WEIGHT
+        for token in tokenize(product.description):
+            weights[token] = weights.get(token, 0) + DESCRIPTION_WEIGHT
+        with self._lock:
+            self.remove(product.sku)
+            if self._pending is not None:
+                self._pending[product.sku] = product
+            self.products[product.sku] = product
+            self._tokens[product.sku] = set(weights)
+            for token, weight in weights.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    self._insert_token(token)
+                postings[product.sku] = weight
+
+    def remove(self, sku: str):
+        """
+        Remove a product from the index, if it's there
+        :param sku: Sku of the product
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending[sku] = None
+            self.products.pop(sku, None)
+            for token in self._tokens.pop(sku, ()):
+                postings = self._postings[token]
+                del postings[sku]
+                if not postings:
+                    del self._postings[token]
+                    self._delete_token(token)
+
+    def search(self, query: str, limit: int = 10) -> list[Product]:
+        """
+        Search products
+        :param query: Words to search, the last one may be incomplete
+        :param limit: Maximum number of products
+        :return: Best matching products first
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            scores = None
+            for position, token in enumerate(tokens):
+                if position == len(tokens) - 1:
+                    matches = {}
+                    for completion in self._complete(token):
+                        for sku, weight in self._postings[completion].items():
+                            matches[sku] = max(matches.get(sku, 0), weight)
+                else:
+                    matches = self._postings.get(token, {})
+                if scores is None:
+                    scores = dict(matches)
+                else:
+                    scores = {sku: score + matches[sku] for sku, score in scores.items() if sku in matches}
+                if not scores:
+                    return []
+            ranked = heapq.nsmallest(limit, scores, key=lambda sku: (-scores[sku], self.products[sku].name))
+            return [self.products[sku] for sku in ranked]
+
+    def _insert_token(self, token: str):
+        node = self._trie
+        for character in token:
+            node = node.children.setdefault(character, _TrieNode())
+        node.terminal = True
+
+    def _delete_token(self, token: str):
+        path = [self._trie]
+        for character in token:
+            path.append(path[-1].children[character])
+        path[-1].terminal = False
+        # Prune the branches left without tokens
+        for depth in range(len(token), 0, -1):
+            if path[depth].terminal or path[depth].children:
+                break
+            del path[depth - 1].children[token[depth - 1]]
+
+    def _complete(self, prefix: str) -> list[str]:
+        node = self._trie
+        for character in prefix:
+            node = node.children.get(character)
+            if node is None:
+                return []
+        completions = []
+        stack = [(node, prefix)]
+        while stack:
+            node, token = stack.pop()
+            if node.terminal:
+                completions.append(token)
+            stack.extend((child, token + character) for character, child in node.children.items())
+        return completions
+
+
+# Index of the Mongo backed catalog, shared by every request of the process
+product_index = ProductSearchIndex()
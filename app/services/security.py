@@ -1,29 +1,35 @@
-import os
+import hashlib
+import hmac
+import secrets
 from datetime import timedelta, datetime
+from functools import lru_cache
 from typing import Annotated
 
-from dotenv import load_dotenv
-from fastapi import Depends, HTTPException, Security
+from fastapi import Depends, HTTPException, Request, Security
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 
 # noinspection PyPackageRequirements
 from jose import jwt, JWTError
 
-from passlib.context import CryptContext
 from pydantic import BaseModel
 from starlette import status
 
-from app.data.errors import UserNotFoundError, IncorrectPasswordError
-from app.data.models import User
-from app.services.impl import UserService
-from app.services.interfaces import IUserService
-
-load_dotenv()
+from app.data.errors import UserNotFoundError, IncorrectPasswordError, InvalidRefreshTokenError
+from app.data.models import User, RefreshToken
+from app.monitoring.metrics import SECURITY_DURATION
+from app.monitoring.tracing import span
+from app.services.providers import get_user_service
+from app.services.interfaces import IUserService, IRefreshTokenService
+from app.settings import get_settings
 
 # Constant values for JWT
-SECRET_KEY = os.getenv("JWT_ENCODING_KEY")
+SECRET_KEY = get_settings().jwt_encoding_key
 ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = get_settings().refresh_token_expire_days
+# Request state entry holding the last verified token and its payload
+TOKEN_STATE_KEY = 'verified_token'
 
 
 class Token(BaseModel):
@@ -32,6 +38,7 @@ class Token(BaseModel):
     """
     access_token: str
     token_type: str
+    refresh_token: str | None = None
 
 
 class TokenData(BaseModel):
@@ -42,8 +49,16 @@ class TokenData(BaseModel):
     scopes: list[str] = []
 
 
-# Passlib context for hashing passwords
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+@lru_cache(maxsize=None)
+def get_password_context():
+    """
+    Get the passlib context for hashing passwords.
+    passlib and bcrypt are imported on first use to keep them out of the startup path.
+    :return: CryptContext instance
+    """
+    from passlib.context import CryptContext
+    return CryptContext(schemes=['bcrypt'], deprecated='auto')
+
 
 # OAuth2 flow for authentication with Bearer token
 oauth2_scheme = OAuth2PasswordBearer(
@@ -56,6 +71,7 @@ oauth2_scheme = OAuth2PasswordBearer(
         "order_read": "Read all orders",
         "order_write": "Create orders",
         "user_write": "Create users",
+        "admin": "Use the diagnostic endpoints",
     }
 )
 
@@ -67,7 +83,8 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     :param hashed_password: Hashed password
     :return: True if passwords match, False otherwise
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    with SECURITY_DURATION.time('bcrypt_verify'), span('bcrypt.verify', 'bcrypt'):
+        return get_password_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
@@ -76,7 +93,8 @@ def get_password_hash(password: str) -> str:
     :param password: Password to hash
     :return: Hashed password
     """
-    return pwd_context.hash(password)
+    with SECURITY_DURATION.time('bcrypt_hash'), span('bcrypt.hash', 'bcrypt'):
+        return get_password_context().hash(password)
 
 
 def authenticate_user(username: str, password: str,
@@ -113,13 +131,105 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({'exp': expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    with SECURITY_DURATION.time('jwt_encode'):
+        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-async def get_current_user(security_scopes: SecurityScopes,
+def get_token_payload(token: str, state: dict | None = None) -> dict | None:
+    """
+    Verify a JWT token and get its payload.
+    The result is kept in the request state, so the admission middleware and get_current_user
+    verify the token of a request once.
+    :param token: JWT token
+    :param state: ASGI state of the request, None to verify without caching
+    :return: Payload of the token, None if the token is invalid or expired
+    """
+    verified = state.get(TOKEN_STATE_KEY) if state is not None else None
+    if verified is not None and hmac.compare_digest(verified[0], token):
+        return verified[1]
+    try:
+        with SECURITY_DURATION.time('jwt_decode'):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        payload = None
+    if state is not None:
+        state[TOKEN_STATE_KEY] = (token, payload)
+    return payload
+
+
+def hash_refresh_token(refresh_token: str) -> str:
+    """
+    Get the HMAC of a refresh token, which is what the server stores.
+    Refresh tokens are random, so a keyed hash is enough: unlike passwords, they don't need bcrypt.
+    :param refresh_token: Refresh token
+    :return: Hex digest of the token
+    """
+    with SECURITY_DURATION.time('refresh_token_hmac'):
+        return hmac.new(SECRET_KEY.encode(), refresh_token.encode(), hashlib.sha256).hexdigest()
+
+
+def create_tokens(username: str, scopes: list[str], refresh_token_service: IRefreshTokenService,
+                  rotated: RefreshToken | None = None) -> dict:
+    """
+    Create an access token and a refresh token for a user
+    :param username: Username of the user
+    :param scopes: Scopes of the tokens
+    :param refresh_token_service: Refresh token service dependency
+    :param rotated: Refresh token replaced by the new one, None for a new login. The new token
+        keeps its family and its expiration, so a login can't be extended by refreshing it.
+    :return: Token response, with the access token and the refresh token
+    """
+    access_token = create_access_token(data={'sub': username, 'scopes': scopes},
+                                       expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    refresh_token = secrets.token_urlsafe(32)
+    record = RefreshToken(token_hash=hash_refresh_token(refresh_token), username=username, scopes=scopes,
+                          expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    if rotated:
+        record.family = rotated.family
+        record.expires_at = rotated.expires_at
+    refresh_token_service.create(record)
+    return {'access_token': access_token, 'token_type': 'bearer', 'refresh_token': refresh_token}
+
+
+def refresh_tokens(refresh_token: str, refresh_token_service: IRefreshTokenService,
+                   user_service: IUserService) -> dict:
+    """
+    Exchange a refresh token for a new access token and a new refresh token.
+    The refresh token can't be used again, and replaying it revokes the tokens rotated from it.
+    The new tokens get the current scopes of the user, and the login ends if the user was
+    disabled or deleted since.
+    :param refresh_token: Refresh token
+    :param refresh_token_service: Refresh token service dependency
+    :param user_service: User service dependency
+    :return: Token response, with the access token and the refresh token
+    :raises InvalidRefreshTokenError: If the token is unknown, used or expired, or its user is disabled
+    """
+    record = refresh_token_service.use(hash_refresh_token(refresh_token))
+    try:
+        user = user_service.get_by_username(record.username)
+    except UserNotFoundError:
+        user = None
+    if user is None or user.disabled:
+        refresh_token_service.revoke_family(record.family)
+        raise InvalidRefreshTokenError('Invalid refresh token')
+    return create_tokens(user.username, user.scopes.split(), refresh_token_service, record)
+
+
+def revoke_refresh_token(refresh_token: str, refresh_token_service: IRefreshTokenService):
+    """
+    Revoke a refresh token and the tokens rotated from the same login, e.g. at logout
+    :param refresh_token: Refresh token
+    :param refresh_token_service: Refresh token service dependency
+    :raises InvalidRefreshTokenError: If the token is unknown, used or expired
+    """
+    record = refresh_token_service.use(hash_refresh_token(refresh_token))
+    refresh_token_service.revoke_family(record.family)
+
+
+async def get_current_user(security_scopes: SecurityScopes, request: Request,
                            token: Annotated[str, Depends(oauth2_scheme)],
-                           user_service: Annotated[UserService, Depends(UserService)]) -> User:
+                           user_service: Annotated[IUserService, Depends(get_user_service)]) -> User:
     """
     Get the current user from the JWT token.
 
@@ -127,6 +237,7 @@ async def get_current_user(security_scopes: SecurityScopes,
     It will check if the token is valid and if the user has the required scopes.
 
     :param security_scopes: Security scopes of the token
+    :param request: Request, whose state may already hold the verified token
     :param token: JWT token
     :param user_service: User service dependency
     :return: User if authentication is successful
@@ -144,33 +255,27 @@ async def get_current_user(security_scopes: SecurityScopes,
         headers={'WWW-Authenticate': 'Bearer'}
     )
 
+    # Decode the token, unless the admission middleware already did, and get the username and scopes
+    payload = get_token_payload(token, request.scope.setdefault('state', {}))
+    if payload is None or payload.get('sub') is None:  # sub is the username
+        raise credentials_exception
+    # Create a TokenData object with the username and scopes
+    token_data = TokenData(scopes=payload.get('scopes', []), username=payload['sub'])
     try:
-        # Decode the token and get the username and scopes
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get('sub')  # sub is the username
-        if username is None:
-            raise credentials_exception
-        token_scopes = payload.get('scopes', [])
-        # Create a TokenData object with the username and scopes
-        token_data = TokenData(scopes=token_scopes, username=username)
-    except JWTError:
+        # If the token is valid, get the user from the database, off the event loop
+        user = await run_in_threadpool(user_service.get_by_username, token_data.username)
+    except UserNotFoundError:
         raise credentials_exception
     else:
-        try:
-            # If the token is valid, get the user from the database
-            user = user_service.get_by_username(token_data.username)
-        except UserNotFoundError:
-            raise credentials_exception
-        else:
-            # Check if the user has the required scopes
-            for scope in security_scopes.scopes:
-                if scope not in token_data.scopes:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail='Not enough permissions',
-                        headers={'WWW-Authenticate': authenticate_value}
-                    )
-            return user
+        # Check if the user has the required scopes
+        for scope in security_scopes.scopes:
+            if scope not in token_data.scopes:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail='Not enough permissions',
+                    headers={'WWW-Authenticate': authenticate_value}
+                )
+        return user
 
 
 async def get_current_active_user(current_user: Annotated[User, Security(get_current_user, scopes=["me"])]) -> User:
@@ -0,0 +1,100 @@
+from functools import lru_cache
+from typing import Literal
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Application configuration, read once from the environment and the .env file.
+    Field names match the environment variables case-insensitively.
+    """
+    model_config = SettingsConfigDict(env_file='.env', extra='ignore')
+
+    # MongoDB
+    db_user: str | None = None
+    db_password: str | None = None
+    db_host: str | None = None
+    db_name: str | None = None
+    # Full connection string, replaces the Atlas URI built from the values above,
+    # e.g. "mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0"
+    db_uri: str | None = None
+    # Read preference of catalog and list reads, "primary" keeps every read on the primary
+    db_relaxed_read_preference: Literal['primary', 'secondaryPreferred', 'secondary', 'nearest'] = \
+        'secondaryPreferred'
+    # Maximum replication lag of the secondaries those reads go to, MongoDB requires at least 90
+    db_max_staleness_seconds: int = Field(default=120, ge=90)
+
+    # AWS S3, for product images
+    aws_key: str | None = None
+    aws_secret: str | None = None
+    aws_region: str | None = None
+    aws_bucket: str | None = None
+
+    # JWT
+    jwt_encoding_key: str | None = None
+    # Lifetime of refresh tokens, each refresh rotates the token and restarts it
+    refresh_token_expire_days: float = 14
+
+    # Response compression
+    compression_minimum_size: int = 1024
+    compression_level: int = 6
+    # Comma separated path prefixes with their own level, e.g. "/orders=4,/products=9"
+    compression_route_levels: str = ''
+
+    # Slow query log, a negative threshold disables it
+    slow_query_threshold_ms: float = 100
+    slow_query_explain_sample_rate: float = 0.1
+
+    # Request tracing
+    trace_sample_rate: float = 0.05
+    trace_buffer_size: int = 500
+    # Optional JSON lines file where every finished trace is appended
+    trace_export_file: str | None = None
+
+    # Admission control: in-flight requests per route class, 0 means unlimited
+    admission_auth_limit: int = 32
+    admission_read_limit: int = 256
+    admission_write_limit: int = 64
+    # Mongo pool wait above which the limits are scaled down
+    admission_pool_wait_threshold_ms: float = 50
+    # Seconds clients are asked to wait when a request is shed
+    admission_retry_after: int = 1
+    # Token bucket per client (user of a valid bearer token, or IP), a rate of 0 disables it
+    rate_limit_per_second: float = 50
+    rate_limit_burst: int = 100
+
+    # Seconds after which the product search index is rebuilt from the database, 0 never rebuilds it
+    product_index_refresh_seconds: float = 300
+
+    # Order status events buffered per client, and seconds between keep-alive comments on idle streams
+    events_queue_size: int = 100
+    events_heartbeat_seconds: float = 15
+
+    # Finished orders older than this many days move to the archive collection, 0 disables it
+    archive_after_days: float = 180
+    archive_interval_seconds: float = 3600
+    archive_batch_size: int = 1000
+
+    # Worker processes of background jobs
+    jobs_workers: int = 2
+    # Running jobs without progress for this many seconds are considered lost with their worker and queued again
+    jobs_stale_seconds: float = 600
+    jobs_max_attempts: int = 3
+
+    # Backend of the services, "memory" keeps every entity in process and needs no MongoDB
+    service_backend: Literal['mongo', 'memory'] = 'mongo'
+    # Optional file the in-memory backend is loaded from at startup and saved to
+    memory_snapshot_path: str | None = None
+    # Seconds between periodic snapshots, 0 saves only at shutdown
+    memory_snapshot_interval: float = 0
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    Get the settings of the process, loaded on first use
+    :return: Settings instance
+    """
+    return Settings()
@@ -0,0 +1,81 @@
+"""
+Memory benchmark for the compact order representation.
+
+Builds the same set of orders as a list of OrderOut models and as a CompactOrders
+container and reports the memory each one keeps. Both are filled from documents
+decoded from BSON inside the measurement, like a cursor would hand them out, so the
+id, sku and user strings either representation holds on to are counted too.
+
+Usage: python -m benchmarks.compact_orders [--orders 100000]
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+from typing import Iterator
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import bson
+
+from app.data.compact import CompactOrders
+from app.data.models import OrderOut
+
+
+def generate_documents(count: int, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    skus = [f"SKU{number:05d}" for number in range(2000)]
+    users = [f"user_{number}" for number in range(5000)]
+    start = datetime(2023, 1, 1)
+    documents = []
+    for _ in range(count):
+        products = [{'sku': rng.choice(skus), 'price': round(rng.uniform(1, 1000), 2), 'quantity': rng.randint(1, 10)}
+                    for _ in range(rng.randint(1, 8))]
+        documents.append({
+            'id': uuid4().hex,
+            'products': products,
+            'status': rng.choice(['pending', 'completed', 'cancelled']),
+            'total': sum(item['price'] * item['quantity'] for item in products),
+            'user': rng.choice(users),
+            'created_at': start + timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+        })
+    return documents
+
+
+def decode(encoded: list[bytes]) -> Iterator[dict]:
+    # Every document is decoded again, so no string is shared between two measurements
+    return (bson.decode(document) for document in encoded)
+
+
+def measure(build, encoded: list[bytes]) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    result = build(decode(encoded))
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=100_000, help='Number of orders to build')
+    args = parser.parse_args()
+
+    documents = generate_documents(args.orders)
+    items = sum(len(document['products']) for document in documents)
+    encoded = [bson.encode(document) for document in documents]
+    del documents
+
+    models_bytes, models = measure(lambda documents: [OrderOut(**document) for document in documents], encoded)
+    del models
+    compact_bytes, compact = measure(CompactOrders.from_documents, encoded)
+
+    print(f"orders: {args.orders:,}  line items: {items:,}")
+    print(f"OrderOut models: {models_bytes / 2 ** 20:10.1f} MiB")
+    print(f"CompactOrders:   {compact_bytes / 2 ** 20:10.1f} MiB")
+    print(f"reduction:       {models_bytes / compact_bytes:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""
+HTTP load test for the Orders System API.
+
+Drives the app over HTTP with a weighted mix of logins, product reads and writes and
+order reads and creates, and reports latency percentiles and throughput per endpoint.
+
+Targets:
+  --in-memory   start the app in-process with uvicorn, backed by the in-memory service backend
+  --url URL     an already running server, e.g. one configured against a local mongod
+
+With --in-memory the load generator and the server share one process, so use --url
+against a separate server when absolute numbers matter.
+
+Usage:
+  python -m benchmarks.load_test --in-memory --duration 30 --concurrency 32 --output results.json
+  python -m benchmarks.load_test --url http://localhost:8000 --username admin --password admin \\
+      --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import socket
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+DEFAULT_MIX = 'login=1,product_list=3,product_get=6,product_update=1,order_list=2,order_get=3,order_create=2'
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for pair in value.split(','):
+        name, weight = pair.split('=')
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name.strip()}, choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def percentile(sorted_values: list[float], rank: float) -> float:
+    """
+    Nearest-rank percentile
+    :param sorted_values: Values sorted in ascending order
+    :param rank: Percentile between 0 and 100
+    :return: Value at the given percentile
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(rank / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadTest:
+    def __init__(self, base_url: str, username: str, password: str, mix: dict[str, int]):
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.scenarios = list(mix)
+        self.weights = list(mix.values())
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.skus: list[str] = []
+        self.order_ids: list[str] = []
+
+    async def login(self, client: httpx.AsyncClient) -> httpx.Response:
+        return await client.post('/auth/token', data={'username': self.username, 'password': self.password})
+
+    async def prepare(self, client: httpx.AsyncClient):
+        response = await self.login(client)
+        response.raise_for_status()
+        client.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+        self.skus = [product['sku'] for product in (await client.get('/products/')).json()]
+        self.order_ids = [order['id'] for order in (await client.get('/orders/')).json()]
+        if not self.skus:
+            raise SystemExit('The target has no products to read')
+
+    async def run_scenario(self, client: httpx.AsyncClient, name: str, rng: random.Random):
+        start = time.perf_counter()
+        try:
+            response = await SCENARIOS[name](self, client, rng)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        self.latencies[name].append(time.perf_counter() - start)
+        if failed:
+            self.errors[name] += 1
+
+    async def worker(self, client: httpx.AsyncClient, deadline: float, seed: int):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            await self.run_scenario(client, rng.choices(self.scenarios, self.weights)[0], rng)
+
+    async def run(self, duration: float, concurrency: int) -> dict:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=30) as client:
+            await self.prepare(client)
+            start = time.perf_counter()
+            deadline = start + duration
+            await asyncio.gather(*(self.worker(client, deadline, seed) for seed in range(concurrency)))
+            elapsed = time.perf_counter() - start
+        return self.report(elapsed, duration, concurrency)
+
+    def report(self, elapsed: float, duration: float, concurrency: int) -> dict:
+        endpoints = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            endpoints[name] = {
+                'requests': len(values),
+                'errors': self.errors[name],
+                'rps': round(len(values) / elapsed, 2),
+                'mean_ms': round(sum(values) / len(values) * 1000, 3),
+                'p50_ms': round(percentile(values, 50) * 1000, 3),
+                'p95_ms': round(percentile(values, 95) * 1000, 3),
+                'p99_ms': round(percentile(values, 99) * 1000, 3),
+                'max_ms': round(values[-1] * 1000, 3),
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'target': self.base_url,
+            'duration_s': duration,
+            'concurrency': concurrency,
+            'mix': dict(zip(self.scenarios, self.weights)),
+            'total': {'requests': total, 'errors': sum(self.errors.values()), 'rps': round(total / elapsed, 2)},
+            'endpoints': endpoints,
+        }
+
+
+async def login(test: LoadTest, client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+    # The shared client carries a bearer token, which the token endpoint ignores
+    return await test.login(client)
+
+
+async def product_list(test: LoadTest, client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+    return await client.get('/products/')
+
+
+async def product_get(test: LoadTest, client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+    return await client.get(f"/products/{rng.choice(test.skus)}")
+
+
+async def product_update(test: LoadTest, client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+    # No image is sent, so the update never reaches S3
+    sku = rng.choice(test.skus)
+    return await client.put('/products/', data={'sku': sku, 'name': f"Product {sku}",
+                                                'description': f"Updated {rng.getrandbits(32):08x}",
+                                                'price': round(rng.uniform(1, 1000), 2)})
+
+
+async def order_list(test: LoadTest, client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+    return await client.get('/orders/')
+
+
+async def order_get(test: LoadTest, client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+    if not test.order_ids:
+        return await order_list(test, client, rng)
+    return await client.get(f"/orders/{rng.choice(test.order_ids)}")
+
+
+async def order_create(test: LoadTest, client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+    products = [{'sku': sku, 'price': round(rng.uniform(1, 1000), 2), 'quantity': rng.randint(1, 5)}
+                for sku in rng.sample(test.skus, min(len(test.skus), rng.randint(1, 3)))]
+    return await client.post('/orders/', json={'products': products, 'status': 'pending'})
+
+
+SCENARIOS = {
+    'login': login,
+    'product_list': product_list,
+    'product_get': product_get,
+    'product_update': product_update,
+    'order_list': order_list,
+    'order_get': order_get,
+    'order_create': order_create,
+}
+
+
+def start_in_memory_server() -> tuple[str, object]:
+    """
+    Start the app with the in-memory backend in a background uvicorn server.
+    The store is seeded with the products, orders and users of benchmarks.seed_data.
+    :return: Base URL of the server and the server itself
+    """
+    os.environ.setdefault('JWT_ENCODING_KEY', secrets.token_hex(32))
+    # Every virtual user shares one token, which the per-client rate limit would throttle
+    os.environ.setdefault('RATE_LIMIT_PER_SECOND', '0')
+    # Settings are read on import, so the backend is chosen before the app is imported
+    os.environ['SERVICE_BACKEND'] = 'memory'
+    os.environ['MEMORY_SNAPSHOT_PATH'] = ''
+    import uvicorn
+
+    from app.main import app
+    from app.services import memory
+    from benchmarks import seed_data
+
+    memory.get_store().load_documents(products=seed_data.PRODUCTS, orders=seed_data.ORDERS, users=seed_data.USERS)
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+def print_report(report: dict, baseline: dict | None):
+    header = f"{'endpoint':<16}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, stats in report['endpoints'].items():
+        line = (f"{name:<16}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>10.1f}"
+                f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+        previous = (baseline or {}).get('endpoints', {}).get(name)
+        if previous and previous['p95_ms']:
+            line += f"   p95 {(stats['p95_ms'] / previous['p95_ms'] - 1) * 100:+.1f}%"
+        print(line)
+    total = report['total']
+    print(f"total: {total['requests']} requests, {total['errors']} errors, {total['rps']:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Base URL of a running server')
+    target.add_argument('--in-memory', action='store_true', help='Start the app in-process with in-memory services')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds to run')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent virtual users')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Weighted scenario mix (default: {DEFAULT_MIX})")
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Results JSON of a previous run to compare p95 latencies with')
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if args.in_memory:
+        base_url, server = start_in_memory_server()
+
+    load_test = LoadTest(base_url, args.username, args.password, args.mix)
+    report = asyncio.run(load_test.run(args.duration, args.concurrency))
+    if server is not None:
+        server.should_exit = True
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
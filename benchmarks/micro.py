@@ -0,0 +1,177 @@
+"""
+Micro-benchmarks for the per-request hot spots, with a regression gate.
+
+Each benchmark is timed in several rounds and the fastest time per call is kept,
+which is the least noisy estimate on a shared machine. Results are compared with
+benchmarks/baseline.json and the run fails when a benchmark is slower than its
+baseline by more than the tolerance. A benchmark that looks regressed is measured
+again (--retries) before it fails the run, so a single noisy round doesn't.
+
+Usage:
+  python -m benchmarks.micro                     compare with the baseline, exit 1 on regressions
+  python -m benchmarks.micro --update-baseline   record the current timings as the new baseline
+  python -m benchmarks.micro --only jwt_decode --tolerance 0.1
+
+Baselines are only comparable on the same machine: update the baseline when the
+reference hardware changes.
+"""
+import argparse
+import json
+import os
+import secrets
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+os.environ.setdefault('JWT_ENCODING_KEY', secrets.token_hex(32))
+
+from app.data.models import OrderOut, Product, ORDER_LIST_ADAPTER  # noqa: E402
+from app.routers.responses import ModelJSONResponse  # noqa: E402
+from app.services import security  # noqa: E402
+
+BASELINE_FILE = Path(__file__).with_name('baseline.json')
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_RETRIES = 2
+
+PRODUCT_DOCUMENT = {'sku': 'SP001', 'name': 'Product SP001', 'description': 'A product used in benchmarks',
+                    'price': 12.5, 'image_url': 'https://example.com/images/SP001.png'}
+
+
+def order_document(items: int) -> dict:
+    return {
+        'id': 'c0ffee',
+        'products': [{'sku': f"SKU{index:05d}", 'price': 10.0 + index, 'quantity': 1 + index % 5}
+                     for index in range(items)],
+        'status': 'pending',
+        'total': None,
+        'user': 'admin',
+        'created_at': datetime(2023, 1, 1),
+    }
+
+
+def setup_jwt_decode():
+    token = security.create_access_token({'sub': 'admin', 'scopes': ['order_read', 'product_read']})
+    return lambda: security.jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+
+
+def setup_verify_password():
+    hashed = security.get_password_hash('admin')
+    return lambda: security.verify_password('admin', hashed)
+
+
+def setup_product_construct():
+    return lambda: Product(**PRODUCT_DOCUMENT)
+
+
+def setup_order_construct():
+    document = order_document(10)
+    return lambda: OrderOut(**document)
+
+
+def setup_order_list_validate():
+    # How list reads validate a cursor: 100 orders in one TypeAdapter call
+    documents = [order_document(10) for _ in range(100)]
+    return lambda: ORDER_LIST_ADAPTER.validate_python(documents)
+
+
+def setup_order_update_total_large():
+    order = OrderOut(**order_document(5000))
+    return order.update_total
+
+
+def setup_serialize_orders():
+    orders = [OrderOut(**order_document(10)) for _ in range(100)]
+    return lambda: ModelJSONResponse(orders, ORDER_LIST_ADAPTER)
+
+
+BENCHMARKS = {
+    'jwt_decode': setup_jwt_decode,
+    'verify_password': setup_verify_password,
+    'product_construct': setup_product_construct,
+    'order_construct': setup_order_construct,
+    'order_list_validate': setup_order_list_validate,
+    'order_update_total_large': setup_order_update_total_large,
+    'serialize_orders': setup_serialize_orders,
+}
+
+
+def measure(function, rounds: int = 5, min_round_time: float = 0.2) -> float:
+    """
+    Measure the fastest time per call of a function
+    :param function: Function to call without arguments
+    :param rounds: Number of timed rounds
+    :param min_round_time: Minimum duration of a round in seconds, used to pick the calls per round
+    :return: Seconds per call
+    """
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time:
+            break
+        calls = max(calls * 2, int(calls * min_round_time / max(elapsed, 1e-9)))
+    best = elapsed / calls
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help='Run only these benchmarks')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed slowdown over the baseline as a fraction (default {DEFAULT_TOLERANCE})")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help=f"Extra measurements for benchmarks over the tolerance (default {DEFAULT_RETRIES})")
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE, help='Baseline JSON file')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results = {}
+    regressions = []
+    for name in args.only or BENCHMARKS:
+        function = BENCHMARKS[name]()
+        seconds = measure(function)
+        previous = baseline.get(name)
+        tolerance = previous.get('tolerance', args.tolerance) if previous else None
+        retries = args.retries if previous and not args.update_baseline else 0
+        while retries and seconds / previous['seconds_per_call'] - 1 > tolerance:
+            seconds = min(seconds, measure(function))
+            retries -= 1
+        results[name] = {'seconds_per_call': seconds}
+        line = f"{name:<28}{format_time(seconds)}"
+        if previous:
+            change = seconds / previous['seconds_per_call'] - 1
+            line += f"   {change * 100:+7.1f}% vs baseline"
+            if change > tolerance:
+                line += f"   REGRESSION (tolerance {tolerance * 100:.0f}%)"
+                regressions.append(name)
+        print(line)
+
+    if args.update_baseline:
+        for name, result in results.items():
+            if 'tolerance' in baseline.get(name, {}):
+                result['tolerance'] = baseline[name]['tolerance']
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=2) + '\n')
+        print(f"baseline written to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
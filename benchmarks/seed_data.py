@@ -0,0 +1,77 @@
+"""
+Seed data of the in-memory load test target.
+
+The admin and user passwords are "admin" and "user", the load test logs in as admin by default.
+"""
+
+PRODUCTS = [
+    {
+        "sku": "123",
+        "name": "Product 123",
+        "description": "Description 123",
+        "price": 123.0,
+        "image_url": "https://example.com/123.png"
+    },
+    {
+        "sku": "456",
+        "name": "Product 456",
+        "description": "Description 456",
+        "price": 456.0,
+        "image_url": "https://example.com/456.png"
+    },
+]
+
+ORDERS = [
+    {
+        "id": "123",
+        "products": [
+            {
+                "sku": "123",
+                "price": 123.0,
+                "quantity": 1
+            },
+            {
+                "sku": "456",
+                "price": 456.0,
+                "quantity": 2
+            },
+        ],
+        "status": "pending",
+        "total": 1035.0,
+        "user": "admin",
+        "created_at": "2021-10-10T00:00:00.000Z"
+    },
+    {
+        "id": "456",
+        "products": [
+            {
+                "sku": "456",
+                "price": 456.0,
+                "quantity": 1
+            },
+        ],
+        "status": "completed",
+        "total": 456.0,
+        "user": "client",
+        "created_at": "2021-10-11T00:00:00.000Z"
+    },
+]
+
+USERS = [
+    {
+        "username": 'admin',
+        "email": "admin@gmail.com",
+        "full_name": "Administrator",
+        "disabled": False,
+        "hashed_password": '$2b$12$oJiP8xt.pXYyM4YSUI5b/.DivAFiVCXm7xkh15dckrkcRdlYE88J.',
+        "scopes": 'order_read order_write product_read product_write user_write me'
+    },
+    {
+        "username": 'user',
+        "email": "user@gmail.com",
+        "full_name": "User",
+        "disabled": False,
+        "hashed_password": '$2b$12$uz1e.1hPOKl6XwYzuqgvD.afJXuPKG0/6M5cAE40B504Ea0tciSmm',
+        "scopes": 'order_read product_read'
+    },
+]
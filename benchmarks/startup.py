@@ -0,0 +1,92 @@
+"""
+Startup time benchmark: import cost of the app per module.
+
+Imports the app in fresh interpreters with `python -X importtime`, keeps the fastest
+of the runs for every module and reports the total import time, the slowest modules
+by cumulative time and the cost per top-level package.
+
+Usage:
+  python -m benchmarks.startup
+  python -m benchmarks.startup --module app.main --runs 5 --top 30 --output startup.json
+"""
+import argparse
+import json
+import os
+import re
+import secrets
+import subprocess
+import sys
+from collections import defaultdict
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_times(module: str) -> dict[str, tuple[int, int, int]]:
+    """
+    Import a module in a new interpreter and collect its import times
+    :param module: Module to import
+    :return: Self time, cumulative time (both in microseconds) and nesting level per imported module
+    """
+    env = dict(os.environ)
+    env.setdefault('JWT_ENCODING_KEY', secrets.token_hex(32))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            capture_output=True, text=True, env=env)
+    if result.returncode:
+        raise SystemExit(f"importing {module} failed:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_time, cumulative, indent, name = match.groups()
+            times[name] = (int(self_time), int(cumulative), len(indent) // 2)
+    return times
+
+
+def fastest(runs: list[dict[str, tuple[int, int, int]]]) -> dict[str, tuple[int, int, int]]:
+    times = {}
+    for run in runs:
+        for name, (self_time, cumulative, level) in run.items():
+            if name not in times or cumulative < times[name][1]:
+                times[name] = (self_time, cumulative, level)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app.main', help='Module to import (default app.main)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to import the module in')
+    parser.add_argument('--top', type=int, default=20, help='Modules to list')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    # The first run may write the bytecode caches, so it's only a warm up
+    import_times(args.module)
+    times = fastest([import_times(args.module) for _ in range(args.runs)])
+
+    packages = defaultdict(int)
+    for name, (self_time, _, _) in times.items():
+        packages[name.split('.')[0]] += self_time
+    total = times[args.module][1]
+
+    print(f"import {args.module}: {total / 1000:.1f} ms (fastest of {args.runs} runs)\n")
+    print(f"{'module':<48}{'self ms':>10}{'cumulative ms':>16}")
+    slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    for name, (self_time, cumulative, _) in slowest:
+        print(f"{name:<48}{self_time / 1000:>10.1f}{cumulative / 1000:>16.1f}")
+    print(f"\n{'package':<48}{'self ms':>10}{'share':>16}")
+    for package, self_time in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{package:<48}{self_time / 1000:>10.1f}{self_time / total * 100:>15.1f}%")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'module': args.module,
+                'total_ms': total / 1000,
+                'modules': {name: {'self_ms': self_time / 1000, 'cumulative_ms': cumulative / 1000}
+                            for name, (self_time, cumulative, _) in times.items()},
+                'packages_ms': {package: self_time / 1000 for package, self_time in packages.items()},
+            }, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,12 @@ from fastapi import Depends, UploadFile
 
 from app.data.errors import CouldNotUploadFileError
 from app.data.models import Product
-from app.services.impl import ProductService
+from app.services.providers import get_product_service
 from app.services.interfaces import IProductService
 
 
 class ProductControllerMock:
-    def __init__(self, product_service: Annotated[IProductService, Depends(ProductService)]):
+    def __init__(self, product_service: Annotated[IProductService, Depends(get_product_service)]):
         self.product_service = product_service
 
     async def create(self, sku: str, name: str, description: str, price: float, image: UploadFile):
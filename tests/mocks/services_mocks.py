@@ -1,7 +1,16 @@
+from datetime import datetime
+from typing import Iterator
+
+
 from app.data.errors import UserNotFoundError, ProductNotFoundError, ProductAlreadyExistsError, \
-    CouldNotUpdateProductError, OrderNotFoundError
-from app.data.models import UserInDB, Product, OrderOut
-from app.services.interfaces import IUserService, IProductService, IOrderService
+    CouldNotUpdateProductError, OrderNotFoundError, JobNotFoundError, JobResultNotFoundError, InvalidRefreshTokenError
+from app.data.models import UserInDB, Product, OrderOut, OrderSearch, OrderPage, OrderStatus, Job, RefreshToken
+from app.data.compact import CompactOrders
+from app.data.order_search import search_orders, filter_orders
+from app.services.interfaces import IUserService, IProductService, IOrderService, IJobService, \
+    IRefreshTokenService
+from app.services.jobs import validate_params
+from app.services.search import ProductSearchIndex
 
 
 class OrderServiceMock(IOrderService):
@@ -45,6 +54,17 @@ class OrderServiceMock(IOrderService):
     def get_all(self) -> list[OrderOut]:
         return list(map(lambda order: OrderOut(**order), self.orders_collection))
 
+    def iter_all(self, batch_size: int = 500) -> list[dict]:
+        return list(self.orders_collection)
+
+    def search(self, search: OrderSearch) -> OrderPage:
+        return search_orders(self.get_all(), search)
+
+    def export_batches(self, search: OrderSearch, batch_size: int = 5000) -> list[CompactOrders]:
+        orders = filter_orders(self.get_all(), search)
+        return [CompactOrders.from_documents(order.model_dump() for order in orders[start:start + batch_size])
+                for start in range(0, len(orders), batch_size)]
+
     def get_by_id(self, order_id: str) -> OrderOut:
         order = next((order for order in self.orders_collection if order['id'] == order_id), None)
         if not order:
@@ -56,6 +76,13 @@ class OrderServiceMock(IOrderService):
         self.orders_collection.append(order_dict)
         return order
 
+    def update_status(self, order_id: str, status: OrderStatus) -> OrderOut:
+        order = next((order for order in self.orders_collection if order['id'] == order_id), None)
+        if not order:
+            raise OrderNotFoundError(f"Order with id {order_id} not found")
+        order['status'] = status.value
+        return OrderOut(**order)
+
 
 class ProductServiceMock(IProductService):
     def __init__(self):
@@ -85,6 +112,15 @@ class ProductServiceMock(IProductService):
             raise ProductNotFoundError(f"Product with sku {product_sku} not found")
         return Product(**product)
 
+    def get_many(self, product_skus: list[str]) -> list[Product]:
+        products = {product['sku']: product for product in self.products_collection}
+        return [Product(**products[sku]) for sku in dict.fromkeys(product_skus) if sku in products]
+
+    def search(self, query: str, limit: int = 10) -> list[Product]:
+        index = ProductSearchIndex()
+        index.build(self.get_all())
+        return index.search(query, limit)
+
     def create(self, product: Product) -> Product:
         found_product = next((p for p in self.products_collection if p['sku'] == product.sku), None)
         if found_product:
@@ -139,3 +175,60 @@ class UserServiceMock(IUserService):
     def create(self, user: UserInDB) -> UserInDB:
         self.users_collection.append(dict(user))
         return user
+
+
+class RefreshTokenServiceMock(IRefreshTokenService):
+    # Shared by the instances, so tokens outlive the request that created them
+    issued: dict[str, RefreshToken] = {}
+
+    def __init__(self):
+        self.tokens = self.issued
+
+    def create(self, refresh_token: RefreshToken) -> RefreshToken:
+        self.tokens[refresh_token.token_hash] = refresh_token
+        return refresh_token
+
+    def use(self, token_hash: str) -> RefreshToken:
+        token = self.tokens.get(token_hash)
+        if token is None:
+            raise InvalidRefreshTokenError('Invalid refresh token')
+        if token.used_at is not None:
+            self.revoke_family(token.family)
+            raise InvalidRefreshTokenError('Invalid refresh token')
+        token.used_at = datetime.utcnow()
+        if token.expires_at <= token.used_at:
+            raise InvalidRefreshTokenError('Refresh token expired')
+        return token
+
+    def revoke_family(self, family: str):
+        for token_hash in [token.token_hash for token in self.tokens.values() if token.family == family]:
+            del self.tokens[token_hash]
+
+
+class JobServiceMock(IJobService):
+    def __init__(self):
+        self.jobs = {
+            '123': Job(id='123', kind='archive-orders', params={'after_days': 90}, status='succeeded',
+                       submitted_by='admin', attempts=1, done=2, result={'archived': 2}),
+            '456': Job(id='456', kind='export-orders', params={'format': 'csv', 'compress': False},
+                       status='succeeded', submitted_by='admin', attempts=1, done=1,
+                       result={'file_name': 'orders-20240101.csv', 'orders': 1, 'rows': 1, 'bytes': 23}),
+        }
+        self.files = {'456': ('orders-20240101.csv', 'text/csv', [b'order_id,user\n', b'456,admin\n'])}
+
+    def submit(self, kind: str, params: dict, username: str) -> Job:
+        job = Job(kind=kind, params=validate_params(kind, params), submitted_by=username)
+        self.jobs[job.id] = job
+        return job
+
+    def get_by_id(self, job_id: str) -> Job:
+        if job_id not in self.jobs:
+            raise JobNotFoundError(f"Job with id {job_id} not found")
+        return self.jobs[job_id]
+
+    def open_result(self, job_id: str) -> tuple[str, str, Iterator[bytes]]:
+        self.get_by_id(job_id)
+        if job_id not in self.files:
+            raise JobResultNotFoundError(f"Job with id {job_id} has no result file")
+        file_name, media_type, chunks = self.files[job_id]
+        return file_name, media_type, iter(chunks)
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.data.models import User
+from app.main import app
+from app.monitoring import tracing
+from app.services.providers import get_product_service
+from app.services.security import get_current_user
+from tests.mocks.services_mocks import ProductServiceMock
+
+ADMIN_TRACES = '/admin/traces'
+
+client = TestClient(app)
+
+
+def get_current_user_mock():
+    return User(username='admin', email="admin@gmail.com", full_name="Administrator", disabled=False)
+
+
+@pytest.fixture
+def admin_route_dependencies_mock():
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_product_service] = ProductServiceMock
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_current_user] = get_current_user_mock
+
+
+@pytest.fixture
+def trace_every_request(monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACE_SAMPLE_RATE', 1.0)
+    tracing.recorder.clear()
+    yield
+    tracing.recorder.clear()
+
+
+def test_get_slowest_traces_return_spans_per_layer(admin_route_dependencies_mock, trace_every_request):
+    response = client.get('/products/123')
+    trace_id = response.headers['x-trace-id']
+    response = client.get(ADMIN_TRACES)
+    assert response.status_code == 200
+    trace = next(trace for trace in response.json() if trace['trace_id'] == trace_id)
+    assert trace['name'] == 'GET /products/{product_sku}'
+    root, *spans = trace['spans']
+    assert root['attributes'] == {'status': 200}
+    assert {'name': 'ProductController.get_by_sku', 'kind': 'controller', 'parent_id': root['span_id']}.items() \
+           <= spans[0].items()
+    app.dependency_overrides = {}
+
+
+def test_untraced_request_has_no_trace_header(admin_route_dependencies_mock, monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACE_SAMPLE_RATE', 0.0)
+    response = client.get('/products/123')
+    assert 'x-trace-id' not in response.headers
+    app.dependency_overrides = {}
+
+
+def test_get_slowest_traces_rejects_unbounded_limit(admin_route_dependencies_mock):
+    response = client.get(ADMIN_TRACES, params={'limit': 501})
+    assert response.status_code == 422
+    app.dependency_overrides = {}
+
+
+def test_recorder_exports_traces_from_background_thread(tmp_path):
+    export_file = tmp_path / 'traces.jsonl'
+    recorder = tracing.TraceRecorder(size=10, export_file=str(export_file))
+    trace = tracing.Trace('GET /products')
+    trace.root.finish()
+    recorder.record(trace)
+    recorder.close()
+    assert [json.loads(line)['trace_id'] for line in export_file.read_text().splitlines()] == [trace.trace_id]
@@ -0,0 +1,98 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.middleware.admission import AdmissionControlMiddleware, TokenBuckets, route_class
+from app.services.security import create_access_token
+
+
+class PoolMetricsStub:
+    def __init__(self, wait: float = 0.0):
+        self.wait = wait
+
+    def average_wait(self) -> float:
+        return self.wait
+
+
+def create_app(**options):
+    test_app = FastAPI()
+
+    @test_app.get('/items')
+    async def items():
+        return PlainTextResponse('items')
+
+    @test_app.get('/metrics')
+    async def metrics():
+        return PlainTextResponse('metrics')
+
+    options.setdefault('pool_metrics', PoolMetricsStub())
+    test_app.add_middleware(AdmissionControlMiddleware, **options)
+    return test_app
+
+
+def find_middleware(client: TestClient) -> AdmissionControlMiddleware:
+    client.get('/metrics')  # builds the middleware stack
+    middleware = client.app.middleware_stack
+    while not isinstance(middleware, AdmissionControlMiddleware):
+        middleware = middleware.app
+    return middleware
+
+
+def test_route_class():
+    assert route_class({'path': '/auth/token', 'method': 'POST'}) == 'auth'
+    assert route_class({'path': '/orders/', 'method': 'GET'}) == 'reads'
+    assert route_class({'path': '/orders/', 'method': 'POST'}) == 'writes'
+    assert route_class({'path': '/products/batch', 'method': 'POST'}) == 'reads'
+
+
+def test_requests_over_the_in_flight_limit_are_shed():
+    client = TestClient(create_app(limits={'auth': 1, 'reads': 1, 'writes': 1}, rate=0))
+    middleware = find_middleware(client)
+    assert client.get('/items').status_code == 200
+    middleware.in_flight['reads'] = 1
+    response = client.get('/items')
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert client.get('/metrics').status_code == 200
+
+
+def test_limits_shrink_with_the_mongo_pool_wait():
+    middleware = AdmissionControlMiddleware(None, limits={'reads': 100}, pool_wait_threshold_ms=50, rate=0,
+                                            pool_metrics=PoolMetricsStub(wait=0.2))
+    assert middleware.limit('reads') == 25
+    middleware.pool_metrics.wait = 0.01
+    assert middleware.limit('reads') == 100
+
+
+def test_clients_over_their_rate_get_429():
+    client = TestClient(create_app(limits={}, rate=1, burst=2))
+    headers = {'Authorization': f"Bearer {create_access_token({'sub': 'one'})}"}
+    assert [client.get('/items', headers=headers).status_code for _ in range(3)] == [200, 200, 429]
+    # A new token of the same user shares the bucket, another user has their own
+    headers = {'Authorization': f"Bearer {create_access_token({'sub': 'one', 'scopes': ['me']})}"}
+    assert client.get('/items', headers=headers).status_code == 429
+    headers = {'Authorization': f"Bearer {create_access_token({'sub': 'two'})}"}
+    assert client.get('/items', headers=headers).status_code == 200
+
+
+def test_invalid_tokens_are_rate_limited_by_client_address():
+    client = TestClient(create_app(limits={}, rate=1, burst=2))
+    statuses = [client.get('/items', headers={'Authorization': f'Bearer fake-{number}'}).status_code
+                for number in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_cors_is_the_outermost_middleware():
+    assert app.user_middleware[0].cls is CORSMiddleware
+
+
+def test_token_buckets_refill():
+    buckets = TokenBuckets(rate=1000, burst=1)
+    assert buckets.acquire('key') == 0
+    assert buckets.acquire('key') > 0
+    time.sleep(0.01)
+    assert buckets.acquire('key') == 0
@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.data.models import User
+from app.main import app
+from app.monitoring.allocations import allocation_profiler
+from app.services.providers import get_product_service
+from app.services.security import get_current_user
+from tests.mocks.services_mocks import ProductServiceMock
+
+ALLOCATIONS = '/admin/allocations'
+
+client = TestClient(app)
+
+
+def get_current_user_mock():
+    return User(username='admin', email="admin@gmail.com", full_name="Administrator", disabled=False)
+
+
+@pytest.fixture
+def admin_route_dependencies_mock():
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_product_service] = ProductServiceMock
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_current_user] = get_current_user_mock
+    yield
+    allocation_profiler.stop()
+    app.dependency_overrides = {}
+
+
+def test_allocation_profiling_reports_top_sites_and_diffs(admin_route_dependencies_mock):
+    response = client.post(f'{ALLOCATIONS}/start', params={'frames': 5})
+    assert response.status_code == 200
+    assert response.json()['running'] is True
+    first = client.post(f'{ALLOCATIONS}/snapshots').json()['id']
+
+    retained = [bytearray(1024) for _ in range(1000)]
+    response = client.get(f'{ALLOCATIONS}/diff', params={'first': first, 'limit': 5})
+    assert response.status_code == 200
+    assert any('bytearray(1024)' in site['line'] and site['size_diff_kb'] >= 1000
+               for site in response.json())
+
+    response = client.get(f'{ALLOCATIONS}/top', params={'limit': 3})
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    assert retained
+
+
+def test_allocation_profiling_records_peaks_by_route(admin_route_dependencies_mock):
+    client.post(f'{ALLOCATIONS}/start', params={'sample_rate': 1})
+    client.get('/products/')
+    routes = client.get(ALLOCATIONS).json()['routes']
+    assert routes[0]['route'] == 'GET /products/'
+    assert routes[0]['requests'] == 1
+    assert routes[0]['max_peak_kb'] > 0
+
+
+def test_allocation_snapshots_return_409_status_when_not_running(admin_route_dependencies_mock):
+    assert client.post(f'{ALLOCATIONS}/stop').json()['running'] is False
+    assert client.post(f'{ALLOCATIONS}/snapshots').status_code == 409
+    assert client.get(f'{ALLOCATIONS}/diff', params={'first': 'missing'}).status_code == 404
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+from pymongo.results import DeleteResult
+
+from app.services.archive import ARCHIVE_COLLECTION, OrderArchiver
+from app.services.impl import OrderService
+
+
+def matches(document: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        if field == '$or':
+            if not any(matches(document, alternative) for alternative in condition):
+                return False
+            continue
+        value = document.get(field)
+        if isinstance(condition, dict):
+            if '$in' in condition and value not in condition['$in']:
+                return False
+            if '$lt' in condition and not value < condition['$lt']:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor(list):
+    def limit(self, count):
+        return FakeCursor(self[:count])
+
+
+class FakeCollection:
+    """
+    The few collection operations used by the archiver, on a list of documents
+    """
+
+    def __init__(self, documents=None):
+        self.documents = documents or []
+        # Called by find, like a concurrent writer changing documents between two operations
+        self.on_find = None
+
+    def find(self, query, projection=None):
+        found = FakeCursor(dict(document) for document in self.documents if matches(document, query))
+        if self.on_find:
+            self.on_find()
+        return found
+
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            document = request._doc
+            self.documents = [existing for existing in self.documents if existing['id'] != document['id']]
+            self.documents.append(dict(document))
+
+    def delete_many(self, query):
+        kept = [document for document in self.documents if not matches(document, query)]
+        deleted = len(self.documents) - len(kept)
+        self.documents = kept
+        return DeleteResult({'n': deleted}, True)
+
+
+def order(order_id: str, status: str, created_at: datetime) -> dict:
+    return {'id': order_id, 'products': [], 'status': status, 'total': 0.0, 'user': 'admin',
+            'created_at': created_at}
+
+
+def test_archiver_moves_finished_orders_past_the_cutoff():
+    orders = FakeCollection([
+        order('old-completed', 'completed', datetime(2020, 1, 1)),
+        order('old-cancelled', 'cancelled', datetime(2020, 1, 2)),
+        order('old-pending', 'pending', datetime(2020, 1, 1)),
+        order('new-completed', 'completed', datetime(2023, 12, 1)),
+    ])
+    archive = FakeCollection()
+    archiver = OrderArchiver(orders, archive, after_days=90, batch_size=1)
+
+    assert archiver.archive_all(now=datetime(2024, 1, 1)) == 2
+    assert [document['id'] for document in archive.documents] == ['old-completed', 'old-cancelled']
+    assert [document['id'] for document in orders.documents] == ['old-pending', 'new-completed']
+
+
+def test_archiver_completes_an_interrupted_batch():
+    old_order = order('old-completed', 'completed', datetime(2020, 1, 1))
+    orders = FakeCollection([old_order])
+    archive = FakeCollection([dict(old_order, status='pending')])
+
+    assert OrderArchiver(orders, archive, after_days=90).archive_batch(now=datetime(2024, 1, 1)) == 1
+    assert orders.documents == []
+    assert archive.documents == [old_order]
+
+
+def test_archiver_keeps_orders_updated_while_archiving():
+    orders = FakeCollection([
+        order('reopened', 'completed', datetime(2020, 1, 1)),
+        order('cancelled', 'completed', datetime(2020, 1, 1)),
+        order('archived', 'completed', datetime(2020, 1, 1)),
+    ])
+    archive = FakeCollection()
+
+    def update_status():
+        # update_status runs between the read of the batch and its delete
+        orders.on_find = None
+        orders.documents[0]['status'] = 'pending'
+        orders.documents[1]['status'] = 'cancelled'
+
+    orders.on_find = update_status
+    assert OrderArchiver(orders, archive, after_days=90).archive_batch(now=datetime(2024, 1, 1)) == 1
+    assert [(document['id'], document['status']) for document in orders.documents] == \
+        [('reopened', 'pending'), ('cancelled', 'cancelled')]
+    assert [document['id'] for document in archive.documents] == ['archived']
+
+
+class RepositoryStub:
+    def __init__(self, collections: dict[str, FakeCollection]):
+        self.collections = collections
+
+    def get_collection(self, collection_name, read_preference=None):
+        return self.collections[collection_name]
+
+
+def test_orders_of_a_user_being_archived_are_listed_once():
+    # The batch was copied to the archive but not yet deleted, and the status changed meanwhile
+    archived = order('archiving', 'completed', datetime(2020, 1, 1))
+    orders = FakeCollection([dict(archived, status='pending'), order('hot', 'pending', datetime(2024, 1, 1))])
+    archive = FakeCollection([archived, order('cold', 'completed', datetime(2019, 1, 1))])
+    service = OrderService(RepositoryStub({'orders': orders, ARCHIVE_COLLECTION: archive}))
+
+    assert [(found.id, found.status) for found in service.get_all_by_user('admin')] == \
+        [('archiving', 'pending'), ('hot', 'pending'), ('cold', 'completed')]
@@ -1,12 +1,16 @@
 import pytest
 from fastapi.testclient import TestClient
+from jose import jwt
 
 from app.main import app
-from app.services.impl import UserService
-from tests.mocks.services_mocks import UserServiceMock
+from app.services.providers import get_user_service, get_refresh_token_service
+from app.services.security import create_access_token, hash_refresh_token
+from tests.mocks.services_mocks import UserServiceMock, RefreshTokenServiceMock
 
 AUTH_USERS_ME = '/auth/users/me'
 AUTH_TOKEN = '/auth/token'
+AUTH_TOKEN_REFRESH = '/auth/token/refresh'
+AUTH_TOKEN_REVOKE = '/auth/token/revoke'
 AUTH_USERS = '/auth/users'
 
 client = TestClient(app)
@@ -15,7 +19,9 @@ client = TestClient(app)
 @pytest.fixture
 def user_service_mock():
     # noinspection PyUnresolvedReferences
-    app.dependency_overrides[UserService] = UserServiceMock
+    app.dependency_overrides[get_user_service] = UserServiceMock
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_refresh_token_service] = RefreshTokenServiceMock
 
 
 def test_login_for_access_token_return_access_token_with_200_status(user_service_mock):
@@ -29,6 +35,57 @@ def test_login_for_access_token_return_access_token_with_200_status(user_service
     app.dependency_overrides = {}
 
 
+def test_refresh_access_token_rotates_the_refresh_token(user_service_mock):
+    refresh_token = client.post(AUTH_TOKEN, data={'username': 'admin', 'password': 'admin'}).json()['refresh_token']
+    response = client.post(AUTH_TOKEN_REFRESH, data={'refresh_token': refresh_token})
+    assert response.status_code == 200
+    assert response.json()['refresh_token'] != refresh_token
+    me = client.get(AUTH_USERS_ME, headers={'Authorization': f"Bearer {response.json()['access_token']}"})
+    assert me.status_code == 200
+    app.dependency_overrides = {}
+
+
+def test_refresh_access_token_revokes_the_login_when_a_token_is_replayed(user_service_mock):
+    refresh_token = client.post(AUTH_TOKEN, data={'username': 'admin', 'password': 'admin'}).json()['refresh_token']
+    rotated = client.post(AUTH_TOKEN_REFRESH, data={'refresh_token': refresh_token}).json()['refresh_token']
+    replayed = client.post(AUTH_TOKEN_REFRESH, data={'refresh_token': refresh_token})
+    assert replayed.status_code == 401
+    # The token rotated from the replayed one is revoked too
+    assert client.post(AUTH_TOKEN_REFRESH, data={'refresh_token': rotated}).status_code == 401
+    app.dependency_overrides = {}
+
+
+def test_refresh_access_token_uses_the_current_scopes_and_expiration_of_the_login(user_service_mock):
+    users = UserServiceMock()
+    app.dependency_overrides[get_user_service] = lambda: users
+    refresh_token = client.post(AUTH_TOKEN, data={'username': 'user', 'password': 'user'}).json()['refresh_token']
+    login_expires_at = RefreshTokenServiceMock.issued[hash_refresh_token(refresh_token)].expires_at
+    users.users_collection[1]['scopes'] = 'me'
+
+    response = client.post(AUTH_TOKEN_REFRESH, data={'refresh_token': refresh_token})
+    assert response.status_code == 200
+    assert jwt.get_unverified_claims(response.json()['access_token'])['scopes'] == ['me']
+    rotated = RefreshTokenServiceMock.issued[hash_refresh_token(response.json()['refresh_token'])]
+    assert rotated.expires_at == login_expires_at
+    app.dependency_overrides = {}
+
+
+def test_refresh_access_token_return_401_status_for_disabled_users(user_service_mock):
+    users = UserServiceMock()
+    app.dependency_overrides[get_user_service] = lambda: users
+    refresh_token = client.post(AUTH_TOKEN, data={'username': 'user', 'password': 'user'}).json()['refresh_token']
+    users.users_collection[1]['disabled'] = True
+    assert client.post(AUTH_TOKEN_REFRESH, data={'refresh_token': refresh_token}).status_code == 401
+    app.dependency_overrides = {}
+
+
+def test_revoke_token_ends_the_login(user_service_mock):
+    refresh_token = client.post(AUTH_TOKEN, data={'username': 'admin', 'password': 'admin'}).json()['refresh_token']
+    assert client.post(AUTH_TOKEN_REVOKE, data={'refresh_token': refresh_token}).status_code == 204
+    assert client.post(AUTH_TOKEN_REFRESH, data={'refresh_token': refresh_token}).status_code == 401
+    app.dependency_overrides = {}
+
+
 def test_login_for_access_token_return_401_status_with_incorrect_password(user_service_mock):
     response = client.post(
         AUTH_TOKEN,
@@ -176,3 +233,14 @@ def test_register_user_return_409_status_with_existing_username(user_service_moc
     assert response.status_code == 409
     assert response.json().get('detail') == 'User already exists'
     app.dependency_overrides = {}
+
+
+def test_access_token_is_verified_once_per_request(user_service_mock, monkeypatch):
+    access_token = create_access_token({'sub': 'admin', 'scopes': ['me']})
+    decode, decoded = jwt.decode, []
+    monkeypatch.setattr(jwt, 'decode', lambda *args, **kwargs: decoded.append(args[0]) or decode(*args, **kwargs))
+    # The admission middleware verifies the token to rate limit by user, get_current_user reuses it
+    response = client.get(AUTH_USERS_ME, headers={'Authorization': f'Bearer {access_token}'})
+    assert response.status_code == 200
+    assert decoded == [access_token]
+    app.dependency_overrides = {}
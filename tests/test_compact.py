@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+
+from app.data.compact import CompactOrders
+from app.data.models import OrderOut
+
+
+@pytest.fixture
+def order_documents():
+    return [
+        {
+            "id": "123",
+            "products": [
+                {"sku": "123", "price": 123.0, "quantity": 1},
+                {"sku": "456", "price": 456.0, "quantity": 2},
+            ],
+            "status": "pending",
+            "total": 1035.0,
+            "user": "admin",
+            "created_at": datetime(2021, 10, 10),
+        },
+        {
+            "id": "456",
+            "products": [
+                {"sku": "456", "price": 456.0, "quantity": 1},
+            ],
+            "status": "completed",
+            "total": None,
+            "user": None,
+            "created_at": datetime(2021, 10, 11, 12, 30, 15, 250000),
+        },
+    ]
+
+
+def test_compact_orders_convert_to_equal_models(order_documents):
+    orders = CompactOrders.from_documents(order_documents)
+    assert len(orders) == 2
+    for model, document in zip(orders.to_models(), order_documents):
+        assert model.model_dump() == OrderOut(**document).model_dump()
+
+
+def test_compact_orders_views_read_columns(order_documents):
+    orders = CompactOrders.from_documents(order_documents)
+    assert orders[0].status == "pending"
+    assert orders[-1].total is None
+    assert [item.total for item in orders[0].products] == [123.0, 912.0]
+    with pytest.raises(IndexError):
+        orders[2]
+
+
+def test_compact_orders_iter_line_items(order_documents):
+    rows = list(CompactOrders.from_documents(order_documents).iter_line_items())
+    assert len(rows) == 3
+    assert rows[1] == ("123", "admin", "pending", datetime(2021, 10, 10), 1035.0, "456", 456.0, 2)
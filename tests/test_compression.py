@@ -0,0 +1,82 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.compression import CompressionMiddleware, select_encoding, parse_route_levels
+
+LARGE_BODY = 'orders ' * 1000
+
+
+def create_client(**options):
+    test_app = FastAPI()
+
+    @test_app.get('/large')
+    async def large():
+        return PlainTextResponse(LARGE_BODY)
+
+    @test_app.get('/small')
+    async def small():
+        return PlainTextResponse('small')
+
+    @test_app.get('/encoded')
+    async def encoded():
+        return PlainTextResponse(gzip.compress(LARGE_BODY.encode()), headers={'Content-Encoding': 'gzip'})
+
+    @test_app.get('/stream')
+    async def stream():
+        return StreamingResponse(iter([LARGE_BODY.encode()] * 2), media_type='text/plain')
+
+    test_app.add_middleware(CompressionMiddleware, **options)
+    return TestClient(test_app)
+
+
+@pytest.fixture
+def client():
+    return create_client(minimum_size=500, level=6, route_levels={})
+
+
+def test_large_response_is_gzip_compressed(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert int(response.headers['content-length']) < len(LARGE_BODY)
+    assert 'Accept-Encoding' in response.headers['vary']
+    assert response.text == LARGE_BODY
+
+
+def test_response_below_threshold_is_not_compressed(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.text == 'small'
+
+
+def test_already_encoded_response_is_not_compressed_again(client):
+    response = client.get('/encoded', headers={'Accept-Encoding': 'gzip'})
+    assert response.text == LARGE_BODY
+
+
+def test_streaming_response_is_not_compressed(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.text == LARGE_BODY * 2
+
+
+def test_route_level_zero_disables_compression():
+    client = create_client(minimum_size=500, route_levels={'/large': 0})
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+
+
+def test_select_encoding_honours_q_values():
+    assert select_encoding('gzip, deflate') == 'gzip'
+    assert select_encoding('gzip;q=0, deflate') is None
+    assert select_encoding('identity') is None
+    assert select_encoding('gzip;q=0, *') != 'gzip'
+    assert select_encoding('br;q=0, zstd;q=0, *') == 'gzip'
+    assert select_encoding('*;q=0') is None
+
+
+def test_parse_route_levels():
+    assert parse_route_levels('/orders=4, /products=9') == {'/orders': 4, '/products': 9}
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.controllers.user_controller import USER_SCOPES
+from app.data.models import OrderEvent, User
+from app.main import app
+from app.services.events import OrderEventBroker, iter_server_sent_events, order_events
+from app.services.providers import get_order_service, get_product_service, get_user_service
+from app.services.security import create_access_token, get_current_user
+from tests.mocks.services_mocks import OrderServiceMock, ProductServiceMock, UserServiceMock
+
+ORDERS = '/orders'
+
+client = TestClient(app)
+
+
+def get_current_user_mock():
+    return User(username='admin', email="admin@gmail.com", full_name="Administrator", disabled=False)
+
+
+@pytest.fixture
+def order_route_dependencies_mock():
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_order_service] = OrderServiceMock
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_product_service] = ProductServiceMock
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_current_user] = get_current_user_mock
+
+
+def event(order_id='123', user='admin', status='completed'):
+    return OrderEvent(order_id=order_id, user=user, status=status)
+
+
+def test_events_are_delivered_to_the_subscribers_of_their_user():
+    async def run():
+        broker = OrderEventBroker()
+        with broker.subscribe('admin') as everything, broker.subscribe('admin', '456') as one_order, \
+                broker.subscribe('client') as other_user:
+            # Published from another thread, like services running in the threadpool
+            publisher = threading.Thread(target=broker.publish, args=(event(),))
+            publisher.start()
+            publisher.join()
+            assert (await everything.get(1)).order_id == '123'
+            assert await one_order.get(0.05) is None
+            assert await other_user.get(0.05) is None
+        assert broker.subscribers() == 0
+
+    asyncio.run(run())
+
+
+def test_slow_subscribers_keep_the_newest_events():
+    async def run():
+        broker = OrderEventBroker()
+        with broker.subscribe('admin') as subscription:
+            subscription.queue = asyncio.Queue(2)
+            for status in ('pending', 'cancelled', 'completed'):
+                broker.publish(event(status=status))
+            await asyncio.sleep(0)
+            assert [(await subscription.get(1)).status for _ in range(2)] == ['cancelled', 'completed']
+
+    asyncio.run(run())
+
+
+def test_server_sent_events_start_with_initial_events_and_send_heartbeats():
+    async def run():
+        broker = OrderEventBroker()
+        stream = iter_server_sent_events(broker.subscribe('admin'), [event(status='pending')], heartbeat=0.01)
+        first = await stream.__anext__()
+        assert first.startswith(b'event: order-status\ndata: {')
+        assert b'"status":"pending"' in first
+        assert await stream.__anext__() == b': heartbeat\n\n'
+        broker.publish(event())
+        assert b'"status":"completed"' in await stream.__anext__()
+        await stream.aclose()
+        assert broker.subscribers() == 0
+
+    asyncio.run(run())
+
+
+def test_update_order_status_publishes_an_event(order_route_dependencies_mock):
+    async def run():
+        with order_events.subscribe('admin', '123') as subscription:
+            response = await asyncio.to_thread(client.patch, f'{ORDERS}/123/status', json={'status': 'completed'})
+            assert response.status_code == 200
+            assert response.json()['status'] == 'completed'
+            received = await subscription.get(1)
+            assert (received.order_id, received.status) == ('123', 'completed')
+
+    asyncio.run(run())
+    app.dependency_overrides = {}
+
+
+def test_update_order_status_requires_the_admin_scope(order_route_dependencies_mock):
+    del app.dependency_overrides[get_current_user]
+    app.dependency_overrides[get_user_service] = UserServiceMock
+    token = create_access_token({'sub': 'admin', 'scopes': USER_SCOPES.split()})
+    response = client.patch(f'{ORDERS}/123/status', json={'status': 'completed'},
+                            headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 401
+    assert response.json()['detail'] == 'Not enough permissions'
+    app.dependency_overrides = {}
+
+
+def test_update_order_status_return_404_status_with_incorrect_id(order_route_dependencies_mock):
+    response = client.patch(f'{ORDERS}/789/status', json={'status': 'completed'})
+    assert response.status_code == 404
+    app.dependency_overrides = {}
+
+
+def test_order_events_return_404_status_for_orders_of_other_users(order_route_dependencies_mock):
+    response = client.get(f'{ORDERS}/events', params={'order_id': '456'})
+    assert response.status_code == 404
+    assert order_events.subscribers() == 0
+    app.dependency_overrides = {}
@@ -0,0 +1,35 @@
+import gzip
+from datetime import datetime
+
+from app.data.compact import CompactOrders
+from app.services.export import ExportStats, iter_export
+
+
+def batches():
+    item = {'sku': 'A', 'price': 1.0, 'quantity': 2}
+    return [
+        CompactOrders.from_documents([{'id': f"{batch}-{index}", 'products': [item], 'status': 'completed',
+                                       'total': 2.0, 'user': 'admin', 'created_at': datetime(2024, 1, 1)}
+                                      for index in range(3)])
+        for batch in range(2)
+    ]
+
+
+def test_csv_export_is_chunked_per_batch():
+    chunks = list(iter_export(batches(), 'csv'))
+    assert len(chunks) == 2
+    lines = b''.join(chunks).decode().splitlines()
+    assert len(lines) == 7
+    assert lines[1] == '0-0,admin,completed,2024-01-01T00:00:00,2.0,A,1.0,2'
+
+
+def test_compressed_export_counts_rows():
+    stats = ExportStats()
+    data = b''.join(iter_export(batches(), 'csv', compress=True, stats=stats))
+    assert len(gzip.decompress(data).decode().splitlines()) == 7
+    assert (stats.orders, stats.rows, stats.bytes) == (6, 6, len(data))
+
+
+def test_empty_export_has_the_header():
+    assert b''.join(iter_export([], 'csv')).decode().splitlines() == [
+        'order_id,user,status,created_at,order_total,sku,price,quantity']
@@ -0,0 +1,226 @@
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from app.data.errors import InvalidJobError
+from app.data.models import Job, User
+from app.main import app
+from app.services.jobs import JobKind, JobRunner, JobService, JobStore, JOB_KINDS, run_job, validate_params
+from app.services.security import get_current_user
+from tests.mocks.services_mocks import JobServiceMock
+
+JOBS = '/jobs'
+
+client = TestClient(app)
+
+
+def matches(document: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict):
+            if '$lt' in condition and not value < condition['$lt']:
+                return False
+            if '$gte' in condition and not value >= condition['$gte']:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """
+    The few collection operations used by the job store, on a list of documents
+    """
+
+    def __init__(self):
+        self.documents = []
+
+    def insert_one(self, document):
+        self.documents.append(dict(document))
+
+    def find(self, query, projection=None):
+        return [dict(document) for document in self.documents if matches(document, query)]
+
+    def find_one(self, query, projection=None):
+        return next(iter(self.find(query)), None)
+
+    def update_many(self, query, update):
+        for document in self.documents:
+            if matches(document, query):
+                document.update(update.get('$set', {}))
+                for field, increment in update.get('$inc', {}).items():
+                    document[field] = document.get(field, 0) + increment
+
+    def update_one(self, query, update):
+        document = next((document for document in self.documents if matches(document, query)), None)
+        if document:
+            self.update_many({'id': document['id']}, update)
+
+    def find_one_and_update(self, query, update, projection=None, return_document=None):
+        document = self.find_one(query)
+        if document:
+            self.update_one({'id': document['id']}, update)
+            return self.find_one({'id': document['id']})
+        return None
+
+
+class CountParams(BaseModel):
+    up_to: int
+
+
+def count(job: Job, params: CountParams, progress) -> dict:
+    if params.up_to < 0:
+        raise ValueError('Nothing to count')
+    for number in range(params.up_to):
+        progress(number + 1, params.up_to)
+    return {'counted': params.up_to}
+
+
+@pytest.fixture
+def count_job_kind(monkeypatch):
+    monkeypatch.setitem(JOB_KINDS, 'count', JobKind(CountParams, count))
+
+
+def get_current_user_mock():
+    return User(username='admin', email="admin@gmail.com", full_name="Administrator", disabled=False)
+
+
+@pytest.fixture
+def job_route_dependencies_mock():
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[JobService] = JobServiceMock
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_current_user] = get_current_user_mock
+
+
+def test_run_job_saves_progress_and_result(count_job_kind):
+    store = JobStore(FakeCollection())
+    job = store.create(Job(kind='count', params=validate_params('count', {'up_to': 3})))
+
+    run_job(job.id, store)
+
+    finished = store.get(job.id)
+    assert finished.status == 'succeeded'
+    assert finished.result == {'counted': 3}
+    assert (finished.done, finished.total) == (1, 3)
+    assert finished.attempts == 1
+    assert finished.finished_at is not None
+
+
+def test_run_job_saves_the_error_of_a_failed_job(count_job_kind):
+    store = JobStore(FakeCollection())
+    job = store.create(Job(kind='count', params={'up_to': -1}))
+
+    run_job(job.id, store)
+
+    failed = store.get(job.id)
+    assert failed.status == 'failed'
+    assert failed.error == 'ValueError: Nothing to count'
+
+
+def test_jobs_run_only_once(count_job_kind):
+    store = JobStore(FakeCollection())
+    job = store.create(Job(kind='count', params={'up_to': 1}))
+
+    run_job(job.id, store)
+    run_job(job.id, store)
+
+    assert store.get(job.id).attempts == 1
+
+
+def test_recover_queues_lost_jobs_until_they_use_their_attempts():
+    store = JobStore(FakeCollection())
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    store.create(Job(id='lost', kind='count', status='running', attempts=1, updated_at=long_ago))
+    store.create(Job(id='lost-again', kind='count', status='running', attempts=3, updated_at=long_ago))
+    store.create(Job(id='running', kind='count', status='running', attempts=1))
+    store.create(Job(id='queued', kind='count'))
+
+    assert sorted(store.recover(stale_seconds=60, max_attempts=3)) == ['lost', 'queued']
+    assert store.get('lost-again').status == 'failed'
+    assert store.get('running').status == 'running'
+
+
+class RecoveringStoreStub:
+    def __init__(self):
+        self.recoveries = 0
+
+    def recover(self, stale_seconds: float) -> list[str]:
+        self.recoveries += 1
+        return []
+
+
+def test_runner_recovers_jobs_when_a_broken_pool_is_replaced():
+    runner = JobRunner(workers=1, stale_seconds=0)
+    store = RecoveringStoreStub()
+    runner.recover(store)
+    executor = runner.executor()
+    broken = Future()
+    broken.set_exception(BrokenProcessPool('A worker died'))
+
+    # Every job of the pool fails with it, but the pool is replaced and recovered once
+    runner._done('lost', broken, executor)
+    runner._done('queued', broken, executor)
+    deadline = time.monotonic() + 5
+    while store.recoveries < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    executor.shutdown()
+
+    assert runner.executor() is not executor
+    # Once at startup, then right after the break and once the jobs of the dead workers are stale
+    assert store.recoveries == 3
+    runner.shutdown()
+
+
+def test_validate_params_rejects_unknown_kinds_and_invalid_params(count_job_kind):
+    with pytest.raises(InvalidJobError):
+        validate_params('reticulate-splines', {})
+    with pytest.raises(InvalidJobError):
+        validate_params('count', {'up_to': 'many'})
+
+
+def test_submit_job_return_202_status(job_route_dependencies_mock):
+    response = client.post(JOBS + '/', json={'kind': 'archive-orders', 'params': {'after_days': 365}})
+    assert response.status_code == 202
+    assert response.json()['status'] == 'queued'
+    assert response.json()['submitted_by'] == 'admin'
+    app.dependency_overrides = {}
+
+
+def test_submit_job_return_400_status_with_invalid_params(job_route_dependencies_mock):
+    response = client.post(JOBS + '/', json={'kind': 'export-orders', 'params': {'format': 'xlsx'}})
+    assert response.status_code == 400
+    app.dependency_overrides = {}
+
+
+def test_get_job_return_200_status(job_route_dependencies_mock):
+    response = client.get(f'{JOBS}/123')
+    assert response.status_code == 200
+    assert response.json()['result'] == {'archived': 2}
+    app.dependency_overrides = {}
+
+
+def test_get_job_return_404_status_with_incorrect_id(job_route_dependencies_mock):
+    response = client.get(f'{JOBS}/789')
+    assert response.status_code == 404
+    app.dependency_overrides = {}
+
+
+def test_download_job_result_return_200_status(job_route_dependencies_mock):
+    response = client.get(f'{JOBS}/456/result')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    assert response.headers['content-disposition'] == 'attachment; filename="orders-20240101.csv"'
+    assert response.content == b'order_id,user\n456,admin\n'
+    app.dependency_overrides = {}
+
+
+def test_download_job_result_return_404_status_without_result_file(job_route_dependencies_mock):
+    assert client.get(f'{JOBS}/123/result').status_code == 404
+    assert client.get(f'{JOBS}/789/result').status_code == 404
+    app.dependency_overrides = {}
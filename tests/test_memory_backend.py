@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.data.errors import ProductNotFoundError, ProductAlreadyExistsError, OrderNotFoundError
+from app.data.models import Product, OrderOut, OrderStatus, User
+from app.main import app
+from app.services import memory, providers
+from app.services.security import get_current_user
+from tests.mocks.services_mocks import ProductServiceMock, OrderServiceMock, UserServiceMock
+
+client = TestClient(app)
+
+
+def get_current_user_mock():
+    return User(username='admin', email="admin@gmail.com", full_name="Administrator", disabled=False)
+
+
+@pytest.fixture
+def store():
+    store = memory.InMemoryStore()
+    store.load_documents(products=ProductServiceMock().products_collection,
+                         orders=OrderServiceMock().orders_collection,
+                         users=UserServiceMock().users_collection)
+    return store
+
+
+def test_product_service_crud(store):
+    service = memory.InMemoryProductService(store)
+    product = Product(sku="999", name="New", description="New product", price=9.5,
+                      image_url="https://example.com/999.png")
+    service.create(product)
+    with pytest.raises(ProductAlreadyExistsError):
+        service.create(product)
+    service.update(product.model_copy(update={"price": 10.0}))
+    assert service.get_by_sku("999").price == 10.0
+    service.delete("999")
+    with pytest.raises(ProductNotFoundError):
+        service.get_by_sku("999")
+
+
+def test_order_service_indexes_orders_by_user(store):
+    service = memory.InMemoryOrderService(store)
+    order = OrderOut(id="abc", products=[], status=OrderStatus.PENDING, user="someone",
+                     created_at=datetime(2023, 1, 1))
+    service.create(order)
+    assert service.get_by_id("abc").user == "someone"
+    assert [order.id for order in service.get_all_by_user("someone")] == ["abc"]
+    assert service.get_all_by_user("nobody") == []
+    with pytest.raises(OrderNotFoundError):
+        service.get_by_id("missing")
+
+
+def test_snapshot_round_trip(store, tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    store.save(path)
+    loaded = memory.InMemoryStore()
+    loaded.load(path)
+    assert loaded.products.keys() == store.products.keys()
+    assert [order.model_dump() for order in loaded.orders.values()] == \
+        [order.model_dump() for order in store.orders.values()]
+    assert loaded.orders_by_user == store.orders_by_user
+    assert loaded.users["admin"].hashed_password == store.users["admin"].hashed_password
+
+
+def test_providers_select_the_memory_backend(store, monkeypatch):
+    monkeypatch.setattr(providers, 'SERVICE_BACKEND', 'memory')
+    monkeypatch.setattr(memory, 'get_store', lambda: store)
+    assert isinstance(providers.get_product_service(), memory.InMemoryProductService)
+    assert isinstance(providers.get_refresh_token_service(), memory.InMemoryRefreshTokenService)
+    app.dependency_overrides[get_current_user] = get_current_user_mock
+    response = client.get("/products/")
+    assert response.status_code == 200
+    assert {product["sku"] for product in response.json()} == set(store.products)
+    app.dependency_overrides = {}
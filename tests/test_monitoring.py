@@ -0,0 +1,54 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.data.models import User
+from app.main import app
+from app.monitoring.metrics import Histogram
+from app.services.providers import get_product_service
+from app.services.security import get_current_user
+from tests.mocks.services_mocks import ProductServiceMock
+
+METRICS = '/metrics'
+
+client = TestClient(app)
+
+
+def get_current_user_mock():
+    return User(username='admin', email="admin@gmail.com", full_name="Administrator", disabled=False)
+
+
+@pytest.fixture
+def product_route_dependencies_mock():
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_product_service] = ProductServiceMock
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_current_user] = get_current_user_mock
+
+
+def test_metrics_return_request_latency_by_route(product_route_dependencies_mock):
+    client.get('/products/123')
+    client.get('/products/incorrect_sku')
+    response = client.get(METRICS)
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert 'http_request_duration_seconds_count{method="GET",route="/products/{product_sku}",status="200"}' \
+           in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/products/{product_sku}",status="404"}' \
+           in response.text
+    app.dependency_overrides = {}
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('test_seconds', 'Test histogram.', ('operation',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'read')
+    histogram.observe(0.5, 'read')
+    histogram.observe(5, 'read')
+    assert histogram.render() == [
+        '# HELP test_seconds Test histogram.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{operation="read",le="0.1"} 1',
+        'test_seconds_bucket{operation="read",le="1.0"} 2',
+        'test_seconds_bucket{operation="read",le="+Inf"} 3',
+        'test_seconds_sum{operation="read"} 5.55',
+        'test_seconds_count{operation="read"} 3',
+    ]
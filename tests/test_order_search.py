@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from app.data.indexes import ORDER_INDEXES
+from app.data.models import OrderSearch, OrderOut
+from app.data.order_search import build_query, encode_cursor, decode_cursor
+
+
+def test_build_query_puts_filters_and_sort_together():
+    query, sort = build_query(OrderSearch(status='pending', created_from=datetime(2023, 1, 1), total_min=10))
+    assert query == {'status': 'pending', 'created_at': {'$gte': datetime(2023, 1, 1)}, 'total': {'$gte': 10}}
+    assert sort == [('created_at', -1), ('id', -1)]
+
+
+def test_build_query_continues_after_cursor():
+    order = OrderOut(id='abc', products=[], total=12.5, created_at=datetime(2023, 1, 1))
+    cursor = encode_cursor(order, 'total')
+    assert decode_cursor(cursor, 'total') == (12.5, 'abc')
+    query, sort = build_query(OrderSearch(sort='total', descending=False, cursor=cursor))
+    assert query == {'$and': [{'total': {'$ne': None}},
+                              {'$or': [{'total': {'$gt': 12.5}}, {'total': 12.5, 'id': {'$gt': 'abc'}}]}]}
+    assert sort == [('total', 1), ('id', 1)]
+
+
+def test_every_filter_and_sort_combination_has_an_index_prefix():
+    index_keys = [list(index.document['key']) for index in ORDER_INDEXES]
+    for equality in (None, 'status', 'products.sku'):
+        for sort in ('created_at', 'total'):
+            assert ([equality] if equality else []) + [sort, 'id'] in index_keys
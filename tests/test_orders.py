@@ -1,11 +1,13 @@
+import gzip
+
 import pytest
 from fastapi.testclient import TestClient
 
 from app.data.models import User
 from app.main import app
-from tests.mocks.services_mocks import OrderServiceMock
+from tests.mocks.services_mocks import OrderServiceMock, ProductServiceMock
 from app.services.security import get_current_user
-from app.services.impl import OrderService
+from app.services.providers import get_order_service, get_product_service
 
 ORDERS = '/orders'
 
@@ -19,7 +21,9 @@ def get_current_user_mock():
 @pytest.fixture
 def order_route_dependencies_mock():
     # noinspection PyUnresolvedReferences
-    app.dependency_overrides[OrderService] = OrderServiceMock
+    app.dependency_overrides[get_order_service] = OrderServiceMock
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_product_service] = ProductServiceMock
     # noinspection PyUnresolvedReferences
     app.dependency_overrides[get_current_user] = get_current_user_mock
 
@@ -95,6 +99,22 @@ def test_get_all_orders_return_200_status(order_route_dependencies_mock):
     app.dependency_overrides = {}
 
 
+def test_get_all_orders_serializes_like_single_order(order_route_dependencies_mock, order_123):
+    response = client.get(ORDERS)
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/json'
+    assert response.json()[0] == order_123
+    app.dependency_overrides = {}
+
+
+def test_get_all_orders_streamed_return_200_status(order_route_dependencies_mock):
+    response = client.get(ORDERS, params={'stream': True})
+    assert response.status_code == 200
+    assert [order['id'] for order in response.json()] == ['123', '456']
+    assert response.json()[0]['products'][1] == {'sku': '456', 'price': 456.0, 'quantity': 2}
+    app.dependency_overrides = {}
+
+
 def test_get_order_return_200_status(order_route_dependencies_mock, order_123):
     response = client.get(f'{ORDERS}/123')
     assert response.status_code == 200
@@ -109,6 +129,39 @@ def test_get_order_return_404_status_with_incorrect_id(order_route_dependencies_
     app.dependency_overrides = {}
 
 
+def test_get_order_expanded_inlines_products(order_route_dependencies_mock):
+    response = client.get(f'{ORDERS}/123', params={'expand': 'products'})
+    assert response.status_code == 200
+    items = response.json()['products']
+    assert items[0]['name'] == 'Product 123'
+    assert items[0]['image_url'] == 'https://example.com/123.png'
+    assert items[1]['name'] == 'Product 456'
+    app.dependency_overrides = {}
+
+
+def test_get_all_orders_expanded_fetches_products_once(order_route_dependencies_mock):
+    calls = []
+
+    class CountingProductService(ProductServiceMock):
+        def get_many(self, product_skus):
+            calls.append(product_skus)
+            return super().get_many(product_skus)
+
+    app.dependency_overrides[get_product_service] = CountingProductService
+    response = client.get(ORDERS, params={'expand': 'products'})
+    assert response.status_code == 200
+    assert all(item['name'] for order in response.json() for item in order['products'])
+    assert len(calls) == 1
+    assert len(calls[0]) == len(set(calls[0]))
+    app.dependency_overrides = {}
+
+
+def test_get_all_orders_return_400_status_when_streamed_and_expanded(order_route_dependencies_mock):
+    response = client.get(ORDERS, params={'stream': True, 'expand': 'products'})
+    assert response.status_code == 400
+    app.dependency_overrides = {}
+
+
 def test_create_order_return_200_status(order_route_dependencies_mock, order_in):
     response = client.post(
         ORDERS,
@@ -130,3 +183,54 @@ def test_create_order_return_200_status(order_route_dependencies_mock, order_in)
     assert response.json().get('status') == "pending"
     assert response.json().get('total') == 1035
     app.dependency_overrides = {}
+
+
+def test_search_orders_filters_by_status_and_sku(order_route_dependencies_mock):
+    response = client.get(f'{ORDERS}/search', params={'status': 'pending', 'sku': '456'})
+    assert response.status_code == 200
+    assert [order['id'] for order in response.json()['orders']] == ['123']
+    assert response.json()['next_cursor'] is None
+    app.dependency_overrides = {}
+
+
+def test_search_orders_paginates_with_cursor(order_route_dependencies_mock):
+    response = client.get(f'{ORDERS}/search', params={'sort': 'total', 'descending': False, 'limit': 1})
+    first_page = response.json()
+    assert [order['id'] for order in first_page['orders']] == ['456']
+    response = client.get(f'{ORDERS}/search', params={'sort': 'total', 'descending': False, 'limit': 1,
+                                                      'cursor': first_page['next_cursor']})
+    assert [order['id'] for order in response.json()['orders']] == ['123']
+    assert response.json()['next_cursor'] is None
+    app.dependency_overrides = {}
+
+
+def test_search_orders_return_400_status_with_invalid_cursor(order_route_dependencies_mock):
+    response = client.get(f'{ORDERS}/search', params={'cursor': 'invalid'})
+    assert response.status_code == 400
+    app.dependency_overrides = {}
+
+
+def test_export_orders_streams_csv(order_route_dependencies_mock):
+    response = client.get(f'{ORDERS}/export', params={'compress': False, 'status': 'pending'})
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    assert response.text.splitlines() == [
+        'order_id,user,status,created_at,order_total,sku,price,quantity',
+        '123,admin,pending,2021-10-10T00:00:00,1035.0,123,123.0,1',
+        '123,admin,pending,2021-10-10T00:00:00,1035.0,456,456.0,2',
+    ]
+    app.dependency_overrides = {}
+
+
+def test_export_orders_gzips_csv(order_route_dependencies_mock):
+    response = client.get(f'{ORDERS}/export')
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/gzip'
+    assert len(gzip.decompress(response.content).decode().splitlines()) == 4
+    app.dependency_overrides = {}
+
+
+def test_openapi_schema_documents_order_routes():
+    response = client.get(app.openapi_url)
+    assert response.status_code == 200
+    assert '200' in response.json()['paths']['/orders/']['get']['responses']
@@ -7,7 +7,7 @@ from fastapi.testclient import TestClient
 from app.controllers.product_controller import ProductController
 from app.data.models import User
 from app.main import app
-from app.services.impl import ProductService
+from app.services.providers import get_product_service
 from app.services.security import get_current_user
 from tests.mocks.controllers_mocks import ProductControllerMock
 from tests.mocks.services_mocks import ProductServiceMock
@@ -38,7 +38,7 @@ def assert_200_response(response):
 @pytest.fixture
 def product_route_dependencies_mock():
     # noinspection PyUnresolvedReferences
-    app.dependency_overrides[ProductService] = ProductServiceMock
+    app.dependency_overrides[get_product_service] = ProductServiceMock
     # noinspection PyUnresolvedReferences
     app.dependency_overrides[get_current_user] = get_current_user_mock
 
@@ -57,6 +57,13 @@ def test_get_all_products_return_200_status(product_route_dependencies_mock):
     app.dependency_overrides = {}
 
 
+def test_get_all_products_serializes_like_single_product(product_route_dependencies_mock):
+    response = client.get(PRODUCTS)
+    assert response.status_code == 200
+    assert response.json()[0] == client.get(f'{PRODUCTS}/123').json()
+    app.dependency_overrides = {}
+
+
 def test_get_product_return_200_status(product_route_dependencies_mock):
     response = client.get(f'{PRODUCTS}/123')
     assert_200_response(response)
@@ -178,3 +185,24 @@ def test_delete_product_return_404_status_with_incorrect_sku(product_route_depen
     assert response.status_code == 404
     assert response.json().get('detail') == SKU_NOT_FOUND
     app.dependency_overrides = {}
+
+
+def test_search_products_return_matching_products(product_route_dependencies_mock):
+    response = client.get(f'{PRODUCTS}/search', params={'q': 'product 4'})
+    assert response.status_code == 200
+    assert [product['sku'] for product in response.json()] == ['456']
+    app.dependency_overrides = {}
+
+
+def test_get_products_batch_return_found_and_missing_skus(product_route_dependencies_mock):
+    response = client.post(f'{PRODUCTS}/batch', json={'skus': ['456', 'missing', '123', '456']})
+    assert response.status_code == 200
+    assert [product['sku'] for product in response.json()['products']] == ['456', '123']
+    assert response.json()['missing'] == ['missing']
+    app.dependency_overrides = {}
+
+
+def test_get_products_batch_return_422_status_without_skus(product_route_dependencies_mock):
+    response = client.post(f'{PRODUCTS}/batch', json={'skus': []})
+    assert response.status_code == 422
+    app.dependency_overrides = {}
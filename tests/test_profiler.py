@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.data.models import User
+from app.main import app
+from app.monitoring.sampler import cpu_profiler
+from app.services.security import get_current_user
+
+ADMIN_PROFILE = '/admin/profile'
+
+client = TestClient(app)
+
+
+def get_current_user_mock():
+    return User(username='admin', email="admin@gmail.com", full_name="Administrator", disabled=False)
+
+
+@pytest.fixture
+def admin_route_dependencies_mock():
+    # noinspection PyUnresolvedReferences
+    app.dependency_overrides[get_current_user] = get_current_user_mock
+    yield
+    app.dependency_overrides = {}
+
+
+# Module level, so its label is the same with and without co_qualname (Python 3.11+)
+def spin(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=spin, args=(stop,), name='busy')
+    thread.start()
+    yield
+    stop.set()
+    thread.join()
+
+
+def test_profile_returns_collapsed_stacks(admin_route_dependencies_mock, busy_thread):
+    response = client.get(ADMIN_PROFILE, params={'seconds': 0.3, 'interval_ms': 5})
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    lines = response.text.splitlines()
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) > 0
+    assert any(line.startswith('busy;') and 'tests.test_profiler:spin' in line for line in lines)
+
+
+def test_profile_summarizes_functions_as_json(admin_route_dependencies_mock, busy_thread):
+    response = client.get(ADMIN_PROFILE, params={'seconds': 0.2, 'interval_ms': 5, 'format': 'json'})
+    assert response.status_code == 200
+    profile = response.json()
+    assert profile['samples'] > 0
+    assert 'tests.test_profiler:spin' in [function['function'] for function in profile['total']]
+
+
+def test_profile_return_409_status_while_another_profile_runs(admin_route_dependencies_mock):
+    session = cpu_profiler.start()
+    try:
+        response = client.get(ADMIN_PROFILE, params={'seconds': 0.1})
+        assert response.status_code == 409
+    finally:
+        session.stop()
+    assert client.get(ADMIN_PROFILE, params={'seconds': 0.1}).status_code == 200
@@ -0,0 +1,53 @@
+from pymongo import MongoClient
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from app.data.repository import relaxed_reads
+from app.services import impl
+from app.services.impl import ProductService, OrderService, UserService
+from app.services.search import ProductSearchIndex
+
+
+class RepositoryStub:
+    """
+    Repository over a client that never connects, to inspect the collections the services use
+    """
+
+    def __init__(self):
+        self.db = MongoClient('mongodb://localhost:27017/?replicaSet=rs0', connect=False).get_database('orders')
+
+    def get_collection(self, collection_name, read_preference=None):
+        return self.db.get_collection(collection_name, read_preference=read_preference)
+
+
+def test_relaxed_reads_go_to_secondaries_with_bounded_staleness():
+    read_preference = relaxed_reads()
+    assert isinstance(read_preference, SecondaryPreferred)
+    assert read_preference.max_staleness >= 90
+
+
+def test_catalog_and_list_reads_are_relaxed_and_the_rest_stays_on_primary():
+    repository = RepositoryStub()
+    products, orders, users = ProductService(repository), OrderService(repository), UserService(repository)
+    assert products.product_reads.read_preference == relaxed_reads()
+    assert orders.order_reads.read_preference == relaxed_reads()
+    assert isinstance(products.product_collection.read_preference, Primary)
+    assert isinstance(orders.order_collection.read_preference, Primary)
+    assert isinstance(users.users_collection.read_preference, Primary)
+
+
+class ProductCollectionStub:
+    def __init__(self, products):
+        self.products = products
+
+    def find(self, query, projection=None):
+        return self.products
+
+
+def test_search_index_is_rebuilt_from_the_primary(monkeypatch):
+    monkeypatch.setattr(impl, 'product_index', ProductSearchIndex())
+    products = ProductService(RepositoryStub())
+    products.product_collection = ProductCollectionStub([{'sku': 'fresh', 'name': 'Fresh product', 'description': '',
+                                                          'price': 1.0, 'image_url': ''}])
+    products.product_reads = ProductCollectionStub([])
+    products.rebuild_index()
+    assert [product.sku for product in impl.product_index.search('fresh')] == ['fresh']
@@ -0,0 +1,54 @@
+from app.data.models import Product
+from app.services.search import ProductSearchIndex
+
+
+def product(sku: str, name: str, description: str) -> Product:
+    return Product(sku=sku, name=name, description=description, price=1.0, image_url=f"https://example.com/{sku}.png")
+
+
+def create_index() -> ProductSearchIndex:
+    index = ProductSearchIndex()
+    index.build([
+        product('EA001', 'Espresso machine', 'Automatic coffee maker'),
+        product('GR001', 'Coffee grinder', 'Burr grinder for espresso'),
+        product('MU001', 'Mug', 'Ceramic cup'),
+    ])
+    return index
+
+
+def test_search_ranks_name_matches_first():
+    assert [p.sku for p in create_index().search('espresso')] == ['EA001', 'GR001']
+
+
+def test_search_completes_the_last_token():
+    index = create_index()
+    assert [p.sku for p in index.search('cof')] == ['GR001', 'EA001']
+    assert [p.sku for p in index.search('coffee gri')] == ['GR001']
+    assert index.search('tea') == []
+
+
+def test_index_is_updated_incrementally():
+    index = create_index()
+    index.add(product('MU001', 'Travel mug', 'Keeps coffee warm'))
+    assert [p.sku for p in index.search('travel')] == ['MU001']
+    assert index.search('ceramic') == []
+    index.remove('GR001')
+    assert [p.sku for p in index.search('grinder')] == []
+    assert index._trie.children.get('g') is None
+
+
+def test_changes_made_while_rebuilding_are_kept():
+    index = create_index()
+
+    def load():
+        catalog = [product('EA001', 'Espresso machine', 'Automatic coffee maker'),
+                   product('GR001', 'Coffee grinder', 'Burr grinder for espresso')]
+        # Written after the catalog was read, like a concurrent create and delete
+        index.add(product('TP001', 'Teapot', 'Cast iron'))
+        index.remove('GR001')
+        return catalog
+
+    index.rebuild(load)
+    assert [p.sku for p in index.search('teapot')] == ['TP001']
+    assert [p.sku for p in index.search('espresso')] == ['EA001']
+    assert index.search('mug') == []
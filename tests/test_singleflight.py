@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from app.controllers.product_controller import ProductController
+from app.data.models import Product
+from app.services.singleflight import SingleFlight
+from tests.mocks.services_mocks import ProductServiceMock
+
+
+def test_concurrent_calls_share_one_execution():
+    group = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def lookup(key):
+        calls.append(key)
+        started.set()
+        time.sleep(0.1)
+        return {'sku': key}
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        first = executor.submit(group.do, '123', lookup, '123')
+        started.wait()
+        others = [executor.submit(group.do, '123', lookup, '123') for _ in range(9)]
+        results = [first.result()] + [future.result() for future in others]
+
+    assert calls == ['123']
+    assert all(result is results[0] for result in results)
+    assert group.in_flight() == 0
+
+
+def test_calls_with_different_keys_run_separately():
+    group = SingleFlight()
+    assert group.do('a', str.upper, 'a') == 'A'
+    assert group.do('b', str.upper, 'b') == 'B'
+
+
+def test_errors_are_shared_and_not_cached():
+    group = SingleFlight()
+
+    def failing():
+        raise LookupError('not found')
+
+    with pytest.raises(LookupError):
+        group.do('key', failing)
+    assert group.do('key', lambda: 'found') == 'found'
+
+
+class SlowProductService(ProductServiceMock):
+    """
+    Product service whose lookups are coalesced and take until they are released
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def get_by_sku(self, product_sku: str) -> Product:
+        return self.lookups.do(product_sku, self.slow_get_by_sku, product_sku)
+
+    def slow_get_by_sku(self, product_sku: str) -> Product:
+        self.started.set()
+        self.release.wait(1)
+        return super().get_by_sku(product_sku)
+
+
+def test_awaiting_a_joined_lookup_does_not_block_the_event_loop():
+    service = SlowProductService()
+    leader = threading.Thread(target=service.get_by_sku, args=('123',))
+    leader.start()
+    service.started.wait()
+
+    async def run():
+        controller = ProductController(service)
+        update = asyncio.create_task(controller.update('123', 'Renamed', 'Description', 1.0, SimpleNamespace(file=None)))
+        # Only returns before the lookup is released if the update waits off the event loop
+        await asyncio.sleep(0.05)
+        blocked = update.done()
+        service.release.set()
+        return blocked, await update
+
+    blocked, product = asyncio.run(run())
+    leader.join()
+    assert not blocked
+    assert product.name == 'Renamed'
@@ -0,0 +1,38 @@
+import json
+import logging
+from types import SimpleNamespace
+
+from app.monitoring.context import request_scope
+from app.monitoring.slow_queries import SlowQueryLogger, redact
+
+
+def command_event(request_id, duration_ms=0.0, command=None):
+    return SimpleNamespace(command_name='find', database_name='orders_system', connection_id=('localhost', 27017),
+                           request_id=request_id, duration_micros=int(duration_ms * 1000), command=command)
+
+
+def test_redact_keeps_shape_and_hides_values():
+    assert redact({'user': 'admin', 'total': {'$gte': 10}, '$or': [{'status': 'pending'}]}) == \
+           {'user': '?', 'total': {'$gte': '?'}, '$or': [{'status': '?'}]}
+
+
+def test_slow_command_is_logged_with_route_and_redacted_filter(caplog):
+    listener = SlowQueryLogger(threshold_ms=50, explain_sample_rate=0)
+    token = request_scope.set({'route': SimpleNamespace(path='/orders/user/{user_id}')})
+    listener.started(command_event(1, command={'find': 'orders', 'filter': {'user': 'admin'}}))
+    request_scope.reset(token)
+    with caplog.at_level(logging.WARNING, logger='app.monitoring.slow_queries'):
+        listener.succeeded(command_event(1, duration_ms=120))
+    entry = json.loads(caplog.records[0].getMessage().split(' ', 3)[3])
+    assert entry['route'] == '/orders/user/{user_id}'
+    assert entry['collection'] == 'orders'
+    assert entry['filter'] == {'user': '?'}
+    assert entry['duration_ms'] == 120
+
+
+def test_fast_command_is_not_logged(caplog):
+    listener = SlowQueryLogger(threshold_ms=50, explain_sample_rate=0)
+    listener.started(command_event(2, command={'find': 'orders', 'filter': {}}))
+    with caplog.at_level(logging.WARNING, logger='app.monitoring.slow_queries'):
+        listener.succeeded(command_event(2, duration_ms=10))
+    assert not caplog.records